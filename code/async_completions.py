@@ -0,0 +1,196 @@
+"""
+Asyncio request engine for the GPT-4o generation script.
+
+`AsyncCompletionEngine` keeps up to `max_concurrency` chat completions in flight through an
+`openai.AsyncOpenAI` client, throttles them with a requests/tokens-per-minute `RateLimiter`
+and retries transient failures with jittered exponential backoff (tenacity, like the
+synchronous `completion_with_backoff`). `run_in_order` fans jobs out concurrently but hands
+their results back in submission order, so callers can commit them deterministically.
+
+Everything talks plain HTTP through `base_url`, so it can be exercised against
+`stub_api_server.py` instead of the Azure API gateway.
+"""
+import asyncio
+import time
+from collections import deque
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+# Errors worth retrying; a 400 (e.g. content filter) will fail the same way every time
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Token cost of one `detail: low` image input
+LOW_DETAIL_IMAGE_TOKENS = 85
+
+
+def estimate_request_tokens(messages, max_tokens):
+    """Rough upper bound of the tokens a request consumes: ~4 characters per text token plus the completion budget."""
+    tokens = max_tokens
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content:
+            if part["type"] == "text":
+                tokens += len(part["text"]) // 4
+            else:
+                tokens += LOW_DETAIL_IMAGE_TOKENS
+    return tokens
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests per minute and tokens per minute.
+
+    Both buckets start full and refill continuously. `acquire` waits until one request and
+    `tokens` tokens are available; `adjust` returns over-estimated tokens to the bucket
+    (or charges under-estimated ones) once the real usage is known.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed_minutes * self.requests_per_minute)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed_minutes * self.tokens_per_minute)
+
+    def _wait_time(self, tokens):
+        wait = 0.0
+        if self.requests_per_minute and self._requests < 1:
+            wait = max(wait, (1 - self._requests) / self.requests_per_minute * 60)
+        if self.tokens_per_minute:
+            # A single request larger than the whole bucket is let through once the bucket is full
+            needed = min(tokens, self.tokens_per_minute)
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) / self.tokens_per_minute * 60)
+        return wait
+
+    async def acquire(self, tokens=0):
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests_per_minute:
+                self._requests -= 1
+            if self.tokens_per_minute:
+                self._tokens -= tokens
+
+    def adjust(self, token_delta):
+        if self.tokens_per_minute:
+            self._tokens -= token_delta
+
+
+class AsyncCompletionEngine:
+    """Concurrency-limited, rate-limited chat completions with jittered retries."""
+
+    def __init__(
+        self,
+        client,
+        max_concurrency=8,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_attempts=5,
+        min_wait=1,
+        max_wait=10,
+    ):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_attempts = max_attempts
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+
+    async def create(self, **kwargs):
+        """Async counterpart of `completion_with_backoff`: one chat completion, retried on transient errors."""
+        estimate = estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens", 0))
+        async for attempt in AsyncRetrying(
+            wait=wait_random_exponential(min=self.min_wait, max=self.max_wait),
+            stop=stop_after_attempt(self.max_attempts),
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            reraise=True,
+        ):
+            with attempt:
+                async with self.semaphore:
+                    await self.limiter.acquire(estimate)
+                    completion = await self.client.chat.completions.create(**kwargs)
+        usage = getattr(completion, "usage", None)
+        if usage is not None and usage.total_tokens:
+            self.limiter.adjust(usage.total_tokens - estimate)
+        return completion
+
+
+def make_async_client(base_url, api_key, endpoint_path, timeout=120):
+    """AsyncOpenAI client for the API gateway: key sent as a subscription header, path rewritten to `endpoint_path`."""
+
+    async def update_base_url(request: httpx.Request) -> None:
+        if request.url.path == "/chat/completions":
+            request.url = request.url.copy_with(path=endpoint_path)
+
+    return AsyncOpenAI(
+        base_url=base_url,
+        api_key="unused",  # API key not used, and rather set below
+        default_headers={
+            "Ocp-Apim-Subscription-Key": api_key,
+        },
+        http_client=httpx.AsyncClient(event_hooks={"request": [update_base_url]}, timeout=timeout),
+        max_retries=0,  # retries are handled by AsyncCompletionEngine
+    )
+
+
+async def run_in_order(items, worker, window):
+    """
+    Run `await worker(item)` for every item with at most `window` jobs scheduled at a time,
+    yielding (item, result_or_exception) strictly in the order of `items`.
+
+    Later jobs keep running while an earlier one is slow, but nothing is yielded out of
+    order, so whatever the caller commits (ids, file appends) is deterministic.
+    """
+    pending = deque()
+    iterator = iter(items)
+    exhausted = object()
+
+    def schedule():
+        item = next(iterator, exhausted)
+        if item is exhausted:
+            return False
+        pending.append((item, asyncio.ensure_future(worker(item))))
+        return True
+
+    for _ in range(window):
+        if not schedule():
+            break
+    while pending:
+        item, task = pending.popleft()
+        try:
+            result = await task
+        except Exception as e:
+            result = e
+        schedule()
+        yield item, result
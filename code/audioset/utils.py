@@ -1,18 +1,133 @@
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+
+import numpy as np
 import pandas as pd
 
-def replace_by_class_names(audioset_df, coded_col_name, class_labels_df):
-    # Create a dictionary mapping each mid to its display name
-    label_mapping = dict(zip(class_labels_df['mid'], class_labels_df['display_name']))
-
-    # Function to replace mids with display names in positive_labels column
-    def replace_labels(label_str):
-        # Split by commas to get each mid
-        mids = label_str.split(',')
-        # Map each mid to the corresponding display name, or keep the original if not found
-        display_names = [label_mapping.get(mid, mid) for mid in mids]
-        # Join the display names back into a single string
-        return ', '.join(display_names)
-
-    df_copy = audioset_df.copy()
-    df_copy[coded_col_name] = df_copy[coded_col_name].apply(replace_labels)
+def replace_by_class_names(audioset_df, coded_col_name, class_labels_df, copy=True, as_list=False, chunk_size=1_000_000):
+    """
+    Replace the comma-separated mids in `coded_col_name` with their display names, e.g.
+    "/m/09x0r,/m/04rlf" -> "Speech, Music". Mids without a display name are kept as they are.
+
+    Rows are processed `chunk_size` at a time: the distinct label strings of a chunk are
+    exploded into their mids, each distinct mid is looked up once in an index of display
+    names, and the names are joined back and broadcast to the rows. Memory stays bounded
+    on the unbalanced segments file. Missing values stay missing.
+
+    copy: work on a copy of `audioset_df` (default) or replace the column in place.
+    as_list: store a list of display names per row instead of a ", "-joined string.
+    """
+    # Index of display names by mid; the last entry wins, as in a dict built from the rows
+    label_mapping = pd.Series(class_labels_df['display_name'].values, index=class_labels_df['mid'].values)
+    label_mapping = label_mapping[~label_mapping.index.duplicated(keep='last')]
+
+    column = audioset_df[coded_col_name]
+    replaced = np.empty(len(column), dtype=object)
+    for start in range(0, len(column), chunk_size):
+        codes, unique_labels = pd.factorize(column.iloc[start:start + chunk_size])
+        stop = start + len(codes)
+        if len(unique_labels) == 0:
+            replaced[start:stop] = np.nan
+            continue
+
+        # Explode the distinct label strings into one flat list of mids with a single split
+        unique_labels = unique_labels.tolist()
+        mids = ','.join(unique_labels).split(',')
+        lengths = np.fromiter((label.count(',') + 1 for label in unique_labels), dtype=np.intp, count=len(unique_labels))
+
+        # Look every distinct mid up once, keeping unknown mids as they are
+        mid_codes, unique_mids = pd.factorize(np.array(mids, dtype=object))
+        display_names = label_mapping.reindex(unique_mids).to_numpy(dtype=object)
+        unknown = pd.isna(display_names)
+        display_names[unknown] = np.asarray(unique_mids, dtype=object)[unknown]
+        names = display_names[mid_codes]
+
+        # Re-aggregate per distinct label string, then broadcast to the rows (code -1 = missing value)
+        if as_list:
+            offsets = np.concatenate(([0], np.cumsum(lengths)))
+            grouped = [names[offsets[i]:offsets[i + 1]].tolist() for i in range(len(unique_labels))]
+            replaced[start:stop] = [list(grouped[code]) if code >= 0 else np.nan for code in codes]
+        else:
+            # Interleave names with ", " and a NUL after the last name of each label string,
+            # so one join and one split rebuild all joined strings at once
+            parts = np.empty(2 * len(names), dtype=object)
+            parts[0::2] = names
+            parts[1::2] = ', '
+            parts[2 * np.cumsum(lengths) - 1] = '\x00'
+            joined = ''.join(parts[:-1].tolist()).split('\x00')
+            replaced[start:stop] = np.array(joined + [np.nan], dtype=object)[codes]
+
+    df_copy = audioset_df.copy() if copy else audioset_df
+    df_copy[coded_col_name] = pd.Series(replaced, index=audioset_df.index)
     return df_copy
+
+def longest_display_names(class_labels_df):
+    """
+    Keep the row with the longest 'display_name' of every 'mid' (the first one on ties),
+    ordered by mid. Equivalent to
+
+        class_labels_df.loc[class_labels_df.groupby('mid')['display_name']
+                            .apply(lambda group: group.str.len().idxmax()).drop_duplicates()]
+
+    but with one length computation and one sort instead of a lambda per mid. Rows are
+    selected by index label like the expression above, so with a non-unique index every row
+    sharing a selected label is returned.
+    """
+    ranked = pd.DataFrame({
+        'mid': class_labels_df['mid'].to_numpy(),
+        'length': class_labels_df['display_name'].str.len().fillna(-1).to_numpy(),
+        'position': np.arange(len(class_labels_df)),
+    }).dropna(subset=['mid'])
+    # Within each mid: longest name first, earliest row first among equally long names
+    ranked = ranked.sort_values(['mid', 'length', 'position'], ascending=[True, False, True])
+    positions = ranked.drop_duplicates(subset='mid', keep='first')['position'].to_numpy()
+    return class_labels_df.loc[class_labels_df.index[positions].drop_duplicates()]
+
+def read_pickle_cache(cache_path):
+    """The dict pickled at `cache_path`, or None if it is missing or cannot be unpickled."""
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # truncated or corrupt file, or pickled by an incompatible version
+        print(f"Ignoring unreadable cache {cache_path}: {e!r}")
+        return None
+    return cached if isinstance(cached, dict) else None
+
+def write_pickle_cache(cache_path, cached):
+    # A unique temp name per call: threads of one process must not share it
+    tmp_path = f"{cache_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+_display_names_lock = threading.Lock()
+
+def cached_longest_display_names(class_labels_df, cache_path):
+    """
+    longest_display_names, pickled to `cache_path` together with a hash of
+    `class_labels_df`; later calls with the same table load the pickle instead.
+    An unreadable cache file is rebuilt; threads building it at once build it only once.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr(list(class_labels_df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(class_labels_df, index=True).to_numpy().tobytes())
+    key = digest.hexdigest()
+
+    with _display_names_lock:
+        cached = read_pickle_cache(cache_path)
+        if cached is not None and cached.get('key') == key:
+            return cached['class_labels']
+
+        class_labels = longest_display_names(class_labels_df)
+        write_pickle_cache(cache_path, {'key': key, 'class_labels': class_labels})
+        return class_labels
@@ -0,0 +1,82 @@
+"""
+Compare the longest-display-name dedup of the AudioSet class labels: the former
+`groupby('mid').apply(lambda group: group.str.len().idxmax())` selection against
+`audioset.utils.longest_display_names` and its disk-cached variant. The table is built
+like `prompt_builder.load_class_labels` (ontology labels + strong-label names). `--scale`
+repeats it with renamed mids to time larger tables. The script checks that all variants
+return identical frames.
+
+Usage (from the project root):
+    python code/benchmarks/bench_class_labels.py --scale 20
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from audioset import utils  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_LABELS = ROOT / "code" / "audioset" / "class_labels_indices.csv"
+DEFAULT_STRONG_LABELS = ROOT / "code" / "audioset" / "mid_to_display_name.tsv"
+
+
+def longest_display_names_apply(class_labels_df):
+    return class_labels_df.loc[
+        class_labels_df.groupby('mid')['display_name']
+        .apply(lambda group: group.str.len().idxmax())
+        .drop_duplicates()
+    ]
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark longest-display-name dedup of class labels.")
+    parser.add_argument("--labels", type=Path, default=DEFAULT_LABELS)
+    parser.add_argument("--strong-labels", type=Path, default=DEFAULT_STRONG_LABELS)
+    parser.add_argument("--scale", type=int, default=1, help="Repeat the table this many times with distinct mids.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    labels_df = pd.read_csv(args.labels)
+    strong_labels_df = pd.read_csv(args.strong_labels, sep="\t", header=0, names=["mid", "display_name"])
+    class_labels_df = pd.concat([labels_df, strong_labels_df]).drop_duplicates()
+    if args.scale > 1:
+        class_labels_df = pd.concat([
+            class_labels_df.assign(mid=class_labels_df["mid"] + f"_{copy}") for copy in range(args.scale)
+        ])
+
+    apply_time, expected = best_time(lambda: longest_display_names_apply(class_labels_df), args.repeat)
+    vectorized_time, result = best_time(lambda: utils.longest_display_names(class_labels_df), args.repeat)
+    pd.testing.assert_frame_equal(result, expected)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = str(Path(cache_dir) / "class_labels_longest.pkl")
+        cold_time, _ = best_time(lambda: utils.cached_longest_display_names(class_labels_df, cache_path), 1)
+        cached_time, cached = best_time(lambda: utils.cached_longest_display_names(class_labels_df, cache_path), args.repeat)
+    pd.testing.assert_frame_equal(cached, expected)
+
+    print(f"{len(class_labels_df)} rows, {class_labels_df['mid'].nunique()} mids -> {len(result)} rows")
+    print(f"{'method':<24} {'ms':>8} {'speedup':>8}")
+    for name, seconds in [
+        ("groupby.apply/idxmax", apply_time),
+        ("vectorized", vectorized_time),
+        ("cached (first call)", cold_time),
+        ("cached (warm)", cached_time),
+    ]:
+        print(f"{name:<24} {seconds * 1000:>8.2f} {apply_time / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare the clustering backends of `selecting_frames.select_representative_indices`.
+
+For every clip in `video_samples/` the 10 fps combined histograms are computed once,
+then each backend in CLUSTER_BACKENDS selects `--max-frames` representative frames.
+The script reports the best wall time per backend and how often it picks the same
+frames as the default sklearn KMeans ("exact" = identical set, "overlap" = mean
+Jaccard similarity of the selected sets). The "kmeans_seed0" row is sklearn KMeans
+with another random_state, i.e. how much the reference itself depends on its seed.
+
+Usage (from the project root):
+    python code/benchmarks/bench_clustering.py --repeat 3
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from sklearn.cluster import KMeans
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import selecting_frames  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_VIDEO_DIR = ROOT / "video_samples"
+
+
+def kmeans_seed0(histograms, num_clusters):
+    return KMeans(n_clusters=num_clusters, random_state=0).fit(histograms).labels_
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frame clustering backends.")
+    parser.add_argument("--video-dir", type=Path, default=DEFAULT_VIDEO_DIR)
+    parser.add_argument("--max-frames", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    clips = []
+    for video_path in sorted(args.video_dir.glob("*.mp4")):
+        clip = selecting_frames.stream_clip(str(video_path), fps=(10,), histogram_fps=10, keep_frames=False)
+        clips.append((video_path.name, clip.histograms, clip.timestamps))
+
+    backends = dict(selecting_frames.CLUSTER_BACKENDS, kmeans_seed0=kmeans_seed0)
+    stats = {backend: {"time": 0.0, "exact": 0, "overlap": 0.0} for backend in backends}
+    for name, histograms, timestamps in clips:
+        reference = None
+        for backend, cluster in backends.items():
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                selected = selecting_frames.select_representative_indices(
+                    histograms, timestamps, num_clusters=args.max_frames, cluster_backend=cluster
+                )
+                best = min(best, time.perf_counter() - start)
+            selected = set(int(i) for i in selected)
+            if reference is None:
+                reference = selected
+            stats[backend]["time"] += best
+            stats[backend]["exact"] += selected == reference
+            stats[backend]["overlap"] += len(selected & reference) / len(selected | reference)
+            print(f"{name:<36} {backend:<18} {best * 1000:>8.1f} ms  frames={sorted(selected)}")
+
+    print()
+    print(f"{'backend':<18} {'total ms':>9} {'speedup':>8} {'exact':>7} {'overlap':>8}")
+    baseline = stats["kmeans"]["time"]
+    for backend, result in stats.items():
+        print(
+            f"{backend:<18} {result['time'] * 1000:>9.1f} {baseline / result['time']:>7.2f}x "
+            f"{result['exact']:>3}/{len(clips):<3} {result['overlap'] / len(clips):>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Report the image payload of one GPT-4o request per clip for several `FrameEncoder`
+settings: the base64 bytes of all selected frames (what goes into the `data:` URLs) and
+the encoding time, single-threaded and with `--threads` encoder threads.
+
+Frames are selected once per clip with the pipeline defaults; only encoding is timed.
+
+Usage (from the project root):
+    python code/benchmarks/bench_frame_encoding.py --threads 4
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import selecting_frames  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_VIDEO_DIR = ROOT / "video_samples"
+
+SETTINGS = {
+    "full size, q95 (old)": dict(),
+    "max_side=512, q95": dict(max_side=512),
+    "max_side=512, q85": dict(max_side=512, quality=85),
+    "max_side=512, webp q80": dict(max_side=512, quality=80, format="webp"),
+}
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frame encoding payload size and time.")
+    parser.add_argument("--video-dir", type=Path, default=DEFAULT_VIDEO_DIR)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    clips = []
+    for video_path in sorted(args.video_dir.glob("*.mp4")):
+        frames, _ = selecting_frames.select_filtered_frames(str(video_path))
+        clips.append((video_path.name, frames))
+
+    totals = {name: [0, 0.0, 0.0] for name in SETTINGS}
+    print(f"{'video':<44} {'setting':<24} {'frames':>6} {'b64 KiB':>8} {'1 thread ms':>12} {f'{args.threads} threads ms':>13}")
+    for name, frames in clips:
+        h, w = frames[0].shape[:2]
+        for setting, kwargs in SETTINGS.items():
+            single = selecting_frames.FrameEncoder(threads=1, **kwargs)
+            pooled = selecting_frames.FrameEncoder(threads=args.threads, **kwargs)
+            single_time, payload = best_time(lambda: single.encode_base64(frames), args.repeat)
+            pooled_time, _ = best_time(lambda: pooled.encode_base64(frames), args.repeat)
+            payload_bytes = sum(len(frame_base64) for frame_base64 in payload)
+            totals[setting][0] += payload_bytes
+            totals[setting][1] += single_time
+            totals[setting][2] += pooled_time
+            print(
+                f"{f'{name} ({w}x{h})':<44} {setting:<24} {len(frames):>6} {payload_bytes / 1024:>8.1f} "
+                f"{single_time * 1000:>12.2f} {pooled_time * 1000:>13.2f}"
+            )
+
+    print()
+    print(f"{'setting':<24} {'KiB/request':>12} {'vs old':>7} {'1 thread ms':>12} {f'{args.threads} threads ms':>13}")
+    baseline = totals["full size, q95 (old)"][0]
+    for setting, (payload_bytes, single_time, pooled_time) in totals.items():
+        print(
+            f"{setting:<24} {payload_bytes / 1024 / len(clips):>12.1f} {payload_bytes / baseline:>6.0%} "
+            f"{single_time * 1000 / len(clips):>12.2f} {pooled_time * 1000 / len(clips):>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare frame extraction throughput of the decode modes in `selecting_frames`.
+
+For every clip in `video_samples/` and every sampling rate, the script times
+`extract_frames` with decode="read" (original loop), "grab" and "seek", reports
+sampled frames/sec and checks that the sparse modes return the same frames.
+
+Usage (from the project root):
+    python code/benchmarks/bench_frame_extraction.py --fps 1 10 --repeat 3
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import selecting_frames  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_VIDEO_DIR = ROOT / "video_samples"
+DECODE_MODES = ("read", "grab", "seek")
+
+
+def time_extraction(video_path, fps, decode, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames, timestamps = selecting_frames.extract_frames(str(video_path), fps=fps, decode=decode)
+        best = min(best, time.perf_counter() - start)
+    return best, frames, timestamps
+
+
+def same_frames(reference, candidate):
+    return len(reference) == len(candidate) and all(np.array_equal(a, b) for a, b in zip(reference, candidate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark read vs grab/retrieve vs seek frame extraction.")
+    parser.add_argument("--video-dir", type=Path, default=DEFAULT_VIDEO_DIR)
+    parser.add_argument("--fps", type=float, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    videos = sorted(args.video_dir.glob("*.mp4"))
+    print(f"{'video':<36} {'fps':>5} {'mode':>5} {'frames':>6} {'sec':>8} {'frames/s':>9} {'speedup':>7} {'match':>5}")
+    totals = {mode: [0.0, 0] for mode in DECODE_MODES}
+    for video_path in videos:
+        for fps in args.fps:
+            baseline_time, baseline_frames, baseline_timestamps = None, None, None
+            for mode in DECODE_MODES:
+                elapsed, frames, timestamps = time_extraction(video_path, fps, mode, args.repeat)
+                if mode == "read":
+                    baseline_time, baseline_frames, baseline_timestamps = elapsed, frames, timestamps
+                match = timestamps == baseline_timestamps and same_frames(baseline_frames, frames)
+                totals[mode][0] += elapsed
+                totals[mode][1] += len(frames)
+                print(
+                    f"{video_path.name:<36} {fps:>5g} {mode:>5} {len(frames):>6} {elapsed:>8.3f} "
+                    f"{len(frames) / elapsed:>9.1f} {baseline_time / elapsed:>6.2f}x {str(match):>5}"
+                )
+
+    print()
+    for mode, (elapsed, count) in totals.items():
+        print(f"total {mode:>5}: {count} frames in {elapsed:.3f}s ({count / elapsed:.1f} frames/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Report peak memory per clip for the frame selection pipelines in `selecting_frames`.
+
+Each (clip, pipeline) pair runs in a fresh subprocess so the numbers do not leak
+between runs. For every run the script prints:
+    - traced peak: peak of Python/NumPy allocations (tracemalloc) during selection
+    - rss delta:   growth of the process max RSS over the post-import baseline
+    - output:      bytes of the frames returned
+    - ratio:       traced peak / output
+
+Pipelines:
+    lists      the original list-based flow (two extract_frames passes, list copies)
+    buffer     get_filtered_frames() (single pass, every sampled frame held once in a FrameBuffer)
+    candidates get_filtered_frames(low_memory=True) (no frames kept while decoding, candidates filtered as they are re-read)
+
+Usage (from the project root):
+    python code/benchmarks/bench_frame_memory.py
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+CODE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(CODE_DIR))
+import selecting_frames  # noqa: E402
+
+ROOT = CODE_DIR.parent
+DEFAULT_VIDEO_DIR = ROOT / "video_samples"
+PIPELINES = ("lists", "buffer", "candidates")
+
+
+def list_pipeline(video_id, directory, max_frames=5):
+    video_path = selecting_frames.find_video_path_by_id(video_id, directory)
+    frames, timestamps = selecting_frames.get_distinct_frames(video_path, max_frames=max_frames)
+    all_frames, all_timestamps = selecting_frames.extract_frames(video_path)
+    regular_interval_indices = np.linspace(0, len(all_frames) - 1, 10, dtype=int)
+    concat_frames = frames + [all_frames[i] for i in regular_interval_indices]
+    concat_timestamps = timestamps + [all_timestamps[i] for i in regular_interval_indices]
+    sorted_indices = np.argsort(concat_timestamps)
+    concat_frames_sorted = [concat_frames[i] for i in sorted_indices]
+    concat_timestamps_sorted = [concat_timestamps[i] for i in sorted_indices]
+    return selecting_frames.remove_similar_frames(
+        concat_frames_sorted, concat_timestamps_sorted, dynamic=True, min_frames=5, threshold=0.08
+    )
+
+
+def measure(video_id, directory, pipeline):
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    if pipeline == "lists":
+        frames, _ = list_pipeline(video_id, directory)
+    else:
+        frames, _ = selecting_frames.get_filtered_frames(video_id, directory, low_memory=pipeline == "candidates")
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_delta = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss_kb) * 1024
+    output_bytes = sum(frame.nbytes for frame in frames)
+    return {"traced_peak": traced_peak, "rss_delta": rss_delta, "output": output_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory per clip for frame selection pipelines.")
+    parser.add_argument("--video-dir", type=Path, default=DEFAULT_VIDEO_DIR)
+    parser.add_argument("--worker-video", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-pipeline", choices=PIPELINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_video:
+        print(json.dumps(measure(args.worker_video, str(args.video_dir), args.worker_pipeline)))
+        return
+
+    mb = 1024 * 1024
+    print(f"{'video':<14} {'pipeline':<10} {'traced peak':>12} {'rss delta':>10} {'output':>8} {'ratio':>6}")
+    for video_path in sorted(args.video_dir.glob("*.mp4")):
+        video_id = video_path.name.rsplit("_", 2)[0]
+        for pipeline in PIPELINES:
+            result = subprocess.run(
+                [sys.executable, __file__, "--video-dir", str(args.video_dir), f"--worker-video={video_id}", f"--worker-pipeline={pipeline}"],
+                check=True, capture_output=True, text=True,
+            )
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            print(
+                f"{video_id:<14} {pipeline:<10} {stats['traced_peak'] / mb:>10.1f}MB {stats['rss_delta'] / mb:>8.1f}MB "
+                f"{stats['output'] / mb:>6.1f}MB {stats['traced_peak'] / stats['output']:>5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark `calculate_combined_histograms` (per-frame cv2.calcHist loop) against
+`calculate_combined_histograms_batch` (one quantization + bincount per chunk of frames) and
+`calculate_combined_histograms_blocks` (calcHist per block, global histogram summed), and
+show which of the last two `stream_clip` uses at each resolution.
+
+Frames are the 10 fps samples of every clip in `video_samples/`; the script checks that
+all implementations return identical values before reporting timings.
+
+Usage (from the project root):
+    python code/benchmarks/bench_histograms.py --repeat 5
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import selecting_frames  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_VIDEO_DIR = ROOT / "video_samples"
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-frame vs batched combined histograms.")
+    parser.add_argument("--video-dir", type=Path, default=DEFAULT_VIDEO_DIR)
+    parser.add_argument("--fps", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'video':<36} {'frames':>6} {'resolution':>10} {'loop s':>8} {'batch s':>8} {'blocks s':>8} "
+        f"{'stream_clip':>11} {'speedup':>7} {'max |diff|':>10}"
+    )
+    for video_path in sorted(args.video_dir.glob("*.mp4")):
+        frames, _ = selecting_frames.extract_frames(str(video_path), fps=args.fps)
+        stacked = np.stack(frames)
+
+        loop_time, loop_result = best_time(lambda: selecting_frames.calculate_combined_histograms(frames), args.repeat)
+        batch_time, batch_result = best_time(lambda: selecting_frames.calculate_combined_histograms_batch(stacked), args.repeat)
+        blocks_time, blocks_result = best_time(lambda: selecting_frames.calculate_combined_histograms_blocks(frames), args.repeat)
+        max_diff = max(np.abs(np.asarray(loop_result) - result).max() for result in (batch_result, blocks_result))
+
+        h, w = stacked.shape[1:3]
+        use_blocks = h * w >= selecting_frames.HISTOGRAM_BLOCKS_MIN_PIXELS
+        used_time = blocks_time if use_blocks else batch_time
+        print(
+            f"{video_path.name:<36} {len(frames):>6} {f'{w}x{h}':>10} {loop_time:>8.3f} {batch_time:>8.3f} {blocks_time:>8.3f} "
+            f"{'blocks' if use_blocks else 'batch':>11} {loop_time / used_time:>6.2f}x {max_diff:>10.3g}"
+        )
+
+
+if __name__ == "__main__":
+    main()
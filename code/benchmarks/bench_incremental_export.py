@@ -0,0 +1,73 @@
+"""
+Time `prepare_hf_dataset.export_dataset` on synthetic flattened splits of the release size:
+a first export, a rerun with nothing changed, a rerun after editing one question of the val
+split, and a rerun with only the source mtimes touched. The script checks that unchanged
+splits are not rewritten and that the incremental export is byte-identical to a clean one.
+
+Usage (from the project root):
+    python code/benchmarks/bench_incremental_export.py --scale 1.0 --format jsonl
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import prepare_hf_dataset  # noqa: E402
+from bench_jsonl_export import RELEASE_SIZES, write_split  # noqa: E402
+
+EDITED_FILE = "combined_dataset_val_flattened.json"
+
+
+def output_files(output_dir):
+    return {path.relative_to(output_dir): path for path in output_dir.rglob("*") if path.is_file()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the incremental Hugging Face export.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the release split sizes.")
+    parser.add_argument("--format", choices=prepare_hf_dataset.DATA_FORMATS, default="jsonl")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_dir = Path(directory) / "source"
+        source_dir.mkdir()
+        for split, size in RELEASE_SIZES.items():
+            write_split(source_dir / f"combined_dataset_{split}_flattened.json", int(size * args.scale))
+        output_dir = Path(directory) / "export"
+
+        def timed_export(name, clean=False, target=output_dir):
+            start = time.perf_counter()
+            summary = prepare_hf_dataset.export_dataset(source_dir, target, clean=clean, data_format=args.format)
+            timings[name] = (time.perf_counter() - start, summary["exported"])
+
+        timings = {}
+        timed_export("first export", clean=True)
+        mtimes = {name: path.stat().st_mtime_ns for name, path in output_files(output_dir).items()}
+        timed_export("nothing changed")
+        assert mtimes == {name: path.stat().st_mtime_ns for name, path in output_files(output_dir).items()}, \
+            "unchanged run rewrote files"
+
+        edited = source_dir / EDITED_FILE
+        edited.write_text(edited.read_text(encoding="utf-8").replace('"Piano"', '"Organ"', 1), encoding="utf-8")
+        timed_export("one val question edited")
+        for path in source_dir.iterdir():
+            os.utime(path)
+        timed_export("sources touched")
+
+        reference_dir = Path(directory) / "reference"
+        timed_export("clean export (reference)", clean=True, target=reference_dir)
+        incremental, reference = output_files(output_dir), output_files(reference_dir)
+        assert incremental.keys() == reference.keys(), (incremental.keys(), reference.keys())
+        for name, path in reference.items():
+            assert incremental[name].read_bytes() == path.read_bytes(), name
+
+    print(f"{'run':<28} {'seconds':>8}  exported")
+    for name, (seconds, exported) in timings.items():
+        print(f"{name:<28} {seconds:>8.2f}  {', '.join(exported) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
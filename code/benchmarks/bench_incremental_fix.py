@@ -0,0 +1,94 @@
+"""
+Time `fix_dataset_quality_issues.fix_dataset` on synthetic split files of the release size:
+a first (full) run, a rerun with nothing changed, a rerun after adding a
+DUPLICATE_OPTION_FIXES entry, and a rerun after editing one question by hand. The script
+checks that the incrementally fixed files are byte-identical to a full run over the same
+edits, that the post-fix validation counts agree and that each report lists only the
+changes of its own run.
+
+Usage (from the project root):
+    python code/benchmarks/bench_incremental_fix.py --scale 1.0
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import fix_dataset_quality_issues as fixer  # noqa: E402
+from bench_jsonl_export import RELEASE_SIZES  # noqa: E402
+from bench_quality_fix import write_split_files  # noqa: E402
+
+EDITED_FILE = "combined_dataset_val_flattened.json"
+
+
+def edit_one_question(directory):
+    path = directory / EDITED_FILE
+    path.write_text(path.read_text(encoding="utf-8").replace('"category": "action"', '"category": "acting"', 1), encoding="utf-8")
+
+
+def timed_run(directory, **kwargs):
+    start = time.perf_counter()
+    fixer.fix_dataset(directory, directory / "report.json", workers=1, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental dataset quality fixing.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the release split sizes.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        raw_dir = Path(directory) / "raw"
+        raw_dir.mkdir()
+        for split, size in RELEASE_SIZES.items():
+            write_split_files(raw_dir, split, int(size * args.scale))
+        work_dir = Path(directory) / "work"
+        shutil.copytree(raw_dir, work_dir)
+
+        def mtimes():
+            return {path.name: path.stat().st_mtime_ns for path in work_dir.iterdir()}
+
+        timings = {"first run (full)": timed_run(work_dir)}
+        before = mtimes()
+        timings["nothing changed"] = timed_run(work_dir)
+        # Only the report changes: it lists the changes of the latest run, none this time
+        after = mtimes()
+        assert {name for name in before if before[name] != after[name]} <= {"report.json"}, "unchanged run rewrote files"
+        unchanged_report = json.loads((work_dir / "report.json").read_text(encoding="utf-8"))
+        assert all(entry["changes"] == [] for entry in unchanged_report.values()), "report kept earlier changes"
+        timings["nothing changed (again)"] = timed_run(work_dir)
+        assert after == mtimes(), "second unchanged run rewrote files"
+
+        fixer.DUPLICATE_OPTION_FIXES[("vid00000012", 100)] = ["Guitar", "Ukulele", "Banjo", "Mandolin"]
+        timings["DUPLICATE_OPTION_FIXES entry added"] = timed_run(work_dir)
+        edit_one_question(work_dir)
+        timings["one question edited"] = timed_run(work_dir)
+
+        reference_dir = Path(directory) / "reference"
+        shutil.copytree(raw_dir, reference_dir)
+        edit_one_question(reference_dir)
+        timings["full run (reference)"] = timed_run(reference_dir, incremental=False)
+
+        for source_path in sorted(raw_dir.iterdir()):
+            assert (work_dir / source_path.name).read_bytes() == (reference_dir / source_path.name).read_bytes(), source_path.name
+        incremental_report = json.loads((work_dir / "report.json").read_text(encoding="utf-8"))
+        full_report = json.loads((reference_dir / "report.json").read_text(encoding="utf-8"))
+        for name, entry in full_report.items():
+            assert incremental_report[name]["post_fix_validation"] == entry["post_fix_validation"], name
+        # The last incremental run re-fixed just the edited question, which the full run also fixed
+        edited_ids = {change["id"] for change in incremental_report[EDITED_FILE]["changes"]}
+        assert incremental_report[EDITED_FILE]["changed_samples"] == len(edited_ids) == 1, edited_ids
+        assert edited_ids <= {change["id"] for change in full_report[EDITED_FILE]["changes"]}, edited_ids
+
+    print()
+    print(f"{'run':<36} {'seconds':>8}")
+    for name, seconds in timings.items():
+        print(f"{name:<36} {seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
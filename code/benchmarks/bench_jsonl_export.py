@@ -0,0 +1,125 @@
+"""
+Compare `prepare_hf_dataset.json_array_to_jsonl` against the former `json.load` version
+on synthetic flattened splits of the release size (177,132 / 22,267 / 26,088 questions,
+written with indent=2 like `fix_dataset_quality_issues.py` does): peak RSS and throughput
+for one split, each run in a fresh process, then `export_dataset` with the splits
+converted one after another and in parallel. The script checks that the outputs match.
+
+Usage (from the project root):
+    python code/benchmarks/bench_jsonl_export.py --scale 1.0
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import prepare_hf_dataset  # noqa: E402
+
+RELEASE_SIZES = {"train": 177132, "val": 22267, "test": 26088}
+
+
+def json_load_to_jsonl(source_path, target_path):
+    with source_path.open("r", encoding="utf-8") as source_file:
+        data = json.load(source_file)
+
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    with target_path.open("w", encoding="utf-8", newline="\n") as target_file:
+        for item in data:
+            target_file.write(json.dumps(item, ensure_ascii=False, separators=(",", ":")))
+            target_file.write("\n")
+
+    return len(data)
+
+
+CONVERTERS = {
+    "json.load (old)": json_load_to_jsonl,
+    "streaming": prepare_hf_dataset.json_array_to_jsonl,
+}
+
+
+def synthetic_question(index):
+    return {
+        "caption": f"A man in a red shirt is playing the guitar while a woman sings, clip {index}.",
+        "video_id": f"vid{index // 8:08d}",
+        "question": "What instrument is the man playing while the woman sings?",
+        "options": ["Guitar", "Piano", "Violin", "Drums"],
+        "correct_answer_idx": index % 4,
+        "rephrased_answers": ["He plays the guitar", "A guitar", "The guitar — café style"],
+        "quality_rating": "obvious",
+        "modality": "audio-visual",
+        "category": "action",
+        "source_tags": ["frames", "audio", "caption"],
+        "id": index,
+        "oid": index // 8,
+        "model": "gpt-4o",
+    }
+
+
+def write_split(path, size):
+    path.write_text(json.dumps([synthetic_question(i) for i in range(size)], ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def peak_rss_kib():
+    # VmHWM starts over at exec; ru_maxrss is inherited from the parent on Linux
+    status = Path("/proc/self/status")
+    if status.exists():
+        return int(status.read_text().split("VmHWM:")[1].split()[0])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(name, source_path, target_path):
+    # Runs in a fresh process: the peak RSS is that of this conversion only
+    idle_kib = peak_rss_kib()
+    start = time.perf_counter()
+    count = CONVERTERS[name](source_path, target_path)
+    elapsed = time.perf_counter() - start
+    return count, elapsed, peak_rss_kib() - idle_kib
+
+
+def in_fresh_process(fn, *args):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the flattened JSON -> JSONL conversion.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the release split sizes.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_dir = Path(directory) / "source"
+        source_dir.mkdir()
+        for split, size in RELEASE_SIZES.items():
+            write_split(source_dir / f"combined_dataset_{split}_flattened.json", int(size * args.scale))
+        train_source = source_dir / "combined_dataset_train_flattened.json"
+        source_mib = train_source.stat().st_size / 2**20
+
+        print(f"train split: {int(RELEASE_SIZES['train'] * args.scale)} questions, {source_mib:.1f} MiB")
+        print(f"{'method':<18} {'seconds':>8} {'MiB/s':>7} {'items/s':>9} {'peak RSS MiB':>13}")
+        outputs = {}
+        for name in CONVERTERS:
+            target = Path(directory) / f"{len(outputs)}.jsonl"
+            count, elapsed, peak_kib = in_fresh_process(measure, name, train_source, target)
+            outputs[name] = target.read_bytes()
+            print(f"{name:<18} {elapsed:>8.2f} {source_mib / elapsed:>7.1f} {count / elapsed:>9.0f} {peak_kib / 1024:>13.1f}")
+        assert len(set(outputs.values())) == 1, "converters disagree"
+
+        print()
+        print(f"{'export_dataset':<18} {'seconds':>8}")
+        exports = []
+        for workers in (1, len(prepare_hf_dataset.SPLITS)):
+            output_dir = Path(directory) / f"export_{workers}"
+            start = time.perf_counter()
+            prepare_hf_dataset.export_dataset(source_dir, output_dir, clean=True, workers=workers)
+            print(f"{f'workers={workers}':<18} {time.perf_counter() - start:>8.2f}")
+            exports.append([path.read_bytes() for path in sorted((output_dir / "data").rglob("*.jsonl"))])
+        assert exports[0] == exports[1], "parallel export differs"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Crash test for `result_store.JsonlResultStore`: a writer subprocess commits synthetic
+results (and an error for every seventh video) the way the generation script does, taking
+question ids from `last_question_id`, and is SIGKILLed at random points, then restarted
+until it finishes. Afterwards the script checks that no video is lost or stored twice, that
+question ids run from 1 without gaps or duplicates, that the processed list matches the
+results, and that the checkpoint matches the files. It reports how many kills landed in
+the middle of a commit (bytes past the checkpoint) and the time each restart took to resume.
+
+Usage (from the project root):
+    python code/benchmarks/bench_kill_resume.py --videos 10000 --kills 20
+"""
+import argparse
+import json
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import result_store  # noqa: E402
+from bench_resume import synthetic_result  # noqa: E402
+
+QUESTIONS_PER_VIDEO = 15
+
+
+def video_id(index):
+    return synthetic_result(index, 0)["video_id"]
+
+
+def write(directory, videos):
+    """The writer process: resume the store and commit every video that is not recorded yet."""
+    start = time.perf_counter()
+    store = result_store.JsonlResultStore(directory, "val")
+    print(json.dumps({"resume_ms": (time.perf_counter() - start) * 1000}), flush=True)
+    for index in range(videos):
+        if video_id(index) in store.processed_videos or video_id(index) in store.error_videos:
+            continue
+        if index % 7 == 3:
+            store.add_error({"video_id": video_id(index), "error": "synthetic failure"})
+        else:
+            store.add_result(synthetic_result(index, store.last_question_id + 1))
+    store.close()
+
+
+def uncommitted_bytes(directory):
+    checkpoint = json.loads(result_store.checkpoint_path(directory, "val").read_text(encoding="utf-8"))
+    paths = result_store.jsonl_paths(directory, "val")
+    return sum(
+        (paths[kind].stat().st_size if paths[kind].exists() else 0) - checkpoint["files"][kind]["size"]
+        for kind in result_store.KINDS
+    )
+
+
+def check(directory, videos):
+    paths = result_store.jsonl_paths(directory, "val")
+    results = result_store.read_jsonl(paths["results"])
+    processed = result_store.read_jsonl(paths["processed"])
+    errors = [entry["video_id"] for entry in result_store.read_jsonl(paths["errors"])]
+
+    result_ids = [result["video_id"] for result in results]
+    assert len(result_ids) == len(set(result_ids)), "a video was stored twice"
+    assert len(errors) == len(set(errors)), "an error was recorded twice"
+    assert processed == result_ids, "processed list does not match the results"
+    expected_errors = [video_id(index) for index in range(videos) if index % 7 == 3]
+    expected_results = [video_id(index) for index in range(videos) if index % 7 != 3]
+    assert errors == expected_errors, "errors lost or out of order"
+    assert result_ids == expected_results, "results lost or out of order"
+
+    question_ids = [question["id"] for result in results for question in result["questions"]]
+    assert question_ids == list(range(1, len(expected_results) * QUESTIONS_PER_VIDEO + 1)), "question ids gapped"
+
+    checkpoint = json.loads(result_store.checkpoint_path(directory, "val").read_text(encoding="utf-8"))
+    assert checkpoint["last_question_id"] == question_ids[-1], "checkpoint last_question_id differs"
+    for kind in result_store.KINDS:
+        assert checkpoint["files"][kind]["size"] == paths[kind].stat().st_size, f"checkpoint size of {kind} differs"
+    with result_store.JsonlResultStore(directory, "val") as store:
+        assert store.last_question_id == question_ids[-1]
+        assert store.processed_videos == set(result_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SIGKILL a result store writer and check that it resumes cleanly.")
+    parser.add_argument("--videos", type=int, default=10000)
+    parser.add_argument("--kills", type=int, default=20)
+    parser.add_argument("--min-delay", type=float, default=0.2, help="Seconds after start before a kill, at least.")
+    parser.add_argument("--max-delay", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--writer", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.writer:
+        write(args.writer, args.videos)
+        return
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        command = [sys.executable, __file__, "--writer", directory, "--videos", str(args.videos)]
+        kills, mid_commit, resume_ms, finished = 0, 0, [], False
+        while not finished:
+            writer = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+            resume_ms.append(json.loads(writer.stdout.readline())["resume_ms"])
+            killed = False
+            if kills < args.kills:
+                try:
+                    writer.wait(rng.uniform(args.min_delay, args.max_delay))
+                except subprocess.TimeoutExpired:
+                    writer.send_signal(signal.SIGKILL)
+                    writer.wait()
+                    kills, killed = kills + 1, True
+                    mid_commit += uncommitted_bytes(directory) > 0
+            writer.stdout.close()
+            if not killed and writer.wait() != 0:
+                raise RuntimeError(f"writer failed with exit code {writer.returncode}")
+            finished = not killed
+        check(directory, args.videos)
+
+    print(f"{args.videos} videos, {kills} kills ({mid_commit} in the middle of a commit), {len(resume_ms)} starts")
+    print(f"resume ms: median {sorted(resume_ms)[len(resume_ms) // 2]:.1f}, max {max(resume_ms):.1f}")
+    print("no lost, duplicated or gapped ids; checkpoint matches the files")
+
+
+if __name__ == "__main__":
+    main()
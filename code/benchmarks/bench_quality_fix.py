@@ -0,0 +1,181 @@
+"""
+Compare the streaming `fix_dataset_quality_issues.fix_file` against the former per-file
+pass (`json.loads` of the whole file, `deepcopy` of every question, `write_text` in place)
+on synthetic split files of the release size, flattened and grouped by video, with a few
+percent of questions needing each fix. Every file is fixed in a fresh process to report its
+own throughput and peak RSS; the script checks that fixed files and reports are identical.
+Finally `fix_dataset` times all files fixed one by one and in parallel.
+
+Usage (from the project root):
+    python code/benchmarks/bench_quality_fix.py --scale 1.0
+"""
+import argparse
+import copy
+import json
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import fix_dataset_quality_issues as fixer  # noqa: E402
+from bench_jsonl_export import RELEASE_SIZES, peak_rss_kib, synthetic_question  # noqa: E402
+
+QUESTIONS_PER_VIDEO = 8
+
+
+def old_fix_question(question):
+    original = copy.deepcopy(question)
+    changes = []
+
+    options = question.get("options")
+    if isinstance(options, list) and len(options) < 4:
+        question["options"] = options + fixer.TEMPORAL_EXTRA_OPTIONS[: 4 - len(options)]
+        changes.append("expanded_options_to_four")
+
+    qid = question.get("id")
+    duplicate_key = (question.get("video_id"), qid)
+    if duplicate_key in fixer.DUPLICATE_OPTION_FIXES:
+        question["options"] = fixer.DUPLICATE_OPTION_FIXES[duplicate_key]
+        changes.append("deduplicated_options")
+
+    rephrased = question.get("rephrased_answers")
+    if isinstance(rephrased, list) and len(rephrased) > 3:
+        question["rephrased_answers"] = rephrased[:3]
+        changes.append("trimmed_rephrased_answers_to_three")
+
+    if question.get("modality") not in fixer.VALID_MODALITIES:
+        question["modality"] = fixer.infer_modality(question.get("source_tags"))
+        changes.append("corrected_invalid_modality")
+
+    if question.get("category") not in fixer.VALID_CATEGORIES:
+        question["category"] = "description"
+        changes.append("corrected_invalid_category")
+
+    if changes:
+        return {
+            "id": qid,
+            "video_id": question.get("video_id"),
+            "question": question.get("question"),
+            "changes": changes,
+            "before": original,
+            "after": copy.deepcopy(question),
+        }
+    return None
+
+
+def old_fix_file(source_path):
+    flattened = "flattened" in source_path.name
+    data = json.loads(source_path.read_text(encoding="utf-8"))
+    report = []
+    if flattened:
+        for item in data:
+            change = old_fix_question(item)
+            if change:
+                report.append(change)
+    else:
+        for parent in data:
+            for question in parent.get("questions", []):
+                question.setdefault("video_id", parent.get("video_id"))
+                change = old_fix_question(question)
+                if change:
+                    change["oid"] = parent.get("oid")
+                    report.append(change)
+                question.pop("video_id", None)
+    validation = fixer.validate(data, flattened)
+    source_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    return {"changed_samples": len(report), "changes": report, "post_fix_validation": validation}
+
+
+def defective_question(index):
+    question = synthetic_question(index)
+    if index % 97 == 0:
+        question["options"] = question["options"][:3]
+    if index % 113 == 0:
+        question["rephrased_answers"].append("One answer too many")
+    if index % 131 == 0:
+        question["modality"] = "audio visual"
+    if index % 151 == 0:
+        question["category"] = "counting"
+    if index == 11397:
+        question["video_id"] = "jii46gf1UkM"
+    return question
+
+
+def write_split_files(source_dir, split, size):
+    questions = [defective_question(index) for index in range(size)]
+    flattened_path = source_dir / f"combined_dataset_{split}_flattened.json"
+    flattened_path.write_text(json.dumps(questions, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    parents = []
+    for start in range(0, size, QUESTIONS_PER_VIDEO):
+        group = questions[start:start + QUESTIONS_PER_VIDEO]
+        parents.append({
+            "oid": group[0]["oid"],
+            "caption": group[0]["caption"],
+            "video_id": group[0]["video_id"],
+            "questions": [
+                {key: value for key, value in question.items() if key not in ("caption", "video_id", "oid", "model")}
+                for question in group
+            ],
+        })
+    grouped_path = source_dir / f"combined_dataset_{split}.json"
+    grouped_path.write_text(json.dumps(parents, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def measure(method, source_path):
+    # Runs in a fresh process: the peak RSS is that of this file only
+    idle_kib = peak_rss_kib()
+    start = time.perf_counter()
+    entry = old_fix_file(source_path) if method == "old" else fixer.fix_file(source_path)[0]
+    return entry, time.perf_counter() - start, peak_rss_kib() - idle_kib
+
+
+def in_fresh_process(fn, *args):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dataset quality-fix pass.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the release split sizes.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_dir = Path(directory) / "source"
+        source_dir.mkdir()
+        for split, size in RELEASE_SIZES.items():
+            write_split_files(source_dir, split, int(size * args.scale))
+
+        print(f"{'file':<36} {'MiB':>6} {'method':<9} {'seconds':>8} {'MiB/s':>7} {'peak RSS MiB':>13}")
+        fixed_files = sorted(source_dir.glob("combined_dataset_*.json"))
+        for source_path in fixed_files:
+            source_mib = source_path.stat().st_size / 2**20
+            fixed = {}
+            for method in ("old", "streaming"):
+                work_path = Path(directory) / method / source_path.name
+                work_path.parent.mkdir(exist_ok=True)
+                shutil.copyfile(source_path, work_path)
+                entry, elapsed, peak_kib = in_fresh_process(measure, method, work_path)
+                entry.pop("changes_scope", None)  # the old report had no such field
+                fixed[method] = (work_path.read_bytes(), entry)
+                print(
+                    f"{source_path.name:<36} {source_mib:>6.1f} {method:<9} {elapsed:>8.2f} "
+                    f"{source_mib / elapsed:>7.1f} {peak_kib / 1024:>13.1f}"
+                )
+            assert fixed["old"] == fixed["streaming"], f"{source_path.name}: outputs differ"
+
+        print()
+        print(f"{'fix_dataset':<18} {'seconds':>8}")
+        for workers in (1, len(fixed_files)):
+            work_dir = Path(directory) / f"fix_dataset_{workers}"
+            shutil.copytree(source_dir, work_dir)
+            start = time.perf_counter()
+            fixer.fix_dataset(work_dir, work_dir / "report.json", workers)
+            print(f"{f'workers={workers}':<18} {time.perf_counter() - start:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare `audioset.utils.replace_by_class_names` with the former per-row `.apply`
+version on an AudioSet segments file (by default the unbalanced train segments, the
+largest one). The script checks that both return identical frames, then reports wall time
+and, from a second run under tracemalloc, the peak Python memory allocated during each call.
+
+Usage (from the project root):
+    python code/benchmarks/bench_replace_labels.py --chunk-size 1000000
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from audioset import utils  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_SEGMENTS = ROOT / "code" / "audioset" / "unbalanced_train_segments.csv"
+DEFAULT_LABELS = ROOT / "code" / "audioset" / "class_labels_indices.csv"
+
+
+def replace_by_class_names_apply(audioset_df, coded_col_name, class_labels_df):
+    label_mapping = dict(zip(class_labels_df['mid'], class_labels_df['display_name']))
+
+    def replace_labels(label_str):
+        return ', '.join(label_mapping.get(mid, mid) for mid in label_str.split(','))
+
+    df_copy = audioset_df.copy()
+    df_copy[coded_col_name] = df_copy[coded_col_name].apply(replace_labels)
+    return df_copy
+
+
+def measure(fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    # Timed separately: tracing every allocation slows the per-row version down several times
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mid -> display-name replacement.")
+    parser.add_argument("--segments", type=Path, default=DEFAULT_SEGMENTS)
+    parser.add_argument("--labels", type=Path, default=DEFAULT_LABELS)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    segments_df = pd.read_csv(args.segments, skiprows=2, quotechar='"', skipinitialspace=True)
+    class_labels_df = pd.read_csv(args.labels)
+    print(f"{len(segments_df)} rows, {segments_df['positive_labels'].nunique()} distinct label strings")
+
+    runs = [
+        ("apply (per row)", lambda: replace_by_class_names_apply(segments_df, 'positive_labels', class_labels_df)),
+        ("vectorized", lambda: utils.replace_by_class_names(segments_df, 'positive_labels', class_labels_df, chunk_size=args.chunk_size)),
+        ("vectorized, no copy", lambda: utils.replace_by_class_names(
+            segments_df.copy(), 'positive_labels', class_labels_df, copy=False, chunk_size=args.chunk_size)),
+        ("vectorized, as_list", lambda: utils.replace_by_class_names(
+            segments_df, 'positive_labels', class_labels_df, as_list=True, chunk_size=args.chunk_size)),
+    ]
+    print(f"{'method':<22} {'seconds':>8} {'speedup':>8} {'peak MiB':>9}")
+    reference = None
+    for name, fn in runs:
+        elapsed, peak, result = measure(fn)
+        if reference is None:
+            reference, baseline = result, elapsed
+        elif "as_list" not in name:
+            pd.testing.assert_frame_equal(result, reference)
+        print(f"{name:<22} {elapsed:>8.3f} {baseline / elapsed:>7.1f}x {peak / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Time how long `result_store.JsonlResultStore` takes to open an existing run: with its
+checkpoint and id snapshot (resume), with the checkpoint but no snapshot (the processed and
+error logs are read) and without either (full scan of the results), for growing numbers of
+synthetic results of realistic size (~15 questions each). The run ends with a few commits
+after the last snapshot, so the resume also parses a log tail.
+
+Usage (from the project root):
+    python code/benchmarks/bench_resume.py --sizes 1000 10000 50000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import result_store  # noqa: E402
+
+
+def synthetic_result(video_index, first_question_id):
+    return {
+        "oid": video_index,
+        "caption": "A man is talking while a dog barks in the background and a car passes by. " * 2,
+        "video_id": f"video{video_index:08d}",
+        "prompt": "You are provided with 8 sequential video frames, " + "instructions " * 300,
+        "questions": [
+            {
+                "question": "What is the dog doing in the video?",
+                "options": ["Barking", "Sleeping", "Running", "Eating"],
+                "correct_answer_idx": 0,
+                "rephrased_answers": ["It barks", "Barking loudly", "The dog is barking"],
+                "quality_rating": "obvious",
+                "modality": "audio-visual",
+                "category": "action",
+                "source_tags": ["frames", "audio"],
+                "id": first_question_id + offset,
+            }
+            for offset in range(15)
+        ],
+    }
+
+
+def open_time(directory):
+    start = time.perf_counter()
+    store = result_store.JsonlResultStore(directory, "val")
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed, store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark result store resume time.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'results':>8} {'results MiB':>12} {'checkpoint ms':>14} {'no snapshot ms':>15} {'full scan ms':>13}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = result_store.JsonlResultStore(directory, "val", fsync_every=1000, snapshot_every=997)
+            for video_index in range(size):
+                store.add_result(synthetic_result(video_index, video_index * 15 + 1))
+            # Leave the run as a crash would: the last commits are not in the snapshot
+            store.sync()
+            results_mib = result_store.jsonl_paths(directory, "val")["results"].stat().st_size / 2**20
+
+            resume_time, resumed = open_time(directory)
+            result_store.snapshot_path(directory, "val").unlink()
+            logs_time, from_logs = open_time(directory)
+            result_store.checkpoint_path(directory, "val").unlink()
+            scan_time, scanned = open_time(directory)
+            assert resumed.last_question_id == from_logs.last_question_id == scanned.last_question_id == size * 15
+            assert resumed.processed_videos == from_logs.processed_videos == scanned.processed_videos
+
+        print(
+            f"{size:>8} {results_mib:>12.1f} {resume_time * 1000:>14.1f} {logs_time * 1000:>15.1f} "
+            f"{scan_time * 1000:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
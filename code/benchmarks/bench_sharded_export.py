@@ -0,0 +1,91 @@
+"""
+Time `prepare_hf_dataset.export_dataset` with one file per split against sharded exports
+(`num_shards` and `max_shard_bytes`) on synthetic flattened splits of the release size, with
+the shards written one after another and in parallel. The script checks that the shards of
+each split, read in name order, hold exactly the rows of the single-file export, and reports
+the shard sizes and the time to read train back with one reader and with one per shard.
+
+Usage (from the project root):
+    python code/benchmarks/bench_sharded_export.py --scale 1.0 --num-shards 8 --max-shard-bytes 32MB
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import prepare_hf_dataset  # noqa: E402
+from bench_jsonl_export import RELEASE_SIZES, write_split  # noqa: E402
+
+
+def split_bytes(output_dir, hf_split):
+    files = sorted((output_dir / "data" / "flattened").glob(f"{hf_split}[.-]*"))
+    return files, b"".join(path.read_bytes() for path in files)
+
+
+def count_rows(path):
+    with path.open("rb") as f:
+        return sum(1 for _ in f)
+
+
+def timed_read(files, workers):
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = sum(pool.map(count_rows, files))
+    else:
+        rows = sum(count_rows(path) for path in files)
+    return rows, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sharded Hugging Face export.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the release split sizes.")
+    parser.add_argument("--num-shards", type=int, default=8)
+    parser.add_argument("--max-shard-bytes", type=prepare_hf_dataset.parse_size, default="32MB")
+    args = parser.parse_args()
+    parallel = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_dir = Path(directory) / "source"
+        source_dir.mkdir()
+        for split, size in RELEASE_SIZES.items():
+            write_split(source_dir / f"combined_dataset_{split}_flattened.json", int(size * args.scale))
+
+        runs = [
+            ("one file per split", {}, parallel),
+            (f"num_shards={args.num_shards}, workers=1", {"num_shards": args.num_shards}, 1),
+            (f"num_shards={args.num_shards}, workers={parallel}", {"num_shards": args.num_shards}, parallel),
+            (f"max_shard_bytes={args.max_shard_bytes}", {"max_shard_bytes": args.max_shard_bytes}, parallel),
+        ]
+        print(f"{'export':<36} {'seconds':>8} {'train shards':>13} {'largest MiB':>12}")
+        outputs = []
+        for index, (name, options, workers) in enumerate(runs):
+            output_dir = Path(directory) / f"export_{index}"
+            start = time.perf_counter()
+            summary = prepare_hf_dataset.export_dataset(
+                source_dir, output_dir, clean=True, workers=workers, validate=False, **options
+            )
+            elapsed = time.perf_counter() - start
+            train_files = summary["manifest"]["train"]["files"]
+            largest = max(file["bytes"] for file in train_files) / 2**20
+            print(f"{name:<36} {elapsed:>8.2f} {len(train_files):>13} {largest:>12.1f}")
+            outputs.append(output_dir)
+            for hf_split in summary["default"]:
+                assert split_bytes(output_dir, hf_split)[1] == split_bytes(outputs[0], hf_split)[1], (name, hf_split)
+
+        print()
+        print(f"{'read train':<36} {'seconds':>8}")
+        single_rows, single_seconds = timed_read(split_bytes(outputs[0], "train")[0], 1)
+        shard_files = split_bytes(outputs[2], "train")[0]
+        shard_rows, shard_seconds = timed_read(shard_files, min(parallel, len(shard_files)))
+        assert single_rows == shard_rows, (single_rows, shard_rows)
+        print(f"{'one file, one reader':<36} {single_seconds:>8.2f}")
+        print(f"{f'{len(shard_files)} shards, {min(parallel, len(shard_files))} readers':<36} {shard_seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
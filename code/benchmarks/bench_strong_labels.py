@@ -0,0 +1,64 @@
+"""
+Time the strong-label timing-string reconstruction of `prompt_builder` on the full
+`audioset_eval_strong.tsv`: the former per-group `iterrows` join against
+`reconstruct_strong_timing` (string and structured output). The script checks that the
+string outputs are identical before reporting timings.
+
+Label replacement is left out; only the per-row formatting and aggregation are measured.
+
+Usage (from the project root):
+    python code/benchmarks/bench_strong_labels.py --tsv code/audioset/audioset_eval_strong.tsv
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import prompt_builder  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_TSV = ROOT / "code" / "audioset" / "audioset_eval_strong.tsv"
+
+
+def reconstruct_iterrows(strong_df):
+    return strong_df.groupby(["video_id", "video_start_time"]).apply(
+        lambda group: '; '.join(f"{row['start_time_seconds']}s-{row['end_time_seconds']}s -> {row['label']}" for _, row in group.iterrows())
+    ).reset_index().rename({0: "timing_string"}, axis=1)
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark strong-label timing-string reconstruction.")
+    parser.add_argument("--tsv", type=Path, default=DEFAULT_TSV)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    strong_df = pd.read_csv(args.tsv, sep="\t")
+    strong_df[["video_id", "video_start_time"]] = strong_df["segment_id"].str.extract(r"(.+)_(\d+)$")
+    strong_df["video_start_time"] = strong_df["video_start_time"].astype(int) / 1000
+    strong_df = strong_df.drop(columns=["segment_id"])
+
+    iterrows_time, expected = best_time(lambda: reconstruct_iterrows(strong_df), args.repeat)
+    string_time, result = best_time(lambda: prompt_builder.reconstruct_strong_timing(strong_df), args.repeat)
+    structured_time, _ = best_time(lambda: prompt_builder.reconstruct_strong_timing(strong_df, structured=True), args.repeat)
+    pd.testing.assert_frame_equal(result, expected)
+
+    print(f"{len(strong_df)} rows, {len(result)} (video_id, video_start_time) groups")
+    print(f"{'method':<22} {'seconds':>8} {'speedup':>8}")
+    for name, seconds in [("groupby.apply/iterrows", iterrows_time), ("vectorized string", string_time), ("vectorized structured", structured_time)]:
+        print(f"{name:<22} {seconds:>8.3f} {iterrows_time / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Time the quality validation of a synthetic flattened train split (177,132 questions with
+option-count, duplicate-option, rephrased-count, modality and category issues): the
+item-by-item `validate` against `validate_table` on an in-memory pyarrow Table and pandas
+DataFrame, and the `validate_flattened_file` gate that `prepare_hf_dataset` runs before an
+export. Also times `fix_file` (fix and validation in one pass) against fixing followed by
+a separate validation pass over the written file. The script checks that all counts agree.
+
+Usage (from the project root):
+    python code/benchmarks/bench_validation.py --scale 1.0
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import fix_dataset_quality_issues as fixer  # noqa: E402
+import prepare_hf_dataset  # noqa: E402
+from bench_jsonl_export import RELEASE_SIZES, synthetic_question  # noqa: E402
+
+
+def questionable_question(index):
+    question = synthetic_question(index)
+    if index % 97 == 0:
+        question["options"] = question["options"][:3]
+    if index % 89 == 0:
+        question["options"][-1] = " guitar "  # duplicates "Guitar" after strip().lower()
+    if index % 1009 == 0:
+        question["options"] = None
+    if index % 113 == 0:
+        question["rephrased_answers"].append("One answer too many")
+    if index % 131 == 0:
+        question["modality"] = "audio visual"
+    if index % 733 == 0:
+        del question["modality"]
+    if index % 151 == 0:
+        question["category"] = "counting"
+    return question
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dataset quality validation.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the release train split size.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    questions = [questionable_question(index) for index in range(int(RELEASE_SIZES["train"] * args.scale))]
+    table = pa.Table.from_pylist(questions, schema=prepare_hf_dataset.arrow_schema())
+    frame = table.to_pandas()
+
+    timings = {}
+    timings["validate (items)"], expected = best_time(lambda: fixer.validate(questions, flattened=True), args.repeat)
+    timings["validate_table (Arrow)"], from_table = best_time(lambda: fixer.validate_table(table), args.repeat)
+    timings["validate_table (pandas)"], from_frame = best_time(lambda: fixer.validate_table(frame), args.repeat)
+    assert from_table == from_frame == expected, (expected, from_table, from_frame)
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = Path(directory) / "combined_dataset_train_flattened.json"
+        source_text = json.dumps(questions, ensure_ascii=False, indent=2)
+        source_path.write_text(source_text, encoding="utf-8")
+        timings["validate_flattened_file (gate)"], from_file = best_time(
+            lambda: fixer.validate_flattened_file(source_path), 1
+        )
+        assert from_file == expected, (expected, from_file)
+
+        def fix_then_validate():
+            source_path.write_text(source_text, encoding="utf-8")
+            fixer.fix_file(source_path)
+            return fixer.validate(prepare_hf_dataset.iter_json_array(source_path), flattened=True)
+
+        def fused():
+            source_path.write_text(source_text, encoding="utf-8")
+            return fixer.fix_file(source_path)[0]["post_fix_validation"]
+
+        timings["fix + validation pass"], two_pass = best_time(fix_then_validate, 1)
+        timings["fix_file (fused)"], one_pass = best_time(fused, 1)
+        assert one_pass == two_pass, (one_pass, two_pass)
+
+    print(f"{len(questions)} questions, issues: {expected}")
+    print(f"{'method':<32} {'ms':>9}")
+    for name, seconds in timings.items():
+        print(f"{name:<32} {seconds * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
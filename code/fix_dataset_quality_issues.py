@@ -1,11 +1,28 @@
+import argparse
 import copy
+import hashlib
 import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from prepare_hf_dataset import iter_json_array
+
 
 ROOT = Path(__file__).resolve().parents[1]
 SOURCE_DIR = ROOT / "data" / "data"
 REPORT_PATH = ROOT / "data" / "dataset_quality_fix_report.json"
+# Per-item content hashes of the fixed files and the rules they were fixed with, for incremental runs
+JOURNAL_NAME = "dataset_quality_fix_journal.json"
+
+# Bump when planned_fixes changes behaviour; the rule tables below are hashed automatically
+RULES_REVISION = 1
+# Written into every report entry: "changes" lists the samples this invocation changed, so an
+# item fixed by an earlier run is not listed again, whether the run is full or incremental
+CHANGES_SCOPE = "this run"
 
 TEMPORAL_EXTRA_OPTIONS = [
     "Both events happen at the same time",
@@ -60,6 +77,8 @@ DUPLICATE_OPTION_FIXES = {
 VALID_MODALITIES = {"visual", "audio", "audio-visual"}
 VALID_CATEGORIES = {"relative-position", "description", "action", "temporal", "count", "location"}
 
+ISSUE_KEYS = ("option_count", "duplicate_options", "rephrased_count", "invalid_modality", "invalid_category")
+
 
 def infer_modality(source_tags):
     tags = set(source_tags or [])
@@ -70,115 +89,440 @@ def infer_modality(source_tags):
     return "visual"
 
 
-def fix_question(question):
-    original = copy.deepcopy(question)
-    changes = []
+def planned_fixes(question):
+    """The (field, new value, change name) fixes `question` needs, in order; the question is not modified."""
+    fixes = []
 
     options = question.get("options")
     if isinstance(options, list) and len(options) < 4:
-        question["options"] = options + TEMPORAL_EXTRA_OPTIONS[: 4 - len(options)]
-        changes.append("expanded_options_to_four")
+        fixes.append(("options", options + TEMPORAL_EXTRA_OPTIONS[: 4 - len(options)], "expanded_options_to_four"))
 
-    qid = question.get("id")
-    duplicate_key = (question.get("video_id"), qid)
+    duplicate_key = (question.get("video_id"), question.get("id"))
     if duplicate_key in DUPLICATE_OPTION_FIXES:
-        question["options"] = DUPLICATE_OPTION_FIXES[duplicate_key]
-        changes.append("deduplicated_options")
+        fixes.append(("options", DUPLICATE_OPTION_FIXES[duplicate_key], "deduplicated_options"))
 
     rephrased = question.get("rephrased_answers")
     if isinstance(rephrased, list) and len(rephrased) > 3:
-        question["rephrased_answers"] = rephrased[:3]
-        changes.append("trimmed_rephrased_answers_to_three")
+        fixes.append(("rephrased_answers", rephrased[:3], "trimmed_rephrased_answers_to_three"))
 
     if question.get("modality") not in VALID_MODALITIES:
-        question["modality"] = infer_modality(question.get("source_tags"))
-        changes.append("corrected_invalid_modality")
+        fixes.append(("modality", infer_modality(question.get("source_tags")), "corrected_invalid_modality"))
 
     if question.get("category") not in VALID_CATEGORIES:
-        question["category"] = "description"
-        changes.append("corrected_invalid_category")
+        fixes.append(("category", "description", "corrected_invalid_category"))
 
-    if changes:
-        return {
-            "id": qid,
-            "video_id": question.get("video_id"),
-            "question": question.get("question"),
-            "changes": changes,
-            "before": original,
-            "after": copy.deepcopy(question),
-        }
-    return None
+    return fixes
 
 
-def fix_flattened(data):
+def fix_question(question):
+    # Checks run first: only the few questions that change are copied for the report
+    fixes = planned_fixes(question)
+    if not fixes:
+        return None
+
+    original = copy.deepcopy(question)
+    for field, value, _ in fixes:
+        question[field] = value
+    return {
+        "id": question.get("id"),
+        "video_id": question.get("video_id"),
+        "question": question.get("question"),
+        "changes": [change for _, _, change in fixes],
+        "before": original,
+        "after": copy.deepcopy(question),
+    }
+
+
+def fix_flattened_item(item):
+    change = fix_question(item)
+    return [change] if change else []
+
+
+def fix_unflattened_parent(parent):
     report = []
-    for item in data:
-        change = fix_question(item)
+    for question in parent.get("questions", []):
+        question.setdefault("video_id", parent.get("video_id"))
+        change = fix_question(question)
         if change:
+            change["oid"] = parent.get("oid")
             report.append(change)
+        question.pop("video_id", None)
     return report
 
 
+def fix_flattened(data):
+    return [change for item in data for change in fix_flattened_item(item)]
+
+
 def fix_unflattened(data):
-    report = []
-    for parent in data:
-        for question in parent.get("questions", []):
-            question.setdefault("video_id", parent.get("video_id"))
-            change = fix_question(question)
-            if change:
-                change["oid"] = parent.get("oid")
-                report.append(change)
-            question.pop("video_id", None)
-    return report
+    return [change for parent in data for change in fix_unflattened_parent(parent)]
+
+
+def tally_issues(item, issues):
+    """Add the issues of one question to the `issues` counts."""
+    options = item.get("options")
+    if not isinstance(options, list) or len(options) != 4:
+        issues["option_count"] += 1
+    elif len({str(option).strip().lower() for option in options}) != len(options):
+        issues["duplicate_options"] += 1
+
+    rephrased = item.get("rephrased_answers")
+    if not isinstance(rephrased, list) or len(rephrased) != 3:
+        issues["rephrased_count"] += 1
+
+    if item.get("modality") not in VALID_MODALITIES:
+        issues["invalid_modality"] += 1
+    if item.get("category") not in VALID_CATEGORIES:
+        issues["invalid_category"] += 1
 
 
 def validate(data, flattened):
-    issues = {
-        "option_count": 0,
-        "duplicate_options": 0,
-        "rephrased_count": 0,
-        "invalid_modality": 0,
-        "invalid_category": 0,
-    }
-    items = data if flattened else [q for parent in data for q in parent.get("questions", [])]
+    """Count the remaining issues in `data`, a list or any iterable of items."""
+    issues = dict.fromkeys(ISSUE_KEYS, 0)
+    items = data if flattened else (q for parent in data for q in parent.get("questions", []))
     for item in items:
-        options = item.get("options")
-        if not isinstance(options, list) or len(options) != 4:
-            issues["option_count"] += 1
-        elif len({str(option).strip().lower() for option in options}) != len(options):
-            issues["duplicate_options"] += 1
-
-        rephrased = item.get("rephrased_answers")
-        if not isinstance(rephrased, list) or len(rephrased) != 3:
-            issues["rephrased_count"] += 1
-
-        if item.get("modality") not in VALID_MODALITIES:
-            issues["invalid_modality"] += 1
-        if item.get("category") not in VALID_CATEGORIES:
-            issues["invalid_category"] += 1
+        tally_issues(item, issues)
     return issues
 
 
-def main():
+def validate_table(table):
+    """
+    Columnar `validate` for a flattened split as a pyarrow Table or pandas DataFrame with
+    list columns: the same counts, from whole-column length, comparison and membership kernels.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not isinstance(table, pa.Table):
+        table = pa.Table.from_pandas(table, preserve_index=False)
+
+    def count(mask):
+        return pc.sum(pc.fill_null(mask, True)).as_py() or 0
+
+    options = table["options"]
+    has_four_options = pc.fill_null(pc.equal(pc.list_value_length(options), 4), False)
+    four_options = pc.filter(options, has_four_options)
+    # Normalized like str(option).strip().lower(); a null option compares as str(None)
+    columns = [
+        pc.utf8_lower(pc.utf8_trim_whitespace(pc.fill_null(pc.list_element(four_options, i), "None")))
+        for i in range(4)
+    ]
+    pairs = [(i, j) for i in range(4) for j in range(i + 1, 4)]
+    duplicates = pc.equal(columns[0], columns[1])
+    for i, j in pairs[1:]:
+        duplicates = pc.or_(duplicates, pc.equal(columns[i], columns[j]))
+
+    return {
+        "option_count": count(pc.invert(has_four_options)),
+        "duplicate_options": count(duplicates),
+        "rephrased_count": count(pc.not_equal(pc.list_value_length(table["rephrased_answers"]), 3)),
+        "invalid_modality": count(pc.invert(pc.is_in(table["modality"], value_set=pa.array(sorted(VALID_MODALITIES))))),
+        "invalid_category": count(pc.invert(pc.is_in(table["category"], value_set=pa.array(sorted(VALID_CATEGORIES))))),
+    }
+
+
+def validate_flattened_file(source_path: Path) -> dict:
+    """
+    `validate` of a flattened split file, streamed item by item. Building Arrow batches for
+    validate_table costs more than the per-item tally saves (bench_validation.py), since the
+    source is a JSON array that has to be parsed into Python objects either way.
+    """
+    return validate(iter_json_array(source_path), flattened=True)
+
+
+def peak_rss_mib():
+    """Peak resident memory of this process, where /proc provides it (Linux); None elsewhere."""
+    status = Path("/proc/self/status")
+    if not status.exists():
+        return None
+    return int(status.read_text().split("VmHWM:")[1].split()[0]) / 1024
+
+
+def rules_version() -> str:
+    """Hash of every rule except the per-question DUPLICATE_OPTION_FIXES, which are tracked entry by entry."""
+    rules = [RULES_REVISION, TEMPORAL_EXTRA_OPTIONS, sorted(VALID_MODALITIES), sorted(VALID_CATEGORIES)]
+    return hashlib.sha256(json.dumps(rules).encode("utf-8")).hexdigest()[:16]
+
+
+def duplicate_fix_hashes() -> dict:
+    return {
+        json.dumps(list(key)): hashlib.sha256(json.dumps(options).encode("utf-8")).hexdigest()[:16]
+        for key, options in DUPLICATE_OPTION_FIXES.items()
+    }
+
+
+def serialize_item(item) -> bytes:
+    # An item as it appears in json.dumps(data, ensure_ascii=False, indent=2); JSON strings
+    # cannot hold raw newlines, so the replace only indents the item one level
+    return json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  ").encode("utf-8")
+
+
+def item_hash(item_bytes: bytes) -> str:
+    return hashlib.blake2b(item_bytes, digest_size=8).hexdigest()
+
+
+def question_ids(item, flattened):
+    return [item.get("id")] if flattened else [question.get("id") for question in item.get("questions", [])]
+
+
+def fix_and_record(item, flattened, fix_item, file_journal, validation):
+    """Fix one top-level item and record its bytes, hash, ids and remaining issues. Returns (bytes, changes)."""
+    changes = fix_item(item)
+    issues = dict.fromkeys(ISSUE_KEYS, 0)
+    for question in (item,) if flattened else item.get("questions", []):
+        tally_issues(question, issues)
+    item_bytes = serialize_item(item)
+    digest = item_hash(item_bytes)
+    file_journal["items"][digest] = question_ids(item, flattened)
+    if any(issues.values()):
+        file_journal["issues"][digest] = issues
+    for key, value in issues.items():
+        validation[key] += value
+    return item_bytes, changes
+
+
+def replace_if_changed(tmp_path: Path, target_path: Path, digest: str) -> bool:
+    """Rename `tmp_path` over `target_path` unless the target already has that content."""
+    if target_path.exists() and hashlib.sha256(target_path.read_bytes()).hexdigest() == digest:
+        tmp_path.unlink()
+        return False
+    os.replace(tmp_path, target_path)
+    return True
+
+
+def fix_file(source_path: Path):
+    """
+    Fix one combined_dataset_*.json file item by item and replace it atomically.
+
+    Items are read with iter_json_array, fixed, tallied for the post-fix validation and
+    written to a temporary file next to the source in the layout of
+    `json.dumps(data, ensure_ascii=False, indent=2)`, all in one pass; the temporary file is
+    then renamed over the source unless nothing changed. Returns the report entry (the
+    changes made by this call, see CHANGES_SCOPE), run stats and the file's journal entry.
+    """
+    start = time.perf_counter()
+    flattened = "flattened" in source_path.name
+    fix_item = fix_flattened_item if flattened else fix_unflattened_parent
+    tmp_path = source_path.with_name(f".{source_path.name}.{os.getpid()}.tmp")
+    source_bytes = source_path.stat().st_size
+    file_journal = {"sha256": None, "items": {}, "issues": {}}
+    report = []
+    validation = dict.fromkeys(ISSUE_KEYS, 0)
+    items = 0
+    digest = hashlib.sha256()
+    try:
+        with tmp_path.open("wb") as target_file:
+            def write(data):
+                target_file.write(data)
+                digest.update(data)
+
+            write(b"[")
+            for item in iter_json_array(source_path):
+                item_bytes, changes = fix_and_record(item, flattened, fix_item, file_journal, validation)
+                report.extend(changes)
+                write(b",\n  " if items else b"\n  ")
+                write(item_bytes)
+                items += 1
+            write(b"\n]" if items else b"]")
+        file_journal["sha256"] = digest.hexdigest()
+        written = replace_if_changed(tmp_path, source_path, file_journal["sha256"])
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    entry = report_entry(report, validation)
+    stats = {
+        "mode": "full", "items": items, "examined": items, "written": written, "bytes": source_bytes,
+        "seconds": time.perf_counter() - start, "peak_rss_mib": peak_rss_mib(),
+    }
+    return entry, stats, file_journal
+
+
+ITEM_START = re.compile(rb"\n  \{")
+
+
+def item_spans(data: bytes):
+    """
+    Byte spans of the top-level items of a file in the fix_file layout, or None for any other
+    layout. Nested lines are indented deeper and strings hold no raw newlines, so a line that
+    starts with exactly two spaces and "{" always starts a top-level item.
+    """
+    if data == b"[]":
+        return []
+    if not (data.startswith(b"[\n  {") and data.endswith(b"\n  }\n]")):
+        return None
+    starts = [match.start() + 3 for match in ITEM_START.finditer(data)]
+    # Items are separated by ",\n  ": an item ends 4 bytes before the next one starts
+    ends = [next_start - 4 for next_start in starts[1:]] + [len(data) - 2]
+    return list(zip(starts, ends))
+
+
+def report_entry(changes: list, validation: dict) -> dict:
+    return {
+        "changes_scope": CHANGES_SCOPE,
+        "changed_samples": len(changes),
+        "changes": changes,
+        "post_fix_validation": validation,
+    }
+
+
+def journal_validation(file_journal: dict) -> dict:
+    """Post-fix validation of a file from the issue counts its journal keeps per item."""
+    validation = dict.fromkeys(ISSUE_KEYS, 0)
+    for issues in file_journal["issues"].values():
+        for key, value in issues.items():
+            validation[key] += value
+    return validation
+
+
+def refix_file(source_path: Path, file_journal: dict, target_ids: frozenset):
+    """
+    Incremental fix_file: only items whose bytes are not in the journal (new or edited since
+    the last run) or that hold a question id in `target_ids` (a changed DUPLICATE_OPTION_FIXES
+    entry) are parsed and fixed; all other items are kept as they are. Like fix_file, the
+    report entry lists only the changes of this call. Falls back to fix_file for files not in
+    the fix_file layout.
+    """
+    start = time.perf_counter()
+    flattened = "flattened" in source_path.name
+    fix_item = fix_flattened_item if flattened else fix_unflattened_parent
+    data = source_path.read_bytes()
+    stats = {"mode": "unchanged", "items": 0, "examined": 0, "written": False, "bytes": len(data)}
+
+    known_ids = {qid for ids in file_journal["items"].values() for qid in ids}
+    if hashlib.sha256(data).hexdigest() == file_journal["sha256"] and not target_ids & known_ids:
+        stats.update(items=len(file_journal["items"]), seconds=time.perf_counter() - start, peak_rss_mib=peak_rss_mib())
+        return report_entry([], journal_validation(file_journal)), stats, file_journal
+
+    spans = item_spans(data)
+    if spans is None:
+        return fix_file(source_path)
+
+    new_journal = {"sha256": None, "items": {}, "issues": {}}
+    validation = dict.fromkeys(ISSUE_KEYS, 0)
+    report = []
+    pieces = []
+    for item_start, item_end in spans:
+        piece = data[item_start:item_end]
+        digest = item_hash(piece)
+        ids = file_journal["items"].get(digest)
+        if ids is not None and not target_ids.intersection(ids):
+            pieces.append(piece)
+            new_journal["items"][digest] = ids
+            issues = file_journal["issues"].get(digest)
+            if issues:
+                new_journal["issues"][digest] = issues
+                for key, value in issues.items():
+                    validation[key] += value
+            continue
+        item_bytes, changes = fix_and_record(json.loads(piece), flattened, fix_item, new_journal, validation)
+        report.extend(changes)
+        pieces.append(item_bytes)
+        stats["examined"] += 1
+
+    new_data = b"[\n  " + b",\n  ".join(pieces) + b"\n]" if pieces else b"[]"
+    new_journal["sha256"] = hashlib.sha256(new_data).hexdigest()
+    if new_data != data:
+        tmp_path = source_path.with_name(f".{source_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(new_data)
+        os.replace(tmp_path, source_path)
+        stats["written"] = True
+
+    entry = report_entry(report, validation)
+    stats.update(mode="incremental", items=len(spans), seconds=time.perf_counter() - start, peak_rss_mib=peak_rss_mib())
+    return entry, stats, new_journal
+
+
+def process_file(source_path: Path, file_journal=None, target_ids=frozenset()):
+    if file_journal is None:
+        return fix_file(source_path)
+    return refix_file(source_path, file_journal, target_ids)
+
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    """Atomically replace `path` with `text`, unless it already holds exactly that."""
+    data = text.encode("utf-8")
+    if path.exists() and path.read_bytes() == data:
+        return False
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def load_json(path: Path):
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+
+def fix_dataset(
+    source_dir: Path = SOURCE_DIR, report_path: Path = REPORT_PATH, workers: int = None, incremental: bool = True
+) -> dict:
+    """
+    Fix every split file, each in its own process (`workers=1` fixes them one by one in this process).
+
+    With `incremental`, the journal and report of the previous run are used to re-examine only
+    new or edited items and the questions of changed DUPLICATE_OPTION_FIXES entries; any
+    other rule change, or a missing journal, means a full run. Either way each report entry
+    lists only the changes this run made (CHANGES_SCOPE); its post_fix_validation always
+    covers the whole file. Files, the report and the journal are only rewritten when their
+    content changes.
+    """
+    source_paths = sorted(source_dir.glob("combined_dataset_*.json"))
+    journal_path = report_path.with_name(JOURNAL_NAME)
+    journal = load_json(journal_path) if incremental else None
+    previous_report = (load_json(report_path) if incremental else None) or {}
+    if journal is None or journal["rules_version"] != rules_version():
+        journal = {"files": {}, "duplicate_fixes": {}}
+
+    duplicate_fixes = duplicate_fix_hashes()
+    changed_keys = {
+        key for key in duplicate_fixes.keys() | journal["duplicate_fixes"].keys()
+        if duplicate_fixes.get(key) != journal["duplicate_fixes"].get(key)
+    }
+    target_ids = frozenset(json.loads(key)[1] for key in changed_keys)
+    file_journals = [journal["files"].get(source_path.name) for source_path in source_paths]
+    targets = [target_ids] * len(source_paths)
+
+    workers = workers or min(len(source_paths), os.cpu_count() or 1)
+    if workers > 1:
+        # One fresh process per file, so each reports its own peak memory
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"), max_tasks_per_child=1
+        ) as pool:
+            results = list(pool.map(process_file, source_paths, file_journals, targets))
+    else:
+        results = [process_file(*args) for args in zip(source_paths, file_journals, targets)]
+
     full_report = {}
+    new_journal = {"rules_version": rules_version(), "duplicate_fixes": duplicate_fixes, "files": {}}
+    print(f"{'file':<42} {'mode':<12} {'items':>8} {'examined':>9} {'written':>8} {'seconds':>8} {'MiB/s':>7} {'peak RSS MiB':>13}")
+    for source_path, (entry, stats, file_journal) in zip(source_paths, results):
+        full_report[source_path.name] = entry
+        new_journal["files"][source_path.name] = file_journal
+        peak = "n/a" if stats["peak_rss_mib"] is None else f"{stats['peak_rss_mib']:.1f}"
+        print(
+            f"{source_path.name:<42} {stats['mode']:<12} {stats['items']:>8} {stats['examined']:>9} "
+            f"{'yes' if stats['written'] else 'no':>8} {stats['seconds']:>8.2f} "
+            f"{stats['bytes'] / 2**20 / stats['seconds']:>7.1f} {peak:>13}"
+        )
+
+    # Serializing the report is the slowest step of a run where nothing changed, so skip it then
+    if full_report == previous_report and new_journal == journal and report_path.exists():
+        return full_report
+    write_text_if_changed(report_path, json.dumps(full_report, ensure_ascii=False, indent=2))
+    write_text_if_changed(journal_path, json.dumps(new_journal, separators=(",", ":")))
+    return full_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fix known quality issues in the combined dataset files.")
+    parser.add_argument("--source-dir", type=Path, default=SOURCE_DIR)
+    parser.add_argument("--report-path", type=Path, default=REPORT_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="Files fixed in parallel (default: one per CPU).")
+    parser.add_argument("--full", action="store_true", help="Re-examine every question instead of only changed ones.")
+    args = parser.parse_args()
 
-    for source_path in sorted(SOURCE_DIR.glob("combined_dataset_*.json")):
-        flattened = "flattened" in source_path.name
-        data = json.loads(source_path.read_text(encoding="utf-8"))
-        report = fix_flattened(data) if flattened else fix_unflattened(data)
-        validation = validate(data, flattened)
-
-        source_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-        full_report[source_path.name] = {
-            "changed_samples": len(report),
-            "changes": report,
-            "post_fix_validation": validation,
-        }
-
-    REPORT_PATH.write_text(
-        json.dumps(full_report, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    fix_dataset(args.source_dir, args.report_path, args.workers, incremental=not args.full)
 
 
 if __name__ == "__main__":
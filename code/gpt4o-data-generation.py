@@ -1,10 +1,17 @@
 # %%
 
+import asyncio
 import base64
 import os
 import httpx
 from openai import OpenAI
 import prompt_builder
+import precompute_frames
+import selecting_frames
+import async_completions
+import result_store
+import sharding
+import oid_allocator
 import pandas as pd
 import random
 import traceback
@@ -28,54 +35,84 @@ def encode_image(image_path):
         return base64.b64encode(image_file.read()).decode("utf-8")
 
 openai_endpoint_url = "/v1/openai/gpt4o/chat/completions"
+api_base_url = "https://xxx-openai-apigw.azure-api.net"  # or a local stub_api_server.py, e.g. "http://127.0.0.1:8808"
 
 OPENAI_API_KEY = "" # YOUR OpenAI API Key here
 
+completion_params = dict(temperature=0, top_p=0.95, max_tokens=3000)
+
+# Request mode: one blocking request at a time, or asyncio with several requests in flight
+use_async = False
+max_concurrency = 8  # requests in flight (async mode)
+requests_per_minute = 60  # gateway quota (async mode); None disables the limit
+tokens_per_minute = 150_000  # gateway quota (async mode); None disables the limit
+
+# Sharded mode: start several copies of this script with GEN_WORKER_ID=<name> (any unique name).
+# Each claims videos from work_queue_{split}.sqlite and writes its own shard under shards/;
+# `python sharding.py merge --split {split} --to-json` assigns oids and final question ids afterwards.
+# The request quotas above apply per worker process.
+worker_id = os.environ.get("GEN_WORKER_ID")
+claim_batch_size = 4  # videos leased per queue transaction
+lease_seconds = 600  # a claimed video is handed to another worker if not finished within this time
+
 # %%
 # read video_ids
 split = "val" # change to train, val, test
 valor_data = pd.read_csv(f'./processed_{split}_data.csv', on_bad_lines='skip') 
 df = valor_data[["video_id","caption"]].drop_duplicates(subset=["video_id"])
 
+# Read frames and prompts produced by precompute_frames.py instead of selecting them inline.
+# Set to None to run frame selection inside the loop.
+frame_cache_dir = None  # e.g. "./frame_cache"
+
+# Frame encoding, the same default as precompute_frames.py so cached entries are found:
+# full-size JPEGs at quality 95. `detail: low` images are downscaled to 512px by the API, so
+# {"max_side": 512, "quality": 85, "format": "jpeg"} uploads far fewer bytes for the same
+# input (precompute with --max-side 512 --quality 85 to match); format can also be "webp".
+frame_encoding = dict(precompute_frames.DEFAULT_FRAME_ENCODING)
+frame_encoder = selecting_frames.FrameEncoder(**frame_encoding, threads=4)
+frame_store = precompute_frames.PrecomputedFrameStore(frame_cache_dir, encoding=frame_encoding) if frame_cache_dir else None
+
+# Frames selected inside the loop are kept in a size-bounded FrameCache (shared with
+# precompute_frames.py), so reruns and retried videos skip decoding. Set to None to disable.
+selection_cache_dir = str(precompute_frames.DEFAULT_SELECTION_CACHE_DIR)
+selection_cache = selecting_frames.FrameCache(selection_cache_dir) if selection_cache_dir else None
+
 # %%
 def update_base_url(request: httpx.Request) -> None:
     if request.url.path == "/chat/completions":
         request.url = request.url.copy_with(path=openai_endpoint_url)
 
-# File paths for storing results
-results_file = f"results_gpt4o_{split}.json"
-processed_videos_file = f"processed_videos_{split}.json"
-error_videos_file = f"error_videos_{split}.json"
 videoid_oid_file = "videoid_oid.json"
 
-# Initialize files if they do not exist
-def initialize_file(file_path, default_value):
-    if not os.path.exists(file_path):
-        with open(file_path, 'w') as f:
-            json.dump(default_value, f, indent=4)
-
-initialize_file(results_file, [])
-initialize_file(processed_videos_file, [])
-initialize_file(error_videos_file, [])
-
-with open(videoid_oid_file, 'r', encoding='utf-8') as f:
-    videoid_oid = json.load(f)
-
-with open(processed_videos_file, 'r', encoding='utf-8') as f:
-    processed_videos = set(json.load(f))
-
-with open(error_videos_file, 'r', encoding='utf-8') as f:
-    error_videos = json.load(f)
-    error_videos_dict = {entry['video_id']: entry for entry in error_videos}
-    error_videos = set(error_videos_dict.keys())
-
-# Get the last question ID from results.json
-with open(results_file, 'r', encoding='utf-8') as f:
-    results = json.load(f)
-    last_question_id = max((question.get("id", 0) for result in results for question in result.get("questions", [])), default=0)
+# Results, processed ids and errors are appended to results_gpt4o_{split}.jsonl etc.;
+# `python result_store.py --split {split} --to-json` converts them to the JSON list layout.
+# A run started with the JSON layout is carried over into the store on first use.
+if not result_store.jsonl_paths(".", split)["results"].exists() and os.path.exists(f"results_gpt4o_{split}.json"):
+    result_store.import_json(".", split)
+if worker_id:
+    # Workers leave the main store to the merge step; videos it already has are not queued
+    main_paths = result_store.jsonl_paths(".", split)
+    finished_videos = set(result_store.read_jsonl(main_paths["processed"]))
+    finished_videos |= {entry["video_id"] for entry in result_store.read_jsonl(main_paths["errors"])}
+    sharding.DEFAULT_SHARD_DIR.mkdir(exist_ok=True)
+    store = result_store.JsonlResultStore(sharding.DEFAULT_SHARD_DIR, sharding.shard_name(split, worker_id))
+    queue = sharding.WorkQueue(sharding.queue_path(".", split))
+    oids = None  # assigned by the merge step
+    export_json_on_finish = False
+else:
+    store = result_store.JsonlResultStore(".", split)
+    queue = None
+    export_json_on_finish = True  # rewrite the JSON layout once at the end of the run
+    # video_id -> oid mapping; seeded from videoid_oid.json, which is rewritten at the end of the run
+    oids = oid_allocator.OidAllocator("videoid_oid.sqlite", seed_json=videoid_oid_file)
+
+processed_videos = store.processed_videos
+error_videos = store.error_videos
+last_question_id = store.last_question_id  # provisional in sharded mode, renumbered by the merge step
 
 client = OpenAI(
-    base_url="https://xxx-openai-apigw.azure-api.net",
+    base_url=api_base_url,
     api_key=False,  # API key not used, and rather set below
     default_headers={
         "Ocp-Apim-Subscription-Key": OPENAI_API_KEY,
@@ -85,209 +122,255 @@ client = OpenAI(
 
 # Filter dataframe before loop
 df = df[~df['video_id'].isin(processed_videos | error_videos)]
-print(f"Processing {len(df)} videos")
+if worker_id:
+    df = df[~df['video_id'].isin(finished_videos)]
+    queue.add(df["video_id"].tolist())
+    print(f"Worker {worker_id}: {queue.counts()}")
+else:
+    print(f"Processing {len(df)} videos")
+
+if frame_store is not None:
+    # A store miss is only recorded as a per-video error; fail now rather than skip every video
+    missing = [video_id for video_id in df["video_id"] if not frame_store.contains(video_id)]
+    if missing and len(missing) == len(df):
+        raise FileNotFoundError(
+            f"None of the {len(df)} videos have precomputed frames in '{frame_cache_dir}' with these settings. "
+            f"Run precompute_frames.py --split {split} {frame_store.precompute_flags()} first."
+        )
+    if missing:
+        print(f"Warning: {len(missing)} of {len(df)} videos have no precomputed frames and will be recorded as errors")
 
-for row in tqdm(df.itertuples(index=False), total=len(df), desc="Processing videos"):
-    video_id = row.video_id
-    caption = row.caption
-    # tqdm.write(f"Processing video ID: {video_id}")
-    try:
-        prompt, frames_base64 = prompt_builder.generate_prompt_and_frames(video_id)
-        # print("===========================")
-        content = []
+# %%
+def load_prompt_and_frames(video_id):
+    if frame_store is not None:
+        return frame_store.load_prompt_and_frames(video_id)
+    return prompt_builder.generate_prompt_and_frames(video_id, cache=selection_cache, encoder=frame_encoder)
 
-        frames_to_process = frames_base64[:10]
+def build_messages(prompt, frames_base64):
+    content = []
 
-        for frame_base64 in frames_to_process:
-            content.append(
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{frame_base64}"},
-                    "detail": "low",
-                }
-            )
+    frames_to_process = frames_base64[:10]
+
+    for frame_base64 in frames_to_process:
         content.append(
             {
-                "type": "text",
-                "text": prompt,
+                "type": "image_url",
+                "image_url": {"url": f"data:{frame_encoder.mime_type};base64,{frame_base64}", "detail": "low"},
             }
         )
-        messages = [
-            {
-                "role": "system",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "You are an AI assistant that generates questions according to instructions.",
-                    }
-                ],
-            },
-            {
-                "role": "user",
-                "content": content,
-            },
-        ]
-
-        completion = completion_with_backoff(
-            model="no_effect",  # the model variable must be set, but has no effect, model selection done with URL
-            messages=messages,
-            temperature=0,
-            top_p=0.95,
-            max_tokens=3000,
-        )
-
-        # Assuming completion.choices[0].message.content is the string you're processing
-        content_str = completion.choices[0].message.content
-
-        # Find the first '{' and the last '}' in the string
-        start_idx = content_str.find('{')
-        end_idx = content_str.rfind('}')
-
-        # Check if both '{' and '}' were found
-        if start_idx != -1 and end_idx != -1:
-            json_str = content_str[start_idx:end_idx + 1]
-            try:
-                # Parse the JSON content
-                parsed_content = dict()
-                if video_id in videoid_oid:
-                    parsed_content["oid"] = videoid_oid[video_id]
-                else:
-                    new_oid = max(videoid_oid.values(), default=-1) + 1
-                    videoid_oid[video_id] = new_oid
-                    parsed_content["oid"] = new_oid
-                    with open(videoid_oid_file, 'w', encoding='utf-8') as f:
-                        json.dump(videoid_oid, f, indent=4)
-                parsed_content["caption"] = caption
-                parsed_content["video_id"] = video_id
-                parsed_content["prompt"] = prompt
-                parsed_content["questions"] = json.loads(json_str)["questions"]
-                
-                for question_item in parsed_content["questions"]:
-                    last_question_id += 1
-                    question_item["id"] = last_question_id
-                    options = question_item["options"]
-                    correct_answer_idx = question_item["correct_answer_idx"]
-                    correct_option = options[correct_answer_idx]
-                    random.shuffle(options)
-                    correct_answer_idx = options.index(correct_option)
-
-                    question_item["options"] = options
-                    question_item["correct_answer_idx"] = correct_answer_idx
-                
-
-                # Append the result to results.json
-                with open(results_file, 'r+', encoding='utf-8') as f:
-                    results = json.load(f)
-                    results.append(parsed_content)
-                    f.seek(0)  # Move the file pointer to the beginning of the file
-                    json.dump(results, f, indent=4)
-
-                # Append the video ID to processed_videos.json
-                with open(processed_videos_file, 'r+', encoding='utf-8') as f:
-                    processed_videos = json.load(f)
-                    processed_videos.append(video_id)
-                    f.seek(0)  # Move the file pointer to the beginning of the file
-                    json.dump(processed_videos, f, indent=4)
-
-                # Print the parsed content in a nicely formatted way
-                # print(json.dumps(parsed_content, indent=4))
-            except json.JSONDecodeError as e:
-                # print(f"Failed to parse JSON: {e}")
-                # Use completion_fixed_json to fix the JSON content
-                completion_fixed_json = completion_with_backoff(
-                    model="no_effect",  # the model variable must be set, but has no effect, model selection done with URL
-                    messages=[
-                        {"role": "system", "content": [{"type": "text", "text": "fix the json in one line"}]},
-                        {"role": "user", "content": json_str}
-                    ],
-                    temperature=0,
-                    top_p=0.95,
-                    max_tokens=3000,
-                )
-                fixed_json_str = completion_fixed_json.choices[0].message.content
-                try:
-                    parsed_content["questions"] = json.loads(fixed_json_str)["questions"]
-                    
-                    for question_item in parsed_content["questions"]:
-                        last_question_id += 1
-                        question_item["id"] = last_question_id
-                        options = question_item["options"]
-                        correct_answer_idx = question_item["correct_answer_idx"]
-                        correct_option = options[correct_answer_idx]
-                        random.shuffle(options)
-                        correct_answer_idx = options.index(correct_option)
-
-                        question_item["options"] = options
-                        question_item["correct_answer_idx"] = correct_answer_idx
-
-                    # Append the result to results.json
-                    with open(results_file, 'r+', encoding='utf-8') as f:
-                        results = json.load(f)
-                        results.append(parsed_content)
-                        f.seek(0)  # Move the file pointer to the beginning of the file
-                        json.dump(results, f, indent=4)
-
-                    # Append the video ID to processed_videos.json
-                    with open(processed_videos_file, 'r+', encoding='utf-8') as f:
-                        processed_videos = json.load(f)
-                        processed_videos.append(video_id)
-                        f.seek(0)  # Move the file pointer to the beginning of the file
-                        json.dump(processed_videos, f, indent=4)
-
-                except json.JSONDecodeError as e:
-                    print(f"Failed to fix JSON: {e}", "fixed_json_str", fixed_json_str)
-                    # Append the video ID and error message to error_videos.json
-                    with open(error_videos_file, 'r+', encoding='utf-8') as f:
-                        error_videos = json.load(f)
-                        print_exc()
-                        error_entry = {"video_id": video_id, "error": str(e), "trace": traceback.format_exc()}
-                        error_videos.append(error_entry)
-                        f.seek(0)  # Move the file pointer to the beginning of the file
-                        json.dump(error_videos, f, indent=4)
-        else:
-            # print("No JSON content found")
-            # Append the video ID and error message to error_videos.json
-            with open(error_videos_file, 'r+', encoding='utf-8') as f:
-                error_videos = json.load(f)
-                error_entry = {"video_id": video_id, "error": "No JSON content found", "trace": completion.choices[0].content_filter_results}
-                error_videos.append(error_entry)
-                f.seek(0)  # Move the file pointer to the beginning of the file
-                json.dump(error_videos, f, indent=4)
-
-    except openai.BadRequestError as e:
-        error_message = f"Error code: 400 - {str(e)}"
+    content.append(
+        {
+            "type": "text",
+            "text": prompt,
+        }
+    )
+    return [
+        {
+            "role": "system",
+            "content": [
+                {
+                    "type": "text",
+                    "text": "You are an AI assistant that generates questions according to instructions.",
+                }
+            ],
+        },
+        {
+            "role": "user",
+            "content": content,
+        },
+    ]
+
+def build_fix_json_messages(json_str):
+    return [
+        {"role": "system", "content": [{"type": "text", "text": "fix the json in one line"}]},
+        {"role": "user", "content": json_str}
+    ]
+
+def extract_json_str(content_str):
+    # Find the first '{' and the last '}' in the string
+    start_idx = content_str.find('{')
+    end_idx = content_str.rfind('}')
+    if start_idx != -1 and end_idx != -1:
+        return content_str[start_idx:end_idx + 1]
+    return None
+
+def is_valid_json(json_str):
+    try:
+        json.loads(json_str)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+def get_or_assign_oid(video_id):
+    return oids.get_or_assign(video_id) if oids is not None else None
+
+def number_and_shuffle_questions(questions):
+    global last_question_id
+    for question_item in questions:
+        last_question_id += 1
+        question_item["id"] = last_question_id
+        options = question_item["options"]
+        correct_answer_idx = question_item["correct_answer_idx"]
+        correct_option = options[correct_answer_idx]
+        random.shuffle(options)
+        correct_answer_idx = options.index(correct_option)
+
+        question_item["options"] = options
+        question_item["correct_answer_idx"] = correct_answer_idx
+
+def commit_completion(video_id, caption, prompt, json_str, fixed_json_str, content_filter_results):
+    """Turn one model answer into a results entry (or an error entry) and persist it. Must be called in video order."""
+    if json_str is None:
+        store.add_error({"video_id": video_id, "error": "No JSON content found", "trace": content_filter_results})
+        return
+
+    parsed_content = dict()
+    parsed_content["oid"] = get_or_assign_oid(video_id)
+    parsed_content["caption"] = caption
+    parsed_content["video_id"] = video_id
+    parsed_content["prompt"] = prompt
+    try:
+        parsed_content["questions"] = json.loads(json_str)["questions"]
+    except json.JSONDecodeError:
+        # Use the output of the "fix the json" request instead
+        try:
+            parsed_content["questions"] = json.loads(fixed_json_str)["questions"]
+        except json.JSONDecodeError as e:
+            print(f"Failed to fix JSON: {e}", "fixed_json_str", fixed_json_str)
+            print_exc()
+            store.add_error({"video_id": video_id, "error": str(e), "trace": traceback.format_exc()})
+            return
+
+    number_and_shuffle_questions(parsed_content["questions"])
+
+    # Append the result and mark the video as processed
+    store.add_result(parsed_content)
+
+def record_exception(video_id, e):
+    """400s are recorded as errors; anything else is printed and the video is retried on the next run."""
+    trace = "".join(traceback.format_exception(e))
+    if isinstance(e, openai.BadRequestError):
         error_entry = {
             "video_id": video_id,
-            "error": error_message,
-            "trace": traceback.format_exc()
+            "error": f"Error code: 400 - {str(e)}",
+            "trace": trace
         }
         print("error entry", error_entry)
-        with open(error_videos_file, 'r+', encoding='utf-8') as f:
-            error_videos = json.load(f)
-            error_videos.append(error_entry)
-            f.seek(0)
-            json.dump(error_videos, f, indent=4)
-            f.truncate()
-
-    except Exception as e:
-        # print("================== bad request error excpetion", e.__class__.__name__)
-        error_message = str(e)
-        print_exc()
-        if "BadRequestError" in error_message:
-            # Append the video ID and error message to error_videos.json
-            with open(error_videos_file, 'r+', encoding='utf-8') as f:
-                error_videos = json.load(f)
-                import traceback
-                error_entry = {
-                    "video_id": video_id,
-                    "error": error_message,  # Include the actual error message text
-                    "trace": traceback.format_exc()  # Include the full error trace as a string
-                }
-                error_videos.append(error_entry)
-                f.seek(0)  # Move the file pointer to the beginning of the file
-                json.dump(error_videos, f, indent=4)
+        store.add_error(error_entry)
+        return
 
-                # Skip to the next video
-                continue
+    error_message = str(e)
+    print(trace)
+    if "BadRequestError" in error_message:
+        store.add_error({
+            "video_id": video_id,
+            "error": error_message,  # Include the actual error message text
+            "trace": trace  # Include the full error trace as a string
+        })
+
+def claimed_rows():
+    """Sharded mode: rows of the videos this worker leases from the queue, claimed as they are consumed."""
+    rows_by_id = {row.video_id: row for row in df.itertuples(index=False)}
+    while video_ids := queue.claim(worker_id, claim_batch_size, lease_seconds):
+        for video_id in video_ids:
+            if video_id in rows_by_id:
+                yield rows_by_id[video_id]
+            else:
+                queue.complete(video_id, worker_id)  # finished before this worker started
+
+def release_claim(video_id):
+    """Sharded mode: a video with a result or error is done, anything else is retried by a later run."""
+    if queue is None:
+        return
+    if video_id in processed_videos or video_id in error_videos:
+        queue.complete(video_id, worker_id)
+    else:
+        queue.fail(video_id, worker_id)
+
+def request_questions(row):
+    """Select frames, ask for questions and, if the answer is broken JSON, ask for a fix. Returns the commit_completion args."""
+    prompt, frames_base64 = load_prompt_and_frames(row.video_id)
+    completion = completion_with_backoff(
+        model="no_effect",  # the model variable must be set, but has no effect, model selection done with URL
+        messages=build_messages(prompt, frames_base64),
+        **completion_params,
+    )
+    json_str = extract_json_str(completion.choices[0].message.content)
+    fixed_json_str = None
+    if json_str is not None and not is_valid_json(json_str):
+        fixed_json_str = completion_with_backoff(
+            model="no_effect",
+            messages=build_fix_json_messages(json_str),
+            **completion_params,
+        ).choices[0].message.content
+    return prompt, json_str, fixed_json_str, getattr(completion.choices[0], "content_filter_results", None)
+
+async def request_questions_async(engine, row):
+    """Async counterpart of request_questions; frame selection runs in a worker thread."""
+    loop = asyncio.get_running_loop()
+    prompt, frames_base64 = await loop.run_in_executor(None, load_prompt_and_frames, row.video_id)
+    completion = await engine.create(
+        model="no_effect",
+        messages=build_messages(prompt, frames_base64),
+        **completion_params,
+    )
+    json_str = extract_json_str(completion.choices[0].message.content)
+    fixed_json_str = None
+    if json_str is not None and not is_valid_json(json_str):
+        fixed_json_str = (await engine.create(
+            model="no_effect",
+            messages=build_fix_json_messages(json_str),
+            **completion_params,
+        )).choices[0].message.content
+    return prompt, json_str, fixed_json_str, getattr(completion.choices[0], "content_filter_results", None)
+
+async def run_async(rows, total=None):
+    engine = async_completions.AsyncCompletionEngine(
+        async_completions.make_async_client(api_base_url, OPENAI_API_KEY, openai_endpoint_url),
+        max_concurrency=max_concurrency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+    )
+    with tqdm(total=total, desc="Processing videos") as progress:
+        # Requests overlap, but results are committed strictly in dataframe order
+        async for row, outcome in async_completions.run_in_order(
+            rows, lambda row: request_questions_async(engine, row), window=2 * max_concurrency
+        ):
+            try:
+                if isinstance(outcome, Exception):
+                    raise outcome
+                commit_completion(row.video_id, row.caption, *outcome)
+            except Exception as e:
+                record_exception(row.video_id, e)
+            release_claim(row.video_id)
+            progress.update()
 
-# gywN2QJ3QOs filtered content!!!
\ No newline at end of file
+# %%
+if worker_id:
+    rows, total = claimed_rows(), None
+else:
+    rows, total = df.itertuples(index=False), len(df)
+
+if use_async:
+    asyncio.run(run_async(rows, total))
+else:
+    for row in tqdm(rows, total=total, desc="Processing videos"):
+        # tqdm.write(f"Processing video ID: {row.video_id}")
+        try:
+            commit_completion(row.video_id, row.caption, *request_questions(row))
+        except Exception as e:
+            record_exception(row.video_id, e)
+        release_claim(row.video_id)
+
+store.close()
+frame_encoder.close()
+if export_json_on_finish:
+    result_store.export_json(".", split)
+    oids.export_json(videoid_oid_file)
+if oids is not None:
+    oids.close()
+if queue is not None:
+    print(f"Worker {worker_id} done: {queue.counts()}")
+    queue.close()
+
+# gywN2QJ3QOs filtered content!!!
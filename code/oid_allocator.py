@@ -0,0 +1,123 @@
+"""
+Video id -> oid allocation for the GPT-4o generation run.
+
+`OidAllocator` keeps the mapping in SQLite (`videoid_oid.sqlite`) next to `videoid_oid.json`.
+A new oid is the value of a running counter stored with the mapping; the lookup, the insert
+and the counter increment happen in one `BEGIN IMMEDIATE` transaction. Several processes can
+therefore allocate from the same database without handing out an oid twice, and a new video
+costs one small insert instead of a scan of all oids plus a rewrite of the JSON file.
+
+On first use the database is seeded from `videoid_oid.json`; `export_json` writes the
+mapping back in that layout (oid order, indent=4) for the dataset scripts.
+
+Usage (from the `code/` directory, like the generation script):
+    python oid_allocator.py --export videoid_oid.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+DEFAULT_DB_PATH = Path("videoid_oid.sqlite")
+DEFAULT_JSON_PATH = Path("videoid_oid.json")
+
+
+class OidAllocator:
+    """Concurrency-safe, persistent video_id -> oid mapping with O(1) allocation."""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, seed_json=DEFAULT_JSON_PATH, timeout=60):
+        self.db_path = Path(db_path)
+        # Autocommit mode: transactions are opened explicitly below
+        self._conn = sqlite3.connect(self.db_path, timeout=timeout, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._known = {}
+
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS oids (video_id TEXT PRIMARY KEY, oid INTEGER NOT NULL UNIQUE)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS counter (id INTEGER PRIMARY KEY CHECK (id = 0), next_oid INTEGER NOT NULL)")
+            if self._conn.execute("SELECT next_oid FROM counter").fetchone() is None:
+                self._seed(seed_json)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _seed(self, seed_json):
+        mapping = {}
+        if seed_json is not None and Path(seed_json).exists():
+            with open(seed_json, "r", encoding="utf-8") as f:
+                mapping = json.load(f)
+        self._conn.executemany("INSERT INTO oids (video_id, oid) VALUES (?, ?)", mapping.items())
+        self._conn.execute("INSERT INTO counter (id, next_oid) VALUES (0, ?)", (max(mapping.values(), default=-1) + 1,))
+
+    def get(self, video_id):
+        """The oid of `video_id`, or None if it has none yet."""
+        if video_id not in self._known:
+            row = self._conn.execute("SELECT oid FROM oids WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                return None
+            self._known[video_id] = row[0]
+        return self._known[video_id]
+
+    def get_or_assign(self, video_id):
+        """The oid of `video_id`, allocating the next one if it has none (also if another process just did)."""
+        oid = self.get(video_id)
+        if oid is not None:
+            return oid
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT oid FROM oids WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                oid = self._conn.execute("SELECT next_oid FROM counter").fetchone()[0]
+                self._conn.execute("INSERT INTO oids (video_id, oid) VALUES (?, ?)", (video_id, oid))
+                self._conn.execute("UPDATE counter SET next_oid = ?", (oid + 1,))
+            else:
+                oid = row[0]
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._known[video_id] = oid
+        return oid
+
+    def mapping(self):
+        """The whole mapping as {video_id: oid}, in oid order."""
+        return dict(self._conn.execute("SELECT video_id, oid FROM oids ORDER BY oid"))
+
+    def export_json(self, path=DEFAULT_JSON_PATH):
+        """Write the mapping in the `videoid_oid.json` layout, through a temporary file."""
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.mapping(), f, indent=4)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export the video_id -> oid database.")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB_PATH)
+    parser.add_argument("--seed-json", type=Path, default=DEFAULT_JSON_PATH, help="Seeds a new database.")
+    parser.add_argument("--export", type=Path, default=None, help="Write the mapping to this JSON file.")
+    args = parser.parse_args()
+
+    with OidAllocator(args.db, seed_json=args.seed_json) as allocator:
+        mapping = allocator.mapping()
+        print(json.dumps({"videos": len(mapping), "max_oid": max(mapping.values(), default=None)}, indent=2))
+        if args.export is not None:
+            allocator.export_json(args.export)
+
+
+if __name__ == "__main__":
+    main()
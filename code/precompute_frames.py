@@ -0,0 +1,217 @@
+"""
+Batch frame-selection stage for the GPT-4o generation pipeline.
+
+Runs `prompt_builder.generate_prompt_and_jpeg_frames` for a list of video ids across a
+process pool and stores the results (JPEG bytes, timestamps and prompt) in an on-disk
+cache keyed by video id and selection parameters. `gpt4o-data-generation.py` then reads
+these entries instead of decoding and clustering inline between API calls.
+
+Usage (from the `code/` directory, like the generation script):
+    python precompute_frames.py --split val --workers 8
+"""
+import argparse
+import base64
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import uuid
+from functools import partial
+from pathlib import Path
+
+import cv2
+import pandas as pd
+from tqdm import tqdm
+
+import prompt_builder
+import selecting_frames
+
+DEFAULT_CACHE_DIR = Path("./frame_cache")
+DEFAULT_SELECTION_CACHE_DIR = DEFAULT_CACHE_DIR / "selected"  # selecting_frames.FrameCache, shared with the generation script
+DEFAULT_VIDEO_DIR = "./video_samples"
+DEFAULT_SELECTION_PARAMS = {"max_frames": 5, "distinct_fps": 10, "interval_fps": 1}
+# Shared with gpt4o-data-generation.py: entries are keyed by encoding, so both must agree.
+# Full-size JPEGs at the default quality; downscaling (e.g. --max-side 512 --quality 85) is opt-in.
+DEFAULT_FRAME_ENCODING = selecting_frames.DEFAULT_FRAME_ENCODER.params()
+
+
+def cache_key(video_id: str, params: dict, encoding: dict = None) -> str:
+    key = {"video_id": video_id, "params": params}
+    if encoding is not None:
+        key["encoding"] = encoding
+    payload = json.dumps(key, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class PrecomputedFrameStore:
+    """
+    Directory-per-entry cache: `<cache_dir>/<key[:2]>/<key>/meta.json` plus `frame_NN.jpg`
+    (or `.webp`). Entries are written to a temporary directory and renamed into place, so
+    readers never see a partially written entry.
+
+    `encoding` holds `selecting_frames.FrameEncoder` arguments (max_side, quality, format);
+    None keeps full-size default-quality JPEGs.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, params=None, encoding=None):
+        self.cache_dir = Path(cache_dir)
+        self.params = dict(DEFAULT_SELECTION_PARAMS if params is None else params)
+        self.encoder = selecting_frames.FrameEncoder(**(encoding or {}))
+        # Default encoding keeps the keys of entries written before encoding was configurable
+        default = self.encoder.params() == selecting_frames.DEFAULT_FRAME_ENCODER.params()
+        self.encoding = None if default else self.encoder.params()
+
+    @property
+    def mime_type(self) -> str:
+        return self.encoder.mime_type
+
+    def entry_dir(self, video_id: str) -> Path:
+        key = cache_key(video_id, self.params, self.encoding)
+        return self.cache_dir / key[:2] / key
+
+    def precompute_flags(self) -> str:
+        """The precompute_frames.py arguments that write the entries this store reads."""
+        encoding = self.encoder.params()
+        flags = [
+            f"--cache-dir {self.cache_dir}",
+            f"--max-frames {self.params['max_frames']}",
+            f"--distinct-fps {self.params['distinct_fps']}",
+            f"--interval-fps {self.params['interval_fps']}",
+            f"--max-side {encoding['max_side']}" if encoding["max_side"] is not None else "--max-side 0",
+            f"--quality {encoding['quality']}",
+            f"--format {encoding['format']}",
+        ]
+        return " ".join(flags)
+
+    def contains(self, video_id: str) -> bool:
+        return (self.entry_dir(video_id) / "meta.json").exists()
+
+    def put(self, video_id: str, prompt: str, jpeg_frames: list, timestamps: list) -> None:
+        target = self.entry_dir(video_id)
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = target.parent / f".tmp-{uuid.uuid4().hex}"
+        staging.mkdir()
+        try:
+            for idx, jpg_bytes in enumerate(jpeg_frames):
+                (staging / f"frame_{idx:02d}{self.encoder.extension}").write_bytes(jpg_bytes)
+            meta = {
+                "video_id": video_id,
+                "params": self.params,
+                "encoding": self.encoding,
+                "extension": self.encoder.extension,
+                "mime_type": self.encoder.mime_type,
+                "prompt": prompt,
+                "timestamps": [float(timestamp) for timestamp in timestamps],
+                "num_frames": len(jpeg_frames),
+            }
+            (staging / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+            os.replace(staging, target)
+        except OSError:
+            # Another worker published the same entry first
+            if not target.exists():
+                raise
+        finally:
+            if staging.exists():
+                shutil.rmtree(staging, ignore_errors=True)
+
+    def get(self, video_id: str):
+        """Return (prompt, jpeg_frames, timestamps), or raise FileNotFoundError if not precomputed."""
+        entry = self.entry_dir(video_id)
+        meta_path = entry / "meta.json"
+        if not meta_path.exists():
+            raise FileNotFoundError(
+                f"No precomputed frames for video '{video_id}' with parameters {self.params} and encoding "
+                f"{self.encoder.params()} in '{self.cache_dir}'. Run precompute_frames.py {self.precompute_flags()} first."
+            )
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        extension = meta.get("extension", ".jpg")
+        jpeg_frames = [(entry / f"frame_{idx:02d}{extension}").read_bytes() for idx in range(meta["num_frames"])]
+        return meta["prompt"], jpeg_frames, meta["timestamps"]
+
+    def load_prompt_and_frames(self, video_id: str):
+        """Drop-in replacement for `prompt_builder.generate_prompt_and_frames` backed by the cache."""
+        prompt, jpeg_frames, _ = self.get(video_id)
+        return prompt, [base64.b64encode(jpg_bytes).decode("utf-8") for jpg_bytes in jpeg_frames]
+
+
+def _init_worker() -> None:
+    # One OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+
+def _precompute_one(video_id: str, store: PrecomputedFrameStore, video_dir: str, cache=None):
+    try:
+        prompt, jpeg_frames, timestamps = prompt_builder.generate_prompt_and_jpeg_frames(
+            video_id, video_dir, cache=cache, encoder=store.encoder, **store.params
+        )
+        store.put(video_id, prompt, jpeg_frames, timestamps)
+        return video_id, None
+    except Exception as e:
+        return video_id, f"{e.__class__.__name__}: {e}"
+
+
+def precompute(video_ids, store: PrecomputedFrameStore, video_dir: str = DEFAULT_VIDEO_DIR, workers: int = None,
+               cache: selecting_frames.FrameCache = None) -> dict:
+    """
+    Fill `store` for every id in `video_ids` that is not cached yet. Returns {video_id: error} for failures.
+    With a `FrameCache`, selections already made with the same settings (e.g. inline by the
+    generation script) are taken from it instead of decoding the clip again.
+    """
+    pending = [video_id for video_id in dict.fromkeys(video_ids) if not store.contains(video_id)]
+    errors = {}
+    # Load prompt_builder's metadata once here so forked workers inherit it instead of each reading the cache
+    prompt_builder.get_prompt_metadata()
+    with multiprocessing.Pool(processes=workers, initializer=_init_worker) as pool:
+        worker = partial(_precompute_one, store=store, video_dir=video_dir, cache=cache)
+        for video_id, error in tqdm(pool.imap_unordered(worker, pending), total=len(pending), desc="Selecting frames"):
+            if error is not None:
+                errors[video_id] = error
+    return errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute selected frames and prompts for GPT-4o generation.")
+    parser.add_argument("--split", default="val", help="Reads video ids from ./processed_{split}_data.csv unless --csv is given.")
+    parser.add_argument("--csv", type=Path, default=None)
+    parser.add_argument("--video-dir", default=DEFAULT_VIDEO_DIR)
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-frames", type=int, default=DEFAULT_SELECTION_PARAMS["max_frames"])
+    parser.add_argument("--distinct-fps", type=int, default=DEFAULT_SELECTION_PARAMS["distinct_fps"])
+    parser.add_argument("--interval-fps", type=int, default=DEFAULT_SELECTION_PARAMS["interval_fps"])
+    parser.add_argument(
+        "--max-side", type=int, default=DEFAULT_FRAME_ENCODING["max_side"] or 0,
+        help="Downscale frames so their longer side is at most this; 0 keeps full size. `detail: low` "
+             "images are downscaled to 512px by the API, so 512 sends the same image in fewer bytes.",
+    )
+    parser.add_argument("--quality", type=int, default=DEFAULT_FRAME_ENCODING["quality"], help="JPEG/WebP quality.")
+    parser.add_argument(
+        "--format", choices=sorted(selecting_frames.FrameEncoder.FORMATS), default=DEFAULT_FRAME_ENCODING["format"]
+    )
+    parser.add_argument(
+        "--selection-cache-dir", type=Path, default=DEFAULT_SELECTION_CACHE_DIR,
+        help="FrameCache of selected frames shared with the generation script.",
+    )
+    parser.add_argument("--no-selection-cache", action="store_true", help="Do not read or fill the FrameCache.")
+    args = parser.parse_args()
+
+    csv_path = args.csv or Path(f"./processed_{args.split}_data.csv")
+    video_ids = pd.read_csv(csv_path, on_bad_lines="skip")["video_id"].drop_duplicates().tolist()
+
+    store = PrecomputedFrameStore(
+        args.cache_dir,
+        params={"max_frames": args.max_frames, "distinct_fps": args.distinct_fps, "interval_fps": args.interval_fps},
+        encoding={"max_side": args.max_side or None, "quality": args.quality, "format": args.format},
+    )
+    cache = None if args.no_selection_cache else selecting_frames.FrameCache(str(args.selection_cache_dir))
+    errors = precompute(video_ids, store, video_dir=args.video_dir, workers=args.workers, cache=cache)
+    print(json.dumps({"videos": len(video_ids), "errors": len(errors)}, indent=2))
+    for video_id, error in errors.items():
+        print(f"{video_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
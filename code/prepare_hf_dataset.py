@@ -1,9 +1,14 @@
 import argparse
+import hashlib
 import json
 import os
+import re
 import shutil
 import stat
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from string import Template
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -13,6 +18,44 @@ DEFAULT_OUTPUT_DIR = ROOT / "hf_dataset"
 SPLITS = ("train", "val", "test")
 HF_SPLIT_NAMES = {"train": "train", "val": "validation", "test": "test"}
 
+READ_CHUNK_SIZE = 1 << 20  # characters read at a time by iter_json_array
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Columns of the flattened split, in file order: (name, dtype), where "sequence" is a list of strings
+FEATURES = [
+    ("caption", "string"),
+    ("video_id", "string"),
+    ("question", "string"),
+    ("options", "sequence"),
+    ("correct_answer_idx", "int64"),
+    ("rephrased_answers", "sequence"),
+    ("quality_rating", "string"),
+    ("modality", "string"),
+    ("category", "string"),
+    ("source_tags", "sequence"),
+    ("id", "int64"),
+    ("oid", "int64"),
+    ("model", "string"),
+]
+
+DATA_FORMATS = {"jsonl": "JSONL", "parquet": "Parquet"}
+# ~10k rows (~1 MiB compressed) per row group: a random row read decodes one small group
+PARQUET_ROW_GROUP_SIZE = 10_000
+PARQUET_COMPRESSION = "zstd"
+# Bump when a converter writes different output for the same source
+EXPORT_VERSION = 1
+
+# Sharded splits follow the Hub's naming, e.g. data/flattened/train-00000-of-00004.jsonl
+SHARD_NAME = "{split}-{index:05d}-of-{count:05d}.{ext}"
+SIZE_UNITS = {"": 1, "KB": 10**3, "MB": 10**6, "GB": 10**9, "KIB": 2**10, "MIB": 2**20, "GIB": 2**30}
+# Items converted in memory to estimate the output bytes per source byte for --max-shard-bytes
+SHARD_SAMPLE_ITEMS = 2_000
+# In a json.dumps(indent=2) array of objects, top-level items start on a line "  {"; strings hold no raw newlines
+ITEM_START = re.compile(rb"\n  \{")
+ITEM_SEPARATOR = re.compile(rb",\n  (?=\{)")
+ITEM_SEPARATOR_SIZE = len(b",\n  ")
+
+# Filled in by render_dataset_card: ${dataset_info} and ${configs} from the written files, ${format_name}
 DATASET_CARD = """---
 license: other
 pretty_name: Valor32k-AVQA v2.0
@@ -48,56 +91,8 @@ tags:
 - multimodal-understanding
 - evaluation
 - benchmark
-dataset_info:
-- config_name: default
-  features:
-  - name: caption
-    dtype: string
-  - name: video_id
-    dtype: string
-  - name: question
-    dtype: string
-  - name: options
-    sequence: string
-  - name: correct_answer_idx
-    dtype: int64
-  - name: rephrased_answers
-    sequence: string
-  - name: quality_rating
-    dtype: string
-  - name: modality
-    dtype: string
-  - name: category
-    dtype: string
-  - name: source_tags
-    sequence: string
-  - name: id
-    dtype: int64
-  - name: oid
-    dtype: int64
-  - name: model
-    dtype: string
-  splits:
-  - name: train
-    num_bytes: 96003770
-    num_examples: 177132
-  - name: validation
-    num_bytes: 12076506
-    num_examples: 22267
-  - name: test
-    num_bytes: 14168218
-    num_examples: 26088
-  download_size: 122248494
-  dataset_size: 122248494
-configs:
-- config_name: default
-  data_files:
-  - split: train
-    path: data/flattened/train.jsonl
-  - split: validation
-    path: data/flattened/validation.jsonl
-  - split: test
-    path: data/flattened/test.jsonl
+${dataset_info}
+${configs}
 ---
 
 # Valor32k-AVQA v2.0
@@ -114,7 +109,7 @@ Valor32k-AVQA v2.0 is an open-ended audio-visual question answering dataset and
 
 - **Modalities:** text annotations and tabular metadata for audio-video QA samples. Source videos/audio are referenced by `video_id` but are not stored as media files in this Hugging Face release.
 - **Tasks:** audio-visual question answering, video question answering, visual question answering
-- **Formats:** JSONL on Hugging Face; original JSON release files are available from the project repository
+- **Formats:** ${format_name} on Hugging Face; original JSON release files are available from the project repository
 - **Library:** compatible with `datasets.load_dataset`
 
 The Hugging Face release provides the flattened QA format as the default configuration:
@@ -200,29 +195,337 @@ Research use only. See the project repository for the full license terms.
 """
 
 GITATTRIBUTES = """*.jsonl filter=lfs diff=lfs merge=lfs -text
+*.parquet filter=lfs diff=lfs merge=lfs -text
 *.zip filter=lfs diff=lfs merge=lfs -text
 *.mp4 filter=lfs diff=lfs merge=lfs -text
 *.png filter=lfs diff=lfs merge=lfs -text
 """
 
 
-def json_array_to_jsonl(source_path: Path, target_path: Path) -> int:
-    with source_path.open("r", encoding="utf-8") as source_file:
-        data = json.load(source_file)
+def iter_json_array(source_path: Path, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Yield the items of a file holding one top-level JSON array, one at a time.
 
+    The file is read in chunks and each item is decoded as soon as it is complete, so memory
+    stays at about one chunk plus one item whatever the size of the array.
+    """
+    decoder = json.JSONDecoder()
+    with source_path.open("r", encoding="utf-8") as source_file:
+        buffer, position, eof = "", 0, False
+
+        def next_char():
+            # Skip whitespace, reading on at the end of the buffer; "" at the end of the file
+            nonlocal buffer, position, eof
+            while True:
+                position = WHITESPACE.match(buffer, position).end()
+                if position < len(buffer) or eof:
+                    return buffer[position:position + 1]
+                buffer, position = source_file.read(chunk_size), 0
+                eof = not buffer
+
+        if next_char() != "[":
+            raise ValueError(f"{source_path} does not hold a JSON array")
+        position += 1
+        if next_char() == "]":
+            return
+        while True:
+            next_char()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                    # A number cut by the chunk boundary also decodes; only a following separator proves the end
+                    if eof or (end < len(buffer) and buffer[end] in ",] \t\n\r"):
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more = source_file.read(chunk_size)
+                buffer, position, eof = buffer[position:] + more, 0, not more
+            position = end
+            yield item
+
+            separator = next_char()
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"{source_path}: expected ',' or ']' at item boundary, got {separator!r}")
+            position += 1
+
+
+def write_jsonl(items, target_path: Path) -> int:
     target_path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
     with target_path.open("w", encoding="utf-8", newline="\n") as target_file:
-        for item in data:
+        for item in items:
             target_file.write(json.dumps(item, ensure_ascii=False, separators=(",", ":")))
             target_file.write("\n")
+            count += 1
+
+    return count
+
+
+def json_array_to_jsonl(source_path: Path, target_path: Path) -> int:
+    return write_jsonl(iter_json_array(source_path), target_path)
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "int64": pa.int64(), "sequence": pa.list_(pa.string())}
+    return pa.schema([(name, types[dtype]) for name, dtype in FEATURES])
+
+
+def write_parquet(items, target_path: Path, row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> int:
+    # pyarrow is only needed for this format; the JSONL export runs on the standard library
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with pq.ParquetWriter(target_path, schema, compression=PARQUET_COMPRESSION, write_page_index=True) as writer:
+        rows = []
+        for item in items:
+            rows.append(item)
+            if len(rows) == row_group_size:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema), row_group_size=row_group_size)
+                count += len(rows)
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema), row_group_size=row_group_size)
+            count += len(rows)
+
+    return count
+
+
+def json_array_to_parquet(source_path: Path, target_path: Path, row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> int:
+    return write_parquet(iter_json_array(source_path), target_path, row_group_size)
+
+
+CONVERTERS = {"jsonl": json_array_to_jsonl, "parquet": json_array_to_parquet}
+WRITERS = {"jsonl": write_jsonl, "parquet": write_parquet}
+
+
+def item_offsets(source_path: Path, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Byte offsets of the top-level items of a json.dumps(indent=2) array of objects (the layout
+    fix_dataset_quality_issues.py writes), followed by the offset the next item would have; so
+    item i spans offsets[i] to offsets[i + 1] - ITEM_SEPARATOR_SIZE. None for any other layout.
+    """
+    with source_path.open("rb") as source_file:
+        head = source_file.read(5)
+        if head.rstrip() == b"[]":
+            return []
+        if head != b"[\n  {":
+            return None
+        offsets, tail, base = [4], b"", 5
+        for chunk in iter(lambda: source_file.read(chunk_size), b""):
+            # Keep the last bytes of the previous chunk: a match may straddle the boundary
+            data = tail + chunk
+            offsets.extend(base - len(tail) + match.start() + 3 for match in ITEM_START.finditer(data))
+            tail, base = data[-3:], base + len(chunk)
+        source_file.seek(max(0, base - 16))
+        end = source_file.read().rstrip()
+    if not end.endswith(b"\n  }\n]"):
+        return None
+    offsets.append(max(0, base - 16) + len(end) - 2 + ITEM_SEPARATOR_SIZE)
+    return offsets
+
+
+def iter_array_slice(source_path: Path, start: int, end: int, chunk_size: int = READ_CHUNK_SIZE):
+    """Yield the items in bytes [start, end) of a file in the item_offsets layout, one at a time."""
+    with source_path.open("rb") as source_file:
+        source_file.seek(start)
+        remaining, buffer = end - start, b""
+        while remaining:
+            chunk = source_file.read(min(chunk_size, remaining))
+            if not chunk:
+                raise ValueError(f"{source_path} ended before byte {end}")
+            remaining -= len(chunk)
+            # The last piece may be incomplete; it is kept for the next chunk
+            *items, buffer = ITEM_SEPARATOR.split(buffer + chunk)
+            for item in items:
+                yield json.loads(item)
+        if buffer:
+            yield json.loads(buffer)
+
+
+def write_indented_array(source_path: Path, target_path: Path) -> None:
+    """Rewrite a JSON array of objects in the item_offsets layout, streaming it item by item."""
+    with target_path.open("w", encoding="utf-8", newline="\n") as target_file:
+        target_file.write("[")
+        separator = "\n"
+        for item in iter_json_array(source_path):
+            target_file.write(separator)
+            target_file.write(textwrap.indent(json.dumps(item, ensure_ascii=False, indent=2), "  "))
+            separator = ",\n"
+        target_file.write("\n]" if separator == ",\n" else "]")
+
+
+def output_bytes_per_source_byte(data_format: str, source_path: Path, offsets: list) -> float:
+    """Ratio of written to source bytes for the first SHARD_SAMPLE_ITEMS items, converted in memory."""
+    sample_end = offsets[min(SHARD_SAMPLE_ITEMS, len(offsets) - 1)] - ITEM_SEPARATOR_SIZE
+    items = list(iter_array_slice(source_path, offsets[0], sample_end))
+    if data_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        sink = pa.BufferOutputStream()
+        pq.write_table(pa.Table.from_pylist(items, schema=arrow_schema()), sink, compression=PARQUET_COMPRESSION)
+        written = sink.tell()
+    else:
+        written = sum(len(json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8")) + 1 for item in items)
+    return written / (sample_end - offsets[0])
+
+
+def plan_item_ranges(offsets: list, num_shards: int = None, max_shard_bytes: int = None, ratio: float = 1.0) -> list:
+    """
+    Item index ranges (first, stop) of the shards of a split: `num_shards` ranges of equal
+    item counts, or consecutive ranges whose estimated output (source bytes x `ratio`) stays
+    within `max_shard_bytes`. An empty split gets one empty shard.
+    """
+    total = max(len(offsets) - 1, 0)
+    if num_shards:
+        num_shards = max(1, min(num_shards, total))
+        bounds = [total * index // num_shards for index in range(num_shards + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    ranges, first = [], 0
+    for index in range(total):
+        if index > first and (offsets[index + 1] - offsets[first]) * ratio > max_shard_bytes:
+            ranges.append((first, index))
+            first = index
+    ranges.append((first, total))
+    return ranges
+
+
+def plan_shards(data_format: str, source_path: Path, work_path: Path, num_shards: int = None,
+                max_shard_bytes: int = None):
+    """
+    Byte ranges and item counts of the shards of one split, as (path to read, [(start, end, rows)]).
+    A source in another layout is first rewritten to `work_path` in the item_offsets layout.
+    """
+    offsets = item_offsets(source_path)
+    if offsets is None:
+        write_indented_array(source_path, work_path)
+        source_path, offsets = work_path, item_offsets(work_path)
+    ratio = output_bytes_per_source_byte(data_format, source_path, offsets) if max_shard_bytes and offsets else 1.0
+    shards = []
+    for first, stop in plan_item_ranges(offsets, num_shards, max_shard_bytes, ratio):
+        if first == stop:
+            shards.append((0, 0, 0))
+        else:
+            shards.append((offsets[first], offsets[stop] - ITEM_SEPARATOR_SIZE, stop - first))
+    return source_path, shards
+
+
+def parse_size(text: str) -> int:
+    """Parse a byte size such as "500MB", "1.5GiB" or "1000000"."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]i?B)?\s*", text, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[(match.group(2) or "").upper()])
+
+
+def render_dataset_card(split_stats: dict, data_format: str = "jsonl") -> str:
+    """The dataset card, with the features from FEATURES and the split sizes of the written files."""
+    dataset_info = ["dataset_info:", "- config_name: default", "  features:"]
+    for name, dtype in FEATURES:
+        dataset_info.append(f"  - name: {name}")
+        dataset_info.append("    sequence: string" if dtype == "sequence" else f"    dtype: {dtype}")
+    dataset_info.append("  splits:")
+    for hf_split, stats in split_stats.items():
+        dataset_info.append(f"  - name: {hf_split}")
+        dataset_info.append(f"    num_bytes: {stats['num_bytes']}")
+        dataset_info.append(f"    num_examples: {stats['num_examples']}")
+    total_bytes = sum(stats["num_bytes"] for stats in split_stats.values())
+    dataset_info.append(f"  download_size: {total_bytes}")
+    dataset_info.append(f"  dataset_size: {total_bytes}")
+
+    configs = ["configs:", "- config_name: default", "  data_files:"]
+    for hf_split, stats in split_stats.items():
+        configs.append(f"  - split: {hf_split}")
+        configs.append(f"    path: {stats['path']}")
+
+    return Template(DATASET_CARD).substitute(
+        dataset_info="\n".join(dataset_info),
+        configs="\n".join(configs),
+        format_name=DATA_FORMATS[data_format],
+    )
 
-    return len(data)
 
+def write_text_if_changed(path: Path, text: str) -> bool:
+    """Write `text` unless `path` already holds it, so unchanged files keep their mtime."""
+    data = text.encode("utf-8")
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.write_bytes(data)
+    return True
 
-def write_static_files(output_dir: Path) -> None:
+
+def write_static_files(output_dir: Path, split_stats: dict, data_format: str = "jsonl") -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
-    (output_dir / "README.md").write_text(DATASET_CARD, encoding="utf-8", newline="\n")
-    (output_dir / ".gitattributes").write_text(GITATTRIBUTES, encoding="utf-8", newline="\n")
+    write_text_if_changed(output_dir / "README.md", render_dataset_card(split_stats, data_format))
+    write_text_if_changed(output_dir / ".gitattributes", GITATTRIBUTES)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_settings(data_format: str, num_shards: int = None, max_shard_bytes: int = None) -> dict:
+    """Everything besides the source content that determines the exported files of a split."""
+    settings = {"format": data_format, "version": EXPORT_VERSION}
+    if data_format == "parquet":
+        settings.update(row_group_size=PARQUET_ROW_GROUP_SIZE, compression=PARQUET_COMPRESSION)
+    if num_shards:
+        settings["num_shards"] = num_shards
+    if max_shard_bytes:
+        settings.update(max_shard_bytes=max_shard_bytes, sample_items=SHARD_SAMPLE_ITEMS)
+    return settings
+
+
+def source_fingerprint(source_path: Path, previous: dict = None) -> dict:
+    """Size, mtime and sha256 of a source split; the hash of `previous` is reused if size and mtime match."""
+    source_stat = source_path.stat()
+    fingerprint = {"source_size": source_stat.st_size, "source_mtime_ns": source_stat.st_mtime_ns}
+    if previous and all(previous.get(key) == value for key, value in fingerprint.items()):
+        fingerprint["source_sha256"] = previous["source_sha256"]
+    else:
+        fingerprint["source_sha256"] = file_sha256(source_path)
+    return fingerprint
+
+
+def is_up_to_date(entry: dict, fingerprint: dict, settings: dict, output_dir: Path) -> bool:
+    if not entry or entry["source_sha256"] != fingerprint["source_sha256"] or entry["settings"] != settings:
+        return False
+    return "files" in entry and all(
+        (output_dir / file["path"]).exists() and (output_dir / file["path"]).stat().st_size == file["bytes"]
+        for file in entry["files"]
+    )
+
+
+def convert_split(data_format: str, source_path: Path, target_path: Path, byte_range: tuple = None) -> int:
+    """
+    Convert one split, or with `byte_range` the items in that slice of an item_offsets layout
+    file, through a temporary file, so an interrupted export never leaves a partial file.
+    """
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target_path.with_name(f".{target_path.name}.{os.getpid()}.tmp")
+    try:
+        if byte_range is None:
+            count = CONVERTERS[data_format](source_path, tmp_path)
+        else:
+            count = WRITERS[data_format](iter_array_slice(source_path, *byte_range), tmp_path)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return count
 
 
 def remove_readonly(func, path, _exc_info):
@@ -230,43 +533,188 @@ def remove_readonly(func, path, _exc_info):
     func(path)
 
 
-def export_dataset(source_dir: Path, output_dir: Path, clean: bool) -> dict:
-    if clean and output_dir.exists():
-        shutil.rmtree(output_dir, onerror=remove_readonly)
-
-    write_static_files(output_dir)
+def check_quality(sources: list, workers: int) -> None:
+    """Pre-export gate: raise if a flattened split still has issues that fix_dataset_quality_issues.py fixes."""
+    # Imported here: fix_dataset_quality_issues imports this module
+    from fix_dataset_quality_issues import validate_flattened_file
 
-    counts = {"default": {}}
-    for split in SPLITS:
-        hf_split = HF_SPLIT_NAMES[split]
-        flattened_source = source_dir / f"combined_dataset_{split}_flattened.json"
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sources))) as pool:
+            split_issues = list(pool.map(validate_flattened_file, sources))
+    else:
+        split_issues = [validate_flattened_file(source) for source in sources]
 
-        counts["default"][hf_split] = json_array_to_jsonl(
-            flattened_source,
-            output_dir / "data" / "flattened" / f"{hf_split}.jsonl",
+    failed = {source.name: issues for source, issues in zip(sources, split_issues) if any(issues.values())}
+    if failed:
+        raise ValueError(
+            "Quality issues found, run fix_dataset_quality_issues.py first: " + json.dumps(failed, indent=2)
         )
 
-    (output_dir / "export_summary.json").write_text(
-        json.dumps(counts, indent=2, ensure_ascii=False),
-        encoding="utf-8",
-        newline="\n",
+
+def load_manifest(output_dir: Path) -> dict:
+    summary_path = output_dir / "export_summary.json"
+    if not summary_path.exists():
+        return {}
+    return json.loads(summary_path.read_text(encoding="utf-8")).get("manifest", {})
+
+
+def export_dataset(
+    source_dir: Path,
+    output_dir: Path,
+    clean: bool,
+    workers: int = os.cpu_count() or 1,
+    data_format: str = "jsonl",
+    validate: bool = True,
+    num_shards: int = None,
+    max_shard_bytes: int = None,
+) -> dict:
+    """
+    Convert the splits to `data_format` (JSONL or Parquet), `workers` files at a time
+    (`workers=1` converts them in this process), and write a card describing the files.
+
+    By default each split is one file, data/flattened/{split}.{format}. With `num_shards`,
+    or `max_shard_bytes` (an estimate from a sample of items), each split is cut into
+    consecutive shards named SHARD_NAME that are written in parallel, each worker decoding
+    only its own byte range of the source; the card's data_files then glob the shards.
+
+    Only splits whose source content or export settings changed since the manifest in
+    export_summary.json was written are converted again; `clean` removes the output
+    directory first and converts everything. With `validate`, the splits to convert are
+    checked by check_quality before anything is written. Returns the export summary.
+    """
+    if num_shards and max_shard_bytes:
+        raise ValueError("num_shards and max_shard_bytes are mutually exclusive")
+    sharded = bool(num_shards or max_shard_bytes)
+    hf_splits = [HF_SPLIT_NAMES[split] for split in SPLITS]
+    sources = [source_dir / f"combined_dataset_{split}_flattened.json" for split in SPLITS]
+    settings = export_settings(data_format, num_shards, max_shard_bytes)
+    previous = {} if clean else load_manifest(output_dir)
+    fingerprints = [source_fingerprint(source, previous.get(hf_split)) for source, hf_split in zip(sources, hf_splits)]
+    stale = [
+        index for index, hf_split in enumerate(hf_splits)
+        if not is_up_to_date(previous.get(hf_split), fingerprints[index], settings, output_dir)
+    ]
+
+    if validate and stale:
+        check_quality([sources[index] for index in stale], workers)
+
+    if clean and output_dir.exists():
+        shutil.rmtree(output_dir, onerror=remove_readonly)
+    data_dir = output_dir / "data" / "flattened"
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    def run(fn, *args):
+        if workers > 1 and len(args[0]) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(args[0]))) as pool:
+                return list(pool.map(fn, *args))
+        return [fn(*call) for call in zip(*args)]
+
+    # Jobs are (split index, target path relative to output_dir, path to read, byte range or None)
+    jobs = []
+    work_paths = [data_dir / f".{hf_splits[index]}.{os.getpid()}.source.tmp" for index in stale]
+    if sharded:
+        plans = run(
+            plan_shards, [data_format] * len(stale), [sources[index] for index in stale], work_paths,
+            [num_shards] * len(stale), [max_shard_bytes] * len(stale),
+        )
+        for index, (read_path, shards) in zip(stale, plans):
+            for shard_index, (start, end, _) in enumerate(shards):
+                name = SHARD_NAME.format(split=hf_splits[index], index=shard_index, count=len(shards), ext=data_format)
+                jobs.append((index, f"data/flattened/{name}", read_path, (start, end)))
+    else:
+        jobs = [(index, f"data/flattened/{hf_splits[index]}.{data_format}", sources[index], None) for index in stale]
+
+    try:
+        counts = run(
+            convert_split, [data_format] * len(jobs), [job[2] for job in jobs],
+            [output_dir / job[1] for job in jobs], [job[3] for job in jobs],
+        )
+    finally:
+        for work_path in work_paths:
+            work_path.unlink(missing_ok=True)
+    if sharded:
+        planned = [rows for _, shards in plans for _, _, rows in shards]
+        if counts != planned:
+            raise ValueError(f"Shards hold {sum(counts)} items, {sum(planned)} were planned")
+
+    manifest = {}
+    for index, hf_split in enumerate(hf_splits):
+        entry = dict(previous.get(hf_split) or {}, **fingerprints[index])
+        if index in stale:
+            files = [
+                {
+                    "path": path,
+                    "rows": count,
+                    "bytes": (output_dir / path).stat().st_size,
+                    "sha256": file_sha256(output_dir / path),
+                }
+                for (job_index, path, _, _), count in zip(jobs, counts) if job_index == index
+            ]
+            entry.update(
+                source=sources[index].name,
+                settings=settings,
+                path=f"data/flattened/{hf_split}-*.{data_format}" if sharded else files[0]["path"],
+                rows=sum(file["rows"] for file in files),
+                bytes=sum(file["bytes"] for file in files),
+                files=files,
+            )
+            # Files of an earlier export in another format or shard count are left behind otherwise
+            previous_files = (previous.get(hf_split) or {}).get("files", [])
+            kept = {file["path"] for file in files}
+            for old_file in previous_files:
+                old_path = output_dir / old_file["path"]
+                if old_file["path"] not in kept and old_path.exists():
+                    old_path.unlink()
+        manifest[hf_split] = entry
+
+    split_stats = {
+        hf_split: {"path": entry["path"], "num_examples": entry["rows"], "num_bytes": entry["bytes"]}
+        for hf_split, entry in manifest.items()
+    }
+    write_static_files(output_dir, split_stats, data_format)
+
+    summary = {
+        "default": {hf_split: entry["rows"] for hf_split, entry in manifest.items()},
+        "exported": [hf_splits[index] for index in stale],
+        "manifest": manifest,
+    }
+    # "exported" describes this run only and is left out of the file, which changes with the data alone
+    write_text_if_changed(
+        output_dir / "export_summary.json",
+        json.dumps({key: value for key, value in summary.items() if key != "exported"}, indent=2, ensure_ascii=False),
     )
-    return counts
+    return summary
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Prepare a Hugging Face Dataset Viewer compatible export.")
     parser.add_argument("--source-dir", type=Path, default=DEFAULT_SOURCE_DIR)
     parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR)
-    parser.add_argument("--no-clean", action="store_true", help="Do not remove an existing output directory first.")
+    parser.add_argument(
+        "--clean", action="store_true", help="Remove the output directory first and convert every split again."
+    )
+    parser.add_argument("--no-clean", action="store_true", help="Kept for old commands; not cleaning is the default.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Files written in parallel.")
+    parser.add_argument("--format", choices=sorted(DATA_FORMATS), default="jsonl", help="File format of the splits.")
+    parser.add_argument("--no-validate", action="store_true", help="Skip the quality check before exporting.")
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument("--num-shards", type=int, help="Cut each split into this many files.")
+    sharding.add_argument(
+        "--max-shard-bytes", type=parse_size, help='Cut each split into files of about this size at most, e.g. "500MB".'
+    )
     args = parser.parse_args()
 
-    counts = export_dataset(
+    summary = export_dataset(
         source_dir=args.source_dir,
         output_dir=args.output_dir,
-        clean=not args.no_clean,
+        clean=args.clean and not args.no_clean,
+        workers=args.workers,
+        data_format=args.format,
+        validate=not args.no_validate,
+        num_shards=args.num_shards,
+        max_shard_bytes=args.max_shard_bytes,
     )
-    print(json.dumps(counts, indent=2))
+    print(json.dumps({"default": summary["default"], "exported": summary["exported"]}, indent=2))
 
 
 if __name__ == "__main__":
@@ -1,4 +1,8 @@
 # %%
+import base64
+import hashlib
+import os
+import threading
 import pandas as pd
 import selecting_frames
 
@@ -40,110 +44,176 @@ def load_audioset_file(path, **kwargs):
         else:
             raise FileNotFoundError(f"File '{filename}' not found. Please verify the path and existence of the file.")
 
-# Attempt to load each file with custom error messages
-audioset_train_unbalanced_df = load_audioset_file(
-    './audioset/unbalanced_train_segments.csv',
-    skiprows=2, quotechar='"', skipinitialspace=True
-)
+# %%
+# Source tables of the prompt metadata. unbalanced_train_segments.csv is not needed:
+# weak labels only come from the balanced train and eval segments.
+AUDIOSET_SOURCES = {
+    'balanced_train_segments': './audioset/balanced_train_segments.csv',
+    'eval_segments': './audioset/eval_segments.csv',
+    'audioset_eval_strong': './audioset/audioset_eval_strong.tsv',
+    'class_labels_indices': './audioset/class_labels_indices.csv',
+    'mid_to_display_name': './audioset/mid_to_display_name.tsv',
+}
+VALOR_SOURCES = {
+    'processed_train_data': './gpt35_dataset/processed_train_data.csv',
+    'processed_val_data': './gpt35_dataset/processed_val_data.csv',
+    'processed_test_data': './gpt35_dataset/processed_test_data.csv',
+}
 
-audioset_train_balanced_df = load_audioset_file(
-    './audioset/balanced_train_segments.csv',
-    skiprows=2, quotechar='"', skipinitialspace=True
-)
+# Joined per-video metadata, rebuilt whenever one of the source files changes
+PROMPT_METADATA_CACHE = './audioset/prompt_metadata.pkl'
+# mid -> longest display name table, rebuilt whenever the class label files change
+CLASS_LABELS_CACHE = './audioset/class_labels_longest.pkl'
 
-audioset_eval_df = load_audioset_file(
-    './audioset/eval_segments.csv',
-    skiprows=2, quotechar='"', skipinitialspace=True
-)
+def file_sha256(path, chunk_size=1 << 20):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-audioset_eval_strong_df = load_audioset_file(
-    './audioset/audioset_eval_strong.tsv',
-    sep='\t'
-)
+def load_class_labels():
+    class_labels_df = load_audioset_file(
+        AUDIOSET_SOURCES['class_labels_indices'],
+        index_col=0
+    ).reset_index(drop=True)
 
-class_labels_df = load_audioset_file(
-    './audioset/class_labels_indices.csv',
-    index_col=0
-).reset_index(drop=True)
+    class_labels_strong_df = load_audioset_file(
+        AUDIOSET_SOURCES['mid_to_display_name'],
+        sep='\t', names=['mid', 'display_name']
+    )
 
-class_labels_strong_df = load_audioset_file(
-    './audioset/mid_to_display_name.tsv',
-    sep='\t', names=['mid', 'display_name']
-)
+    class_labels_df = pd.concat([class_labels_df, class_labels_strong_df]).drop_duplicates()
 
-class_labels_df = pd.concat([class_labels_df, class_labels_strong_df]).drop_duplicates()
+    # For each 'mid', keep the row with the longest 'display_name'
+    return utils.cached_longest_display_names(class_labels_df, CLASS_LABELS_CACHE)
 
-# %%
-# For each 'mid', group rows by 'mid' and find the row index with the longest 'display_name'
-class_labels_df = class_labels_df.loc[  
-    # Group the DataFrame by 'mid' and calculate the index of the row with the longest 'display_name' in each group
-    class_labels_df.groupby('mid')['display_name']
-    .apply(lambda group: group.str.len().idxmax())
-    .drop_duplicates()  # Remove any duplicate indices that might arise after finding the longest display_name
-]
-
-#%%
-audioset_train_balanced_df = utils.replace_by_class_names(audioset_train_balanced_df,
-                                                          'positive_labels',
-                                                          class_labels_df,
-                                                          )
-
-audioset_eval_df = utils.replace_by_class_names(audioset_eval_df,
-                                                          'positive_labels',
-                                                          class_labels_df,
-                                                          )
-
-audioset_eval_strong_df = utils.replace_by_class_names(audioset_eval_strong_df,
-                                                          'label',
-                                                          class_labels_df,
-                                                          )
+def reconstruct_strong_timing(strong_df, structured=False):
+    """
+    Aggregate strong labels per (video_id, video_start_time), keeping the row order of `strong_df`.
 
-# %%
-audioset_eval_strong_df[['video_id', 'video_start_time']] = audioset_eval_strong_df['segment_id'].str.extract(r'(.+)_(\d+)$')
-audioset_eval_strong_df['video_start_time'] = audioset_eval_strong_df['video_start_time'].astype(int) / 1000
-audioset_eval_strong_df = audioset_eval_strong_df.drop(columns=['segment_id'])
+    By default every group becomes one '<start>s-<end>s -> <label>; ...' string in a
+    "timing_string" column. With `structured=True` the column is "segments" instead, holding
+    a list of (start_time_seconds, end_time_seconds, label) tuples.
+    """
+    keys = ["video_id", "video_start_time"]
+    if structured:
+        segments = pd.Series(
+            list(zip(strong_df['start_time_seconds'], strong_df['end_time_seconds'], strong_df['label'])),
+            index=strong_df.index,
+        )
+        return segments.groupby([strong_df[key] for key in keys]).agg(list).reset_index(name="segments")
 
-# %%
-audioset_eval_strong_df_reconstructed = audioset_eval_strong_df.groupby(["video_id", "video_start_time"]).apply(
-    lambda group: '; '.join(f"{row['start_time_seconds']}s-{row['end_time_seconds']}s -> {row['label']}" for _, row in group.iterrows())
-).reset_index().rename({0: "timing_string"}, axis=1)
+    # Formatting the whole column at once gives the same text as an f-string per row
+    segments = (
+        strong_df['start_time_seconds'].astype(str) + 's-'
+        + strong_df['end_time_seconds'].astype(str) + 's -> '
+        + strong_df['label'].astype(str)
+    )
+    return segments.groupby([strong_df[key] for key in keys]).agg('; '.join).reset_index(name="timing_string")
 
-# %%
-valor_train = pd.read_csv('./gpt35_dataset/processed_train_data.csv', on_bad_lines='skip')
-valor_val = pd.read_csv('./gpt35_dataset/processed_val_data.csv', on_bad_lines='skip')
-valor_test = pd.read_csv('./gpt35_dataset/processed_test_data.csv', on_bad_lines='skip')
-# %%
-# Combine all valor datasets
-valor_combined = pd.concat([valor_train, valor_val, valor_test])
+def load_strong_timing_strings(class_labels_df, video_ids, structured=False):
+    """Strong eval labels of `video_ids` per (video_id, video_start_time), see reconstruct_strong_timing."""
+    audioset_eval_strong_df = load_audioset_file(
+        AUDIOSET_SOURCES['audioset_eval_strong'],
+        sep='\t'
+    )
+
+    audioset_eval_strong_df[['video_id', 'video_start_time']] = audioset_eval_strong_df['segment_id'].str.extract(r'(.+)_(\d+)$')
+    # Only videos that can get a prompt; the timing strings are built per video, so this changes none of them
+    audioset_eval_strong_df = audioset_eval_strong_df[audioset_eval_strong_df['video_id'].isin(video_ids)]
+    audioset_eval_strong_df = utils.replace_by_class_names(audioset_eval_strong_df, 'label', class_labels_df)
+    audioset_eval_strong_df['video_start_time'] = audioset_eval_strong_df['video_start_time'].astype(int) / 1000
+    audioset_eval_strong_df = audioset_eval_strong_df.drop(columns=['segment_id'])
 
-# Merge the data: keeping only rows in valor_combined that exist in either audioset_eval_df or audioset_train_balanced_df
-# Combine the two audio set DataFrames for easier lookup
-combined_audioset_df = pd.concat([audioset_eval_df, audioset_train_balanced_df])
+    return reconstruct_strong_timing(audioset_eval_strong_df, structured=structured)
 
-# Filter combined_audioset_df to include only the entries found in valor_combined
-matching_ids = valor_combined["video_id"].unique()
-combined_filtered_df = combined_audioset_df[combined_audioset_df["# YTID"].isin(matching_ids)]
+def load_weak_labels(class_labels_df, video_ids):
+    """Eval and balanced-train segments with positive_labels as display names, eval rows first."""
+    audioset_train_balanced_df = load_audioset_file(
+        AUDIOSET_SOURCES['balanced_train_segments'],
+        skiprows=2, quotechar='"', skipinitialspace=True
+    )
+    audioset_eval_df = load_audioset_file(
+        AUDIOSET_SOURCES['eval_segments'],
+        skiprows=2, quotechar='"', skipinitialspace=True
+    )
 
-# Merge the class names with valor_combined, retaining the original order
-# Rename '# YTID' to match valor_combined's 'video_id' for merging
-combined_filtered_df = combined_filtered_df.rename(columns={'# YTID': 'video_id'})
-merged_df = pd.merge(valor_combined, combined_filtered_df[['video_id', 'positive_labels']], on='video_id', how='left')
+    # Combine the two audio set DataFrames for easier lookup
+    combined_audioset_df = pd.concat([audioset_eval_df, audioset_train_balanced_df])
+    combined_audioset_df = combined_audioset_df[combined_audioset_df["# YTID"].isin(video_ids)]
+    return utils.replace_by_class_names(combined_audioset_df, 'positive_labels', class_labels_df)
+
+def first_value_by_key(df, key_column, value_column):
+    """
+    Build a {key: value} lookup from the first row of every key, i.e. what
+    `df[df[key_column] == key][value_column].values[0]` returns, without scanning `df` per key.
+    """
+    first_rows = df.drop_duplicates(subset=[key_column], keep='first')
+    return dict(zip(first_rows[key_column], first_rows[value_column]))
+
+def build_prompt_metadata():
+    """Read the source tables and join them into the per-video lookups used by generate_prompt_text."""
+    # Combine all valor datasets
+    valor_combined = pd.concat([
+        pd.read_csv(path, on_bad_lines='skip') for path in VALOR_SOURCES.values()
+    ])
+    video_ids = valor_combined["video_id"].unique()
+
+    class_labels_df = load_class_labels()
+    return {
+        'caption_by_video': first_value_by_key(valor_combined, 'video_id', 'caption'),
+        'timing_string_by_video': first_value_by_key(load_strong_timing_strings(class_labels_df, video_ids), 'video_id', 'timing_string'),
+        'weak_labels_by_video': first_value_by_key(load_weak_labels(class_labels_df, video_ids), '# YTID', 'positive_labels'),
+    }
+
+_prompt_metadata = None
+_prompt_metadata_lock = threading.Lock()
+
+def get_prompt_metadata(cache_path=PROMPT_METADATA_CACHE):
+    """
+    Per-video lookups (caption, weak labels, strong timing string), loaded on first use.
+    They are pickled to `cache_path` together with the SHA-256 of every source file and
+    only rebuilt from the CSV/TSV files when one of those hashes changes or the cache file
+    cannot be read. Safe to call from several threads: the first one loads or builds the
+    lookups while the others wait for it.
+    """
+    global _prompt_metadata
+    if _prompt_metadata is not None:
+        return _prompt_metadata
+
+    with _prompt_metadata_lock:
+        if _prompt_metadata is not None:
+            return _prompt_metadata
+
+        source_hashes = {name: file_sha256(path) for name, path in {**AUDIOSET_SOURCES, **VALOR_SOURCES}.items()}
+        cached = utils.read_pickle_cache(cache_path)
+        if cached is not None and cached.get('source_hashes') == source_hashes:
+            _prompt_metadata = cached['metadata']
+            return _prompt_metadata
+
+        metadata = build_prompt_metadata()
+        utils.write_pickle_cache(cache_path, {'source_hashes': source_hashes, 'metadata': metadata})
+        _prompt_metadata = metadata
+        return _prompt_metadata
 
 # %%
-def generate_prompt_text(video_id, valor_combined, combined_audioset_df, audioset_eval_strong_df_reconstructed, frame_timestamps):
-    caption = valor_combined[valor_combined['video_id'] == video_id]['caption'].values[0]
+def generate_prompt_text(video_id, caption_by_video, weak_labels_by_video, timing_string_by_video, frame_timestamps):
+    caption = caption_by_video[video_id]
 
-    # Check if video_id exists in audioset_eval_strong_df_reconstructed
-    filtered_strong = audioset_eval_strong_df_reconstructed[audioset_eval_strong_df_reconstructed['video_id'] == video_id]
-    if not filtered_strong.empty:
-        audio_tags = filtered_strong["timing_string"].values[0]
+    # Check if video_id has strong (timed) labels
+    has_strong_labels = video_id in timing_string_by_video
+    if has_strong_labels:
+        audio_tags = timing_string_by_video[video_id]
         # Dynamic instructions for categories when tags are available
         count_instruction = "Ask 3 questions. Visual: Count items visible in the video. Audio: Count the frequency of specific sounds. Audio-Visual: Link counts across modalities (example \"How many <items> do you both see and hear?\")."
         temporal_instruction = "Ask 3 questions. Visual: Compare events happening before, after, or during specific times visually. Audio: Compare events happening before, after, or during specific times from audio. Audio-Visual: Combine events from both modalities (example \"What do you see before hearing <event>?\")."
         description_instruction = "Ask 3 questions. Visual: about visual details, excluding movement. Audio: about audio-only details (example background sounds). Audio-Visual: Combine visual and audio details (example \"Does <item> produce sound?\")"
     else:
         # Fallback instructions when no audio tags are found
-        audio_tags = combined_audioset_df[combined_audioset_df["# YTID"] == video_id]["positive_labels"].values[0]
+        audio_tags = weak_labels_by_video[video_id]
         count_instruction = "Ask 1 question about how many specific items seen (visual)"
         temporal_instruction = "Ask 1 question which event happened before the other (visual)"
         description_instruction = "Ask 2 questions. Visual: about visual details, excluding movement. Audio: about audio-only details (example background sounds)"
@@ -154,7 +224,7 @@ def generate_prompt_text(video_id, valor_combined, combined_audioset_df, audiose
     # Build the prompt string with trimmed spaces
     prompt = "\n".join([
         f"You are provided with {len(frame_timestamps)} sequential video frames,"
-        + ("The video includes audio, which I can describe for you as tags" if filtered_strong.empty else "along with their time spans for audio and video."),
+        + ("The video includes audio, which I can describe for you as tags" if not has_strong_labels else "along with their time spans for audio and video."),
         "Additionally, a brief caption describes the video content and audio details. Use this information to create questions that require watching the video to be answerable, avoiding general knowledge questions.",
         "Modality Definitions:",
         "Visual: Answer is fully derived from the video frames alone. Audio: Answer relies only on audio information. Audio-Visual: Both audio and visual information are essential for a 100% accurate answer.",
@@ -178,9 +248,17 @@ def generate_prompt_text(video_id, valor_combined, combined_audioset_df, audiose
 
     return prompt
 
+# Select frames for video_id and build its prompt; frames are returned as encoded bytes (JPEG unless
+# `encoder` says otherwise) together with their timestamps
+def generate_prompt_and_jpeg_frames(video_id, directory="./video_samples", max_frames=5, cache=None, **selection_kwargs):
+    jpeg_frames, filtered_timestamps = selecting_frames.get_filtered_jpeg_frames(video_id, directory, max_frames=max_frames, cache=cache, **selection_kwargs)
+    metadata = get_prompt_metadata()
+    prompt = generate_prompt_text(video_id, metadata['caption_by_video'], metadata['weak_labels_by_video'], metadata['timing_string_by_video'], filtered_timestamps)
+    return prompt, jpeg_frames, filtered_timestamps
+
 # Wrapper function to generate prompt with only video_id input
-def generate_prompt_and_frames(video_id, directory="./video_samples"):
-    filtered_frames, filtered_timestamps = selecting_frames.get_filtered_frames(video_id, directory, max_frames=5)
+def generate_prompt_and_frames(video_id, directory="./video_samples", cache=None, encoder=None):
+    prompt, jpeg_frames, _ = generate_prompt_and_jpeg_frames(video_id, directory, max_frames=5, cache=cache, encoder=encoder)
     # Convert frames to base64
-    filtered_frames_base64 = selecting_frames.convert_frames_to_base64(filtered_frames)
-    return generate_prompt_text(video_id, valor_combined, combined_audioset_df, audioset_eval_strong_df_reconstructed, filtered_timestamps), filtered_frames_base64
\ No newline at end of file
+    filtered_frames_base64 = [base64.b64encode(jpg_bytes).decode('utf-8') for jpg_bytes in jpeg_frames]
+    return prompt, filtered_frames_base64
\ No newline at end of file
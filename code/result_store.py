@@ -0,0 +1,355 @@
+"""
+Append-only storage for the GPT-4o generation run.
+
+`JsonlResultStore` keeps the three files of a run as JSON Lines, one record per line:
+`results_gpt4o_{split}.jsonl`, `processed_videos_{split}.jsonl` and
+`error_videos_{split}.jsonl`. Committing a video appends a line instead of re-reading and
+re-serializing the whole file. Writes are flushed right away and fsynced every
+`fsync_every` records and on close. Each commit also updates a small checkpoint, and the
+processed/error id sets are snapshotted every `snapshot_every` commits, so a restart after
+a crash resumes from the last finished commit without re-reading the results or the logs.
+
+`export_json` (or the CLI below) converts a store to the JSON layout used so far
+(`results_gpt4o_{split}.json` etc. as indented lists). `import_json` goes the other way,
+so a run started with the old layout can be continued.
+
+Usage (from the `code/` directory, like the generation script):
+    python result_store.py --split val --to-json
+    python result_store.py --split val --from-json
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+KINDS = ("results", "processed", "errors")
+
+
+def jsonl_paths(directory, split: str) -> dict:
+    directory = Path(directory)
+    return {
+        "results": directory / f"results_gpt4o_{split}.jsonl",
+        "processed": directory / f"processed_videos_{split}.jsonl",
+        "errors": directory / f"error_videos_{split}.jsonl",
+    }
+
+
+def json_paths(directory, split: str) -> dict:
+    directory = Path(directory)
+    return {
+        "results": directory / f"results_gpt4o_{split}.json",
+        "processed": directory / f"processed_videos_{split}.json",
+        "errors": directory / f"error_videos_{split}.json",
+    }
+
+
+def checkpoint_path(directory, split: str) -> Path:
+    return Path(directory) / f"checkpoint_gpt4o_{split}.json"
+
+
+def snapshot_path(directory, split: str) -> Path:
+    return Path(directory) / f"ids_gpt4o_{split}.json"
+
+
+def read_jsonl(path, repair: bool = False) -> list:
+    """
+    Read every complete record of a JSONL file. A last line that is unterminated or not
+    valid JSON is what an interrupted append leaves behind; it is skipped, and with
+    `repair=True` also cut from the file so the next append starts on a clean line. An
+    invalid line followed by more lines is corruption, not an interrupted append: it
+    raises ValueError and the file is left as it is.
+    """
+    path = Path(path)
+    if not path.exists():
+        return []
+    records = []
+    good_size = 0
+    bad_line = None
+    with path.open("rb") as f:
+        for number, line in enumerate(f, start=1):
+            if bad_line is not None:
+                raise ValueError(f"{path}: line {bad_line} is not valid JSON and is followed by more records")
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("unterminated line")
+                records.append(json.loads(line))
+            except ValueError:
+                bad_line = number
+                continue
+            good_size += len(line)
+    if repair and good_size != path.stat().st_size:
+        with path.open("r+b") as f:
+            f.truncate(good_size)
+    return records
+
+
+def write_json_atomic(path, data, indent=4) -> None:
+    """Write `data` as JSON through a fsynced temporary file, so `path` is never left half written."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonlResultStore:
+    """
+    Append-only JSONL store for results, processed video ids and errors of one split.
+
+    Every commit appends its lines and then atomically replaces a small checkpoint
+    (`checkpoint_gpt4o_{split}.json`): the last question id plus, per file, the committed
+    size, record count and a hash of the last committed line. Every `snapshot_every`
+    commits and on close the processed/error id sets are written to
+    `ids_gpt4o_{split}.json` together with the log offsets they cover. A restart reads the
+    checkpoint, cuts off anything appended after it, loads the snapshot and parses only the
+    log lines written after the snapshot, so resuming does not get slower as results
+    accumulate. Without a usable checkpoint (first run, files edited by hand) the files are
+    scanned once as before; without a matching snapshot the processed/error logs are read.
+
+    Data files are fsynced every `fsync_every` records and on close; use as a context
+    manager, or call `close()`.
+    """
+
+    def __init__(self, directory=".", split: str = "val", fsync_every: int = 16, snapshot_every: int = 1000):
+        self.paths = jsonl_paths(directory, split)
+        self.checkpoint_path = checkpoint_path(directory, split)
+        self.snapshot_path = snapshot_path(directory, split)
+        self.fsync_every = fsync_every
+        self.snapshot_every = snapshot_every
+        self._unsynced = 0
+        self._snapshot_state = None
+
+        if not self._resume_from_checkpoint():
+            self._scan()
+        self._files = {kind: self.paths[kind].open("ab") for kind in KINDS}
+        self._commit(snapshot=self._snapshot_state != self._id_log_state())
+
+    def _scan(self) -> None:
+        results = read_jsonl(self.paths["results"], repair=True)
+        processed = read_jsonl(self.paths["processed"], repair=True)
+        errors = read_jsonl(self.paths["errors"], repair=True)
+        self.processed_videos = set(processed) | {result["video_id"] for result in results}
+        self.error_videos = {entry["video_id"] for entry in errors}
+        self.last_question_id = max(
+            (question.get("id", 0) for result in results for question in result.get("questions", [])), default=0
+        )
+        records = {"results": len(results), "processed": len(processed), "errors": len(errors)}
+        self._committed = {kind: self._file_state(kind, records[kind]) for kind in KINDS}
+
+    def _file_state(self, kind: str, records: int) -> dict:
+        """Size and record count of a file and the hash/length of its last line, as recorded in the checkpoint."""
+        path = self.paths[kind]
+        size = path.stat().st_size if path.exists() else 0
+        if size == 0:
+            return {"size": 0, "records": 0, "tail_length": 0, "tail_sha1": hashlib.sha1(b"").hexdigest()}
+        with path.open("rb") as f:
+            f.seek(max(0, size - 64 * 1024))
+            tail = f.read()
+        last_line = tail[tail.rfind(b"\n", 0, len(tail) - 1) + 1:]
+        return {
+            "size": size,
+            "records": records,
+            "tail_length": len(last_line),
+            "tail_sha1": hashlib.sha1(last_line).hexdigest(),
+        }
+
+    def _id_log_state(self) -> dict:
+        """Offsets and record counts of the processed/error logs, as covered by a snapshot."""
+        return {kind: {key: self._committed[kind][key] for key in ("size", "records")} for kind in ("processed", "errors")}
+
+    def _read_ids(self, kind: str, start: int, end: int) -> list:
+        """Video ids of the lines of the processed or error log between byte offsets `start` and `end`."""
+        if end == start:
+            return []
+        with self.paths[kind].open("rb") as f:
+            f.seek(start)
+            records = [json.loads(line) for line in f.read(end - start).splitlines()]
+        return records if kind == "processed" else [entry["video_id"] for entry in records]
+
+    def _load_snapshot(self, committed: dict, covered) -> tuple:
+        """
+        The log offsets and id sets of the snapshot the checkpoint points to, or `(None, ...)`
+        with empty sets if there is none or it does not match, so the logs are read from the start.
+        """
+        try:
+            snapshot = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+            if covered is None or snapshot["files"] != covered:
+                raise ValueError("snapshot does not match the checkpoint")
+            if any(covered[kind]["size"] > committed[kind]["size"] for kind in covered):
+                raise ValueError("snapshot covers more than the checkpoint")
+            return covered, {kind: set(snapshot[kind]) for kind in covered}
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, {"processed": set(), "errors": set()}
+
+    def _resume_from_checkpoint(self) -> bool:
+        try:
+            checkpoint = json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+            committed = checkpoint["files"]
+            for kind in KINDS:
+                path, state = self.paths[kind], committed[kind]
+                size = path.stat().st_size if path.exists() else 0
+                if size < state["size"]:
+                    return False
+                if state["size"] == 0:
+                    continue
+                with path.open("rb") as f:
+                    f.seek(state["size"] - state["tail_length"])
+                    if hashlib.sha1(f.read(state["tail_length"])).hexdigest() != state["tail_sha1"]:
+                        return False
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        # Lines appended after the last checkpoint belong to a commit that did not finish
+        for kind in KINDS:
+            if self.paths[kind].exists() and self.paths[kind].stat().st_size > committed[kind]["size"]:
+                with self.paths[kind].open("r+b") as f:
+                    f.truncate(committed[kind]["size"])
+        # Only the log lines written after the snapshot are parsed
+        covered, ids = self._load_snapshot(committed, checkpoint.get("snapshot"))
+        try:
+            for kind, known in ids.items():
+                start = covered[kind] if covered else {"size": 0, "records": 0}
+                tail = self._read_ids(kind, start["size"], committed[kind]["size"])
+                if start["records"] + len(tail) != committed[kind]["records"]:
+                    return False
+                known.update(tail)
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self.processed_videos = ids["processed"]
+        self.error_videos = ids["errors"]
+        self._snapshot_state = covered
+        self.last_question_id = checkpoint["last_question_id"]
+        self._committed = committed
+        return True
+
+    def _write_snapshot(self) -> None:
+        # The snapshot must not cover log lines that could still be lost
+        self.sync()
+        state = self._id_log_state()
+        write_json_atomic(
+            self.snapshot_path,
+            {"files": state, "processed": sorted(self.processed_videos), "errors": sorted(self.error_videos)},
+            indent=None,
+        )
+        self._snapshot_state = state
+
+    def _commit(self, snapshot: bool = False) -> None:
+        state = self._snapshot_state or {kind: {"records": 0} for kind in ("processed", "errors")}
+        pending = sum(self._committed[kind]["records"] - state[kind]["records"] for kind in state)
+        if snapshot or pending >= self.snapshot_every:
+            self._write_snapshot()
+        write_json_atomic(
+            self.checkpoint_path,
+            {"last_question_id": self.last_question_id, "files": self._committed, "snapshot": self._snapshot_state},
+            indent=None,
+        )
+
+    def _append(self, kind: str, record) -> None:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        f = self._files[kind]
+        f.write(line)
+        f.flush()
+        self._committed[kind] = {
+            "size": self._committed[kind]["size"] + len(line),
+            "records": self._committed[kind]["records"] + 1,
+            "tail_length": len(line),
+            "tail_sha1": hashlib.sha1(line).hexdigest(),
+        }
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def add_result(self, result: dict) -> None:
+        """Record a finished video: its result entry and its id as processed, in one checkpointed commit."""
+        self._append("results", result)
+        self._append("processed", result["video_id"])
+        self.processed_videos.add(result["video_id"])
+        self.last_question_id = max(
+            [self.last_question_id] + [question.get("id", 0) for question in result.get("questions", [])]
+        )
+        self._commit()
+
+    def add_error(self, error_entry: dict) -> None:
+        self._append("errors", error_entry)
+        self.error_videos.add(error_entry["video_id"])
+        self._commit()
+
+    def sync(self) -> None:
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        self._unsynced = 0
+
+    def close(self) -> None:
+        if self._files:
+            self._commit(snapshot=self._snapshot_state != self._id_log_state())
+            self.sync()
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_json(directory=".", split: str = "val", output_directory=None) -> dict:
+    """Write the store of `split` as `results_gpt4o_{split}.json` etc. Returns the number of records per file."""
+    source = jsonl_paths(directory, split)
+    target = json_paths(output_directory or directory, split)
+    Path(output_directory or directory).mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for kind in KINDS:
+        records = read_jsonl(source[kind])
+        write_json_atomic(target[kind], records)
+        counts[target[kind].name] = len(records)
+    return counts
+
+
+def import_json(directory=".", split: str = "val") -> dict:
+    """Seed an empty store from existing `*_{split}.json` files, so an old-layout run can be resumed."""
+    source = json_paths(directory, split)
+    target = jsonl_paths(directory, split)
+    counts = {}
+    for kind in KINDS:
+        if target[kind].exists() and target[kind].stat().st_size:
+            raise FileExistsError(f"'{target[kind]}' already has records; refusing to overwrite it.")
+        records = json.loads(source[kind].read_text(encoding="utf-8")) if source[kind].exists() else []
+        tmp_path = target[kind].with_name(f".{target[kind].name}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target[kind])
+        counts[target[kind].name] = len(records)
+    # A checkpoint or snapshot of the (empty) store would no longer match the imported files
+    checkpoint_path(directory, split).unlink(missing_ok=True)
+    snapshot_path(directory, split).unlink(missing_ok=True)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert between the JSONL result store and the JSON list layout.")
+    parser.add_argument("--split", default="val")
+    parser.add_argument("--dir", type=Path, default=Path("."), help="Directory holding the run files.")
+    direction = parser.add_mutually_exclusive_group(required=True)
+    direction.add_argument("--to-json", action="store_true", help="Write results_gpt4o_{split}.json etc. from the JSONL store.")
+    direction.add_argument("--from-json", action="store_true", help="Create the JSONL store from existing JSON files.")
+    parser.add_argument("--output-dir", type=Path, default=None, help="Where --to-json writes (defaults to --dir).")
+    args = parser.parse_args()
+
+    if args.to_json:
+        counts = export_json(args.dir, args.split, args.output_dir)
+    else:
+        counts = import_json(args.dir, args.split)
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,253 @@
 # %%
 import cv2
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.random_projection import GaussianRandomProjection
 import matplotlib.pyplot as plt
 from skimage.metrics import structural_similarity as ssim
 import os
 import base64
+import hashlib
 import io
+import json
+import pickle
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
 # %%
-def extract_frames(video_path, fps=1):
+def iter_sampled_frames(video_path, fps=(1,), decode="read", seek_gap=None):
+    """
+    Decode `video_path` once and yield every frame kept by at least one of the
+    requested sampling rates.
+
+    Yields (frame_index, timestamp, frame, rates) tuples, where `rates` lists the
+    entries of `fps` whose sampling interval includes this frame. A frame shared by
+    several rates is yielded once, so callers can fan it out without re-decoding.
+
+    `decode` selects how skipped frames are handled:
+        "read": read and convert every frame (original behaviour).
+        "grab": grab every frame but only retrieve (convert to BGR) the sampled ones.
+                Returns exactly the same frames as "read".
+        "seek": like "grab", but jump ahead with CAP_PROP_POS_FRAMES when the next
+                sampled frame is more than `seek_gap` frames away (default: one second).
+                Only pays off for sparse sampling on long-GOP clips, and frame
+                accuracy depends on the container's seek index.
+    """
+    if decode not in ("read", "grab", "seek"):
+        raise ValueError(f"Unknown decode mode '{decode}'. Expected 'read', 'grab' or 'seek'.")
+
     cap = cv2.VideoCapture(video_path)
-    frames = []
-    timestamps = []
-    frame_rate = cap.get(cv2.CAP_PROP_FPS)
-    interval = max(1, int(frame_rate / fps))
-
-    count = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    try:
+        frame_rate = cap.get(cv2.CAP_PROP_FPS)
+        intervals = {rate: max(1, int(frame_rate / rate)) for rate in fps}
+        if seek_gap is None:
+            seek_gap = max(1, int(frame_rate))
+
+        count = 0
+        while True:
+            if decode == "seek":
+                # Next frame index that any of the sampling intervals keeps
+                target = min(-(-count // interval) * interval for interval in intervals.values())
+                if target - count > seek_gap:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                    count = target
+
+            if decode == "read":
+                ret, frame = cap.read()
+            else:
+                ret, frame = cap.grab(), None
+            if not ret:
+                break
 
-        if count % interval == 0:
-            frames.append(frame)
-            timestamp = count / frame_rate
-            timestamps.append(timestamp)
-        count += 1
+            rates = [rate for rate, interval in intervals.items() if count % interval == 0]
+            if rates:
+                if frame is None:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                yield count, count / frame_rate, frame, rates
+            count += 1
+    finally:
+        cap.release()
 
-    cap.release()
-    return frames, timestamps
+def extract_frames_multi(video_path, fps=(1,), decode="read"):
+    """
+    Sample `video_path` at several rates from a single decode pass.
+
+    Returns a dict mapping each rate in `fps` to a (frames, timestamps) tuple, identical
+    to what `extract_frames(video_path, fps=rate)` returns for that rate.
+    """
+    samples = {rate: ([], []) for rate in fps}
+    for _, timestamp, frame, rates in iter_sampled_frames(video_path, fps=fps, decode=decode):
+        for rate in rates:
+            samples[rate][0].append(frame)
+            samples[rate][1].append(timestamp)
+    return samples
+
+def extract_frames(video_path, fps=1, decode="read"):
+    return extract_frames_multi(video_path, fps=(fps,), decode=decode)[fps]
+
+# %%
+class FrameBuffer:
+    """
+    Preallocated (capacity, H, W, 3) uint8 frame store. Frames are appended once and
+    referenced by slot index afterwards, so selection steps pass indices around instead
+    of copying frames into new lists. Grows by doubling if the capacity estimate is short.
+    """
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.frames = None
+        self.size = 0
+
+    def append(self, frame):
+        if self.frames is None:
+            self.frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+        elif self.size == len(self.frames):
+            grown = np.empty((2 * len(self.frames),) + self.frames.shape[1:], dtype=self.frames.dtype)
+            grown[:self.size] = self.frames[:self.size]
+            self.frames = grown
+        self.frames[self.size] = frame
+        self.size += 1
+        return self.size - 1
+
+    def __getitem__(self, slot):
+        return self.frames[slot]
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return 0 if self.frames is None else self.frames.nbytes
+
+
+class ClipSamples:
+    """
+    Result of `stream_clip`: one slot per sampled frame, shared by every rate that keeps it.
+
+        timestamps[slot]     timestamp (s) of the frame in that slot
+        frame_numbers[slot]  index of the frame in the decoded stream
+        slots[rate]          slots kept by that sampling rate, in decode order
+        histograms           (len(slots[histogram_fps]), 17 * 512) float32 combined histograms
+        buffer               FrameBuffer holding the frames, or None when frames were not kept
+    """
+    def __init__(self, buffer, timestamps, frame_numbers, slots, histograms):
+        self.buffer = buffer
+        self.timestamps = timestamps
+        self.frame_numbers = frame_numbers
+        self.slots = slots
+        self.histograms = histograms
+
+
+def probe_video(video_path):
+    """Return (frame_rate, frame_count) from the container metadata without decoding."""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+
+# Frames with at least this many pixels get their histograms from calculate_combined_histograms_blocks,
+# smaller ones from calculate_combined_histograms_batch (bench_histograms.py)
+HISTOGRAM_BLOCKS_MIN_PIXELS = 64 * 1024
+
+
+def stream_clip(video_path, fps=(10, 1), histogram_fps=10, decode="grab", keep_frames=True, histogram_batch_size=4):
+    """
+    Single streaming pass over `video_path`: every frame kept by a rate in `fps` gets one
+    slot, frames of the `histogram_fps` stream have their combined histogram computed as
+    they are decoded, and (if `keep_frames`) the frame is stored once in a
+    FrameBuffer sized from the container's frame count. With `keep_frames=False` only
+    timestamps and histograms are retained; use `iter_frames_at` to fetch the few frames
+    finally selected.
+
+    Histograms of frames of at least `HISTOGRAM_BLOCKS_MIN_PIXELS` pixels are computed one
+    frame at a time with cv2.calcHist per block; smaller frames are collected in batches of
+    `histogram_batch_size` (copied into one reused array) for the bincount kernel.
+    """
+    frame_rate, frame_count = probe_video(video_path)
+    buffer = None
+    if keep_frames:
+        # Exact number of slots for the reported frame count; the buffer grows if the metadata is short
+        intervals = [max(1, int(frame_rate / rate)) for rate in fps] if frame_rate > 0 else [1]
+        buffer = FrameBuffer(sum(1 for n in range(frame_count) if any(n % interval == 0 for interval in intervals)))
+
+    timestamps, frame_numbers, histogram_batches = [], [], []
+    batch, pending = None, 0
+    slots = {rate: [] for rate in fps}
+    for frame_number, timestamp, frame, rates in iter_sampled_frames(video_path, fps=fps, decode=decode):
+        slot = len(timestamps)
+        timestamps.append(timestamp)
+        frame_numbers.append(frame_number)
+        if buffer is not None:
+            buffer.append(frame)
+        for rate in rates:
+            slots[rate].append(slot)
+        if histogram_fps in rates:
+            if frame.shape[0] * frame.shape[1] >= HISTOGRAM_BLOCKS_MIN_PIXELS:
+                histogram_batches.append(calculate_combined_histograms_blocks([frame]))
+            else:
+                if batch is None:
+                    batch = np.empty((histogram_batch_size,) + frame.shape, dtype=frame.dtype)
+                batch[pending] = frame
+                pending += 1
+                if pending == histogram_batch_size:
+                    histogram_batches.append(calculate_combined_histograms_batch(batch, chunk_size=histogram_batch_size))
+                    pending = 0
+    if pending:
+        histogram_batches.append(calculate_combined_histograms_batch(batch[:pending], chunk_size=histogram_batch_size))
+
+    histograms = np.concatenate(histogram_batches) if histogram_batches else np.empty((0, 17 * 512), dtype=np.float32)
+    return ClipSamples(buffer, timestamps, frame_numbers, slots, histograms)
+
+
+def iter_frames_at(video_path, frame_numbers):
+    """
+    Decode `video_path` with grab() and yield the frame at each of the non-decreasing
+    `frame_numbers` in turn (a repeated number yields the same frame again), so callers
+    can drop frames they do not keep instead of holding every requested frame at once.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        count, current, frame = -1, None, None
+        for frame_number in frame_numbers:
+            if frame_number != current:
+                while count < frame_number:
+                    if not cap.grab():
+                        raise ValueError(f"{video_path} ended before frame {frame_number}")
+                    count += 1
+                ret, frame = cap.retrieve()
+                if not ret:
+                    raise ValueError(f"Could not retrieve frame {frame_number} of {video_path}")
+                current = frame_number
+            yield frame
+    finally:
+        cap.release()
+
+
+def read_frames_at(video_path, frame_numbers):
+    """Decode `video_path` with grab() and retrieve only the frames at `frame_numbers`."""
+    wanted = set(frame_numbers)
+    frames = {}
+    cap = cv2.VideoCapture(video_path)
+    try:
+        count = 0
+        while len(frames) < len(wanted) and cap.grab():
+            if count in wanted:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                frames[count] = frame
+            count += 1
+    finally:
+        cap.release()
+    return frames
 
 # %%
 def calculate_histograms(frames):
@@ -85,29 +302,194 @@ def calculate_combined_histograms(frames, num_blocks=4):
         histograms.append(combined_hist)
     return histograms  # Output: list of 1D numpy arrays (combined histograms)
 
+def calculate_combined_histograms_batch(frames, num_blocks=4, chunk_size=16):
+    """
+    Batched equivalent of `calculate_combined_histograms` for a stacked (N, H, W, 3) uint8 array.
+
+    Each pixel is quantized once to a uint16 code combining its 8x8x8 color bin and its block
+    (pixels left over by the h // num_blocks, w // num_blocks cropping get an extra remainder
+    cell that only counts towards the global histogram). One bincount per frame then yields
+    every block histogram, and the global histogram is their sum. Rows are L2-normalized
+    exactly like cv2.normalize.
+
+    Returns a contiguous (N, (1 + num_blocks**2) * 512) float32 matrix laid out as
+    [global, block(0,0), block(0,1), ...], identical to `calculate_combined_histograms`.
+    Frames are quantized `chunk_size` at a time to bound the temporary code arrays.
+    """
+    frames = np.asarray(frames)
+    n, h, w, _ = frames.shape
+    num_bins = 8 * 8 * 8
+    num_cells = num_blocks * num_blocks + 1  # blocks + cropped remainder
+    block_size_h = h // num_blocks
+    block_size_w = w // num_blocks
+
+    # Per-pixel code offset: block index for pixels inside the block grid, the remainder cell otherwise
+    cell_map = np.full((h, w), num_blocks * num_blocks, dtype=np.uint16)
+    rows = np.arange(num_blocks * block_size_h) // max(block_size_h, 1)
+    cols = np.arange(num_blocks * block_size_w) // max(block_size_w, 1)
+    cell_map[:len(rows), :len(cols)] = rows[:, None] * num_blocks + cols[None, :]
+    cell_map *= num_bins
+
+    counts = np.empty((n, num_cells, num_bins), dtype=np.float64)
+    for start in range(0, n, chunk_size):
+        quantized = frames[start:start + chunk_size] >> 5  # 256 / 8 bins per channel
+        codes = np.multiply(quantized[..., 0], 64, dtype=np.uint16)
+        codes += quantized[..., 1] * np.uint8(8)
+        codes += quantized[..., 2]
+        codes += cell_map
+        for offset, frame_codes in enumerate(codes):
+            counts[start + offset] = np.bincount(frame_codes.ravel(), minlength=num_cells * num_bins).reshape(num_cells, num_bins)
+
+    histograms = np.empty((n, 1 + num_blocks * num_blocks, num_bins), dtype=np.float64)
+    histograms[:, 0] = counts.sum(axis=1)
+    histograms[:, 1:] = counts[:, :-1]
+
+    # cv2.normalize(NORM_L2): the norm and 1 / norm are computed in double, the scaling itself
+    # in float32; an empty histogram is zeroed
+    norms = np.sqrt(np.sum(histograms * histograms, axis=2, keepdims=True))
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > np.finfo(np.float64).eps)
+    normalized = histograms.astype(np.float32) * scale.astype(np.float32)
+    return np.ascontiguousarray(normalized.reshape(n, -1))
+
+def calculate_combined_histograms_blocks(frames, num_blocks=4):
+    """
+    Per-frame equivalent of `calculate_combined_histograms` that reads every pixel once:
+    cv2.calcHist runs on each block and on the strips left over by the cropping, and the
+    global histogram is the sum of those (calcHist counts are exact in float32 below 2**24
+    pixels). About twice as fast as the plain loop, and faster than
+    `calculate_combined_histograms_batch` from ~80k pixels per frame up; the batched kernel
+    stays ahead on smaller frames, where the per-call overhead of calcHist dominates.
+
+    Returns a (N, (1 + num_blocks**2) * 512) float32 matrix identical to the other two.
+    """
+    num_bins = 8 * 8 * 8
+    histograms = np.empty((len(frames), (1 + num_blocks * num_blocks) * num_bins), dtype=np.float32)
+    for index, frame in enumerate(frames):
+        h, w, _ = frame.shape
+        block_size_h = h // num_blocks
+        block_size_w = w // num_blocks
+        row = histograms[index].reshape(1 + num_blocks * num_blocks, num_bins)
+        global_hist = np.zeros(num_bins, dtype=np.float32)
+        for i in range(num_blocks):
+            for j in range(num_blocks):
+                block = frame[i * block_size_h:(i + 1) * block_size_h, j * block_size_w:(j + 1) * block_size_w]
+                hist = cv2.calcHist([block], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256]).ravel()
+                global_hist += hist
+                row[1 + i * num_blocks + j] = cv2.normalize(hist, hist).ravel()
+        # Pixels outside the block grid only count towards the global histogram
+        for rest in (frame[num_blocks * block_size_h:], frame[:num_blocks * block_size_h, num_blocks * block_size_w:]):
+            if rest.size:
+                global_hist += cv2.calcHist([rest], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256]).ravel()
+        row[0] = cv2.normalize(global_hist, global_hist).ravel()
+    return histograms
 
 # %%
-def select_representative_frames(frames, histograms, timestamps, num_clusters=5):
-    kmeans = KMeans(n_clusters=num_clusters, random_state=42)
-    kmeans.fit(histograms)
+# Clustering backends for select_representative_indices: each maps (histograms, num_clusters) to cluster labels
+def cluster_kmeans(histograms, num_clusters):
+    return KMeans(n_clusters=num_clusters, random_state=42).fit(histograms).labels_
+
+def cluster_minibatch_kmeans(histograms, num_clusters, batch_size=256):
+    return MiniBatchKMeans(n_clusters=num_clusters, batch_size=batch_size, n_init=3, random_state=42).fit(histograms).labels_
 
-    representative_frames = []
-    representative_timestamps = [] 
+def cluster_pca_kmeans(histograms, num_clusters, n_components=16):
+    n_components = min(n_components, len(histograms), np.shape(histograms)[1])
+    reduced = PCA(n_components=n_components, random_state=42).fit_transform(histograms)
+    return cluster_kmeans(reduced, num_clusters)
+
+_random_projections = {}
+
+def cluster_random_projection_kmeans(histograms, num_clusters, n_components=64):
+    # The projection matrix only depends on the histogram width, so build it once per process
+    n_features = np.shape(histograms)[1]
+    if (n_features, n_components) not in _random_projections:
+        _random_projections[(n_features, n_components)] = GaussianRandomProjection(
+            n_components=n_components, random_state=42
+        ).fit(np.zeros((1, n_features), dtype=np.float32))
+    reduced = _random_projections[(n_features, n_components)].transform(histograms)
+    return cluster_kmeans(reduced, num_clusters)
+
+def cluster_numpy_kmeans(histograms, num_clusters, n_iter=20, seed=42):
+    """
+    Pure-NumPy k-means: greedy k-means++ seeding, then at most `n_iter` Lloyd iterations.
+
+    Works on the (N, N) Gram matrix instead of the 8704-dim vectors: the squared distance
+    from frame i to the mean of cluster C is G_ii - 2 mean_{j in C} G_ij + mean_{j,l in C} G_jl,
+    so after one N x D x N product every iteration is O(N^2 k).
+    """
+    X = np.asarray(histograms, dtype=np.float64)
+    n = len(X)
+    if num_clusters > n:
+        raise ValueError(f"n_samples={n} should be >= n_clusters={num_clusters}.")
+    rng = np.random.default_rng(seed)
+    gram = X @ X.T
+    sq_norms = np.diag(gram)
+    pairwise = np.maximum(sq_norms[:, None] + sq_norms[None, :] - 2 * gram, 0)
+
+    # Greedy k-means++ seeding (as in sklearn): draw 2 + log(k) candidates per step, keep the best
+    n_trials = 2 + int(np.log(num_clusters))
+    seeds = [int(rng.integers(n))]
+    closest = pairwise[seeds[0]].copy()
+    for _ in range(1, num_clusters):
+        total = closest.sum()
+        if total <= 0:
+            candidates = rng.integers(n, size=n_trials)
+        else:
+            candidates = rng.choice(n, size=n_trials, p=closest / total)
+        candidate_closest = np.minimum(closest[None, :], pairwise[candidates])
+        best = int(np.argmin(candidate_closest.sum(axis=1)))
+        seeds.append(int(candidates[best]))
+        closest = candidate_closest[best]
+    labels = np.argmin(pairwise[:, seeds], axis=1)
+
+    clusters = np.arange(num_clusters)
+    for _ in range(n_iter):
+        membership = (labels[None, :] == clusters[:, None]).astype(np.float64)  # (k, N)
+        sizes = membership.sum(axis=1)
+        safe_sizes = np.maximum(sizes, 1)
+        cross = gram @ membership.T  # (N, k): sum_{j in C} G_ij
+        within = np.einsum('kn,nk->k', membership, cross)  # sum_{j,l in C} G_jl
+        distances = sq_norms[:, None] - 2 * cross / safe_sizes + within / safe_sizes ** 2
+        distances[:, sizes == 0] = np.inf
+        new_labels = np.argmin(distances, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return labels
+
+CLUSTER_BACKENDS = {
+    "kmeans": cluster_kmeans,
+    "minibatch": cluster_minibatch_kmeans,
+    "pca": cluster_pca_kmeans,
+    "random_projection": cluster_random_projection_kmeans,
+    "numpy": cluster_numpy_kmeans,
+}
+
+def select_representative_indices(histograms, timestamps, num_clusters=5, cluster_backend="kmeans"):
+    """
+    Cluster `histograms` and return, sorted by timestamp, the index of the
+    highest-entropy frame in each non-empty cluster.
+
+    `cluster_backend` is a name from CLUSTER_BACKENDS or a callable
+    (histograms, num_clusters) -> labels. Entropy is always scored on the full histograms.
+    """
+    cluster = CLUSTER_BACKENDS[cluster_backend] if isinstance(cluster_backend, str) else cluster_backend
+    labels = cluster(histograms, num_clusters)
+
+    representative_indices = []
     for cluster_idx in range(num_clusters):
-        cluster_indices = np.where(kmeans.labels_ == cluster_idx)[0]
-        if len(cluster_indices)> 0:
-            cluster_frames = [frames[i] for i in cluster_indices]
-            cluster_histograms = [histograms[i] for i in cluster_indices]
-
-            entropy_scores = [np.sum(-h * np.log(h+1e-10)) for h in cluster_histograms]
-            best_frame_idx = cluster_indices[np.argmax(entropy_scores)]
-            representative_frames.append(frames[best_frame_idx])
-            representative_timestamps.append(timestamps[best_frame_idx])
-            
-    # Sort the representative frames and timestamps based on timestamps
-    sorted_indices = np.argsort(representative_timestamps)
-    representative_frames = [representative_frames[i] for i in sorted_indices]
-    representative_timestamps = [representative_timestamps[i] for i in sorted_indices]
+        cluster_indices = np.where(labels == cluster_idx)[0]
+        if len(cluster_indices) > 0:
+            entropy_scores = [np.sum(-histograms[i] * np.log(histograms[i] + 1e-10)) for i in cluster_indices]
+            representative_indices.append(cluster_indices[np.argmax(entropy_scores)])
+
+    # Sort the representative frames based on timestamps
+    sorted_indices = np.argsort([timestamps[i] for i in representative_indices])
+    return [representative_indices[i] for i in sorted_indices]
+
+def select_representative_frames(frames, histograms, timestamps, num_clusters=5, cluster_backend="kmeans"):
+    representative_indices = select_representative_indices(histograms, timestamps, num_clusters=num_clusters, cluster_backend=cluster_backend)
+    representative_frames = [frames[i] for i in representative_indices]
+    representative_timestamps = [timestamps[i] for i in representative_indices]
 
     # Add the first and last frames to the representative frames
     # if len(frames) > 0:
@@ -121,51 +503,267 @@ def select_representative_frames(frames, histograms, timestamps, num_clusters=5)
 
 
 # %%
+def select_distinct_frames(frames, timestamps, max_frames=3, cluster_backend="kmeans"):
+    # Calculate combined histograms for the extracted frames
+    histograms = calculate_combined_histograms_batch(np.stack(frames))  # Output: (N, 17 * 512) float32 matrix
+    return select_representative_frames(frames, histograms, timestamps, num_clusters=max_frames, cluster_backend=cluster_backend)
+
 def get_distinct_frames(video_path, max_frames=3):
     frames, timestamps = extract_frames(video_path, fps=10)
-    # Calculate combined histograms for the extracted frames
-    histograms = calculate_combined_histograms(frames)  # Output: list of 1D numpy arrays (combined histograms)
-    representative_frames, representative_timestamps = select_representative_frames(frames, histograms, timestamps, num_clusters=max_frames)
-    return representative_frames, representative_timestamps
+    return select_distinct_frames(frames, timestamps, max_frames=max_frames)
 
 # %%
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.avi', '.mov')
+VIDEO_NAME_PATTERN = re.compile(r'^(?P<video_id>.+)_(?P<start>\d+(?:\.\d+)?)_(?P<end>\d+(?:\.\d+)?)$')
+
+def parse_video_filename(fname):
+    """
+    Return the video_id of a `<id>_<start>_<end>.<ext>` clip name, the bare stem for other
+    video files, or None for non-video files. Ids may themselves contain underscores.
+    """
+    stem, ext = os.path.splitext(fname)
+    if ext.lower() not in VIDEO_EXTENSIONS:
+        return None
+    match = VIDEO_NAME_PATTERN.match(stem)
+    return match.group('video_id') if match else stem
+
+
+def _parent_dir(rel_path):
+    return os.path.dirname(rel_path) or '.'
+
+
+class VideoIndex:
+    """
+    Persistent video_id -> path index for a video directory tree.
+
+    Built once with os.scandir and saved next to the videos (`.video_index.json` by default,
+    silently kept in memory only if the directory is read-only). The mtime of every indexed
+    directory is recorded; `refresh` rescans only the directories whose mtime changed, so
+    adding a clip costs one directory scan instead of a full walk.
+    """
+    INDEX_VERSION = 1
+
+    def __init__(self, directory, index_path=None):
+        self.directory = os.path.abspath(directory)
+        self.index_path = index_path or os.path.join(self.directory, '.video_index.json')
+        self.dir_mtimes = {}  # relative dir -> mtime_ns
+        self.videos = {}  # video_id -> relative path
+        self._load()
+        self.refresh()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get('version') == self.INDEX_VERSION:
+            self.dir_mtimes = data['dirs']
+            self.videos = data['videos']
+
+    def _save(self):
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.INDEX_VERSION, 'dirs': self.dir_mtimes, 'videos': self.videos}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass  # Read-only video directory: keep the index in memory only
+
+    def _scan_dir(self, rel_dir):
+        """Re-index the files directly inside `rel_dir`; return its subdirectories."""
+        abs_dir = os.path.join(self.directory, rel_dir)
+        prefix = '' if rel_dir == '.' else rel_dir + os.sep
+        self.videos = {vid: path for vid, path in self.videos.items() if _parent_dir(path) != rel_dir}
+        subdirs = []
+        with os.scandir(abs_dir) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                if entry.is_dir():
+                    subdirs.append(prefix + entry.name)
+                elif entry.is_file():
+                    video_id = parse_video_filename(entry.name)
+                    if video_id is not None:
+                        self.videos.setdefault(video_id, prefix + entry.name)
+        self.dir_mtimes[rel_dir] = os.stat(abs_dir).st_mtime_ns
+        return subdirs
+
+    def refresh(self):
+        """Rescan directories whose mtime changed (and any new subdirectories); persist if anything changed."""
+        changed = False
+        pending = ['.']
+        seen = set()
+        while pending:
+            rel_dir = pending.pop()
+            try:
+                mtime = os.stat(os.path.join(self.directory, rel_dir)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            seen.add(rel_dir)
+            if self.dir_mtimes.get(rel_dir) != mtime:
+                subdirs = self._scan_dir(rel_dir)
+                changed = True
+            else:
+                subdirs = [d for d in self.dir_mtimes if d != '.' and _parent_dir(d) == rel_dir]
+            pending.extend(d for d in subdirs if d not in seen)
+
+        removed = set(self.dir_mtimes) - seen
+        if removed:
+            self.dir_mtimes = {d: m for d, m in self.dir_mtimes.items() if d in seen}
+            self.videos = {vid: path for vid, path in self.videos.items() if _parent_dir(path) in seen}
+            changed = True
+        if changed:
+            self._save()
+
+    def lookup(self, video_id):
+        """Return the full path for an exact `video_id`, refreshing once on a miss or a stale entry."""
+        for attempt in range(2):
+            rel_path = self.videos.get(video_id)
+            if rel_path is not None:
+                path = os.path.join(self.directory, rel_path)
+                if os.path.exists(path):
+                    return path
+            if attempt == 0:
+                self.refresh()
+        return None
+
+
+_video_indices = {}
+
+def get_video_index(directory="./video_samples"):
+    """Return the process-wide VideoIndex for `directory`, building or loading it on first use."""
+    key = os.path.abspath(directory)
+    if key not in _video_indices:
+        _video_indices[key] = VideoIndex(directory)
+    return _video_indices[key]
+
+
 def find_video_path_by_id(video_id, directory="./video_samples"):
     """
-    Search `directory` (and its subfolders) for any filename containing `video_id`.
+    Look up the clip whose name is `<video_id>_<start>_<end>.mp4` (or `<video_id>.mp4`) in
+    `directory` and its subfolders via the persistent VideoIndex. Only exact ids match.
     If found, return the full path. Otherwise, raise FileNotFoundError.
     """
-    for root, dirs, files in os.walk(directory):
-        for fname in files:
-            if video_id in fname:
-                return os.path.join(root, fname)
+    path = get_video_index(directory).lookup(video_id)
+    if path is not None:
+        return path
 
     # If we reach here, no file matched; raise an exception:
     raise FileNotFoundError(
         f"Video with ID '{video_id}' not found. "
-        f"Make sure a file containing '{video_id}' is in the directory '{directory}'."
+        f"Make sure a file named '{video_id}_<start>_<end>.mp4' is in the directory '{directory}'."
     )
 
 # %%
-def convert_frames_to_base64(frames):
-    base64_frames = []
-    for frame in frames:
-        _, buffer = cv2.imencode('.jpg', frame)
-        jpg_bytes = buffer.tobytes()
-        base64_str = base64.b64encode(jpg_bytes).decode('utf-8')
-        base64_frames.append(base64_str)
-    return base64_frames
+class FrameEncoder:
+    """
+    Encoding stage for selected frames: optional downscale, then JPEG or WebP.
+
+    `max_side` shrinks frames whose longer side exceeds it (INTER_AREA, aspect ratio kept)
+    before encoding; `detail: low` image inputs are downscaled to 512px by the API anyway,
+    so anything larger is upload overhead. Resize destinations are reused per thread and
+    shape. With `threads > 1` frames are encoded in a thread pool (cv2 releases the GIL),
+    started on first use and shut down by `close()` or when used as a context manager.
+    The default encoder reproduces `cv2.imencode('.jpg', frame)`.
+    """
+    FORMATS = {
+        "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, "image/jpeg"),
+        "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, "image/webp"),
+    }
+
+    def __init__(self, max_side=None, quality=95, format="jpeg", threads=1):
+        if format not in self.FORMATS:
+            raise ValueError(f"Unknown frame format '{format}'. Available: {sorted(self.FORMATS)}")
+        self.max_side = max_side
+        self.quality = quality
+        self.format = format
+        self.threads = threads
+        self.extension, quality_flag, self.mime_type = self.FORMATS[format]
+        self._encode_params = [quality_flag, int(quality)]
+        self._local = threading.local()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def __reduce__(self):
+        # Thread-local buffers and the pool stay behind when sent to worker processes
+        return FrameEncoder, (self.max_side, self.quality, self.format, self.threads)
+
+    def params(self):
+        """Everything that changes the encoded bytes, e.g. for cache keys."""
+        return {"max_side": self.max_side, "quality": self.quality, "format": self.format}
+
+    def resize(self, frame):
+        h, w = frame.shape[:2]
+        if self.max_side is None or max(h, w) <= self.max_side:
+            return frame
+        scale = self.max_side / max(h, w)
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        buffers = self._local.__dict__.setdefault("buffers", {})
+        key = (size, frame.shape[2:], frame.dtype)
+        if key not in buffers:
+            buffers[key] = np.empty((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+        return cv2.resize(frame, size, dst=buffers[key], interpolation=cv2.INTER_AREA)
+
+    def _encode_one(self, frame):
+        ok, buffer = cv2.imencode(self.extension, self.resize(frame), self._encode_params)
+        if not ok:
+            raise ValueError(f"Could not encode frame of shape {frame.shape} as {self.format}")
+        return buffer
+
+    def _map(self, frames):
+        if self.threads <= 1 or len(frames) <= 1:
+            return [self._encode_one(frame) for frame in frames]
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="frame-encoder")
+            executor = self._executor
+        return list(executor.map(self._encode_one, frames))
+
+    def encode(self, frames):
+        """Encoded bytes of every frame, in order."""
+        return [buffer.tobytes() for buffer in self._map(frames)]
+
+    def encode_base64(self, frames):
+        """Base64 strings of the encoded frames, encoded straight from the cv2 buffers."""
+        return [base64.b64encode(buffer).decode('ascii') for buffer in self._map(frames)]
+
+    def close(self):
+        """Shut the thread pool down; a later encode starts a new one."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+DEFAULT_FRAME_ENCODER = FrameEncoder()
+
+def convert_frames_to_jpeg(frames, encoder=None):
+    return (encoder or DEFAULT_FRAME_ENCODER).encode(frames)
+
+def convert_frames_to_base64(frames, encoder=None):
+    return (encoder or DEFAULT_FRAME_ENCODER).encode_base64(frames)
 
 # %%
 # Function to remove consecutive frames with very little change
-def remove_similar_frames(frames, timestamps, threshold=0.1, dynamic=False, min_frames=5):
-    filtered_frames = [frames[0]]  # Start with the first frame
+def remove_similar_indices(frames, indices, timestamps, threshold=0.1, dynamic=False, min_frames=5):
+    """
+    Index-based core of `remove_similar_frames`.
+
+    `frames` is anything indexable by the entries of `indices` (a list, a frame
+    buffer, a dict); `timestamps` is aligned with `indices`. Returns the kept
+    indices and their timestamps, sorted by timestamp. No frame is copied.
+    """
+    filtered_indices = [indices[0]]  # Start with the first frame
     filtered_timestamps = [timestamps[0]]
-    removed_frames = []  # Keep track of removed frames
-    removed_timestamps = []
+    removed_indices = []  # Keep track of removed frames
     
-    for i in range(1, len(frames)):
+    for i in range(1, len(indices)):
         # Calculate the difference between the current frame and the last added frame
-        diff = cv2.absdiff(frames[i], filtered_frames[-1])
+        diff = cv2.absdiff(frames[indices[i]], frames[filtered_indices[-1]])
         # Calculate the mean difference
         mean_diff = np.mean(diff)
         # Dynamically adjust threshold if needed
@@ -173,48 +771,253 @@ def remove_similar_frames(frames, timestamps, threshold=0.1, dynamic=False, min_
             threshold = np.mean([threshold, mean_diff / 255])
         # If the mean difference is greater than the threshold, keep the frame
         if mean_diff > threshold * 255:  # Scale threshold by 255 (max pixel value)
-            filtered_frames.append(frames[i])
+            filtered_indices.append(indices[i])
             filtered_timestamps.append(timestamps[i])
         else:
-            removed_frames.append((frames[i], timestamps[i], mean_diff))
+            removed_indices.append((indices[i], timestamps[i], mean_diff))
     
-    if len(filtered_frames) < min_frames:
+    if len(filtered_indices) < min_frames:
         # Sort removed frames by their similarity and histogram difference (ascending order) to bring back the most different frames
-        removed_frames.sort(key=lambda x: (x[2],), reverse=True)
-        additional_needed = min_frames - len(filtered_frames)
+        removed_indices.sort(key=lambda x: (x[2],), reverse=True)
+        additional_needed = min_frames - len(filtered_indices)
         for i in range(additional_needed):
-            filtered_frames.append(removed_frames[i][0])
-            filtered_timestamps.append(removed_frames[i][1])
+            filtered_indices.append(removed_indices[i][0])
+            filtered_timestamps.append(removed_indices[i][1])
 
     # Sort the filtered frames by their timestamps
     sorted_indices = np.argsort(filtered_timestamps)
-    filtered_frames = [filtered_frames[i] for i in sorted_indices]
+    filtered_indices = [filtered_indices[i] for i in sorted_indices]
     filtered_timestamps = [filtered_timestamps[i] for i in sorted_indices]
-    return filtered_frames, filtered_timestamps
+    return filtered_indices, filtered_timestamps
+
+def remove_similar_frames(frames, timestamps, threshold=0.1, dynamic=False, min_frames=5):
+    filtered_indices, filtered_timestamps = remove_similar_indices(
+        frames, list(range(len(frames))), timestamps, threshold=threshold, dynamic=dynamic, min_frames=min_frames
+    )
+    return [frames[i] for i in filtered_indices], filtered_timestamps
+
+def remove_similar_frames_stream(frames, timestamps, threshold=0.1, dynamic=False, min_frames=5):
+    """
+    `remove_similar_frames` for an iterable of frames aligned with `timestamps`, consumed one
+    at a time. Only the kept frames, the current one and the `min_frames - 1` most different
+    removed frames (all the top-up at the end can bring back) are held. Same result.
+    """
+    frames = iter(frames)
+    kept = [(next(frames), timestamps[0])]
+    removed = []  # (mean_diff, frame, timestamp), most different first
+    for timestamp in timestamps[1:]:
+        frame = next(frames)
+        mean_diff = np.mean(cv2.absdiff(frame, kept[-1][0]))
+        if dynamic:
+            threshold = np.mean([threshold, mean_diff / 255])
+        if mean_diff > threshold * 255:
+            kept.append((frame, timestamp))
+        else:
+            removed.append((mean_diff, frame, timestamp))
+            # Stable, like the sort in remove_similar_indices: ties keep their order
+            removed.sort(key=lambda x: x[0], reverse=True)
+            del removed[max(min_frames - 1, 0):]
+
+    if len(kept) < min_frames:
+        kept.extend((frame, timestamp) for _, frame, timestamp in removed[:min_frames - len(kept)])
+    sorted_indices = np.argsort([timestamp for _, timestamp in kept])
+    return [kept[i][0] for i in sorted_indices], [kept[i][1] for i in sorted_indices]
 
 # %%
-def get_filtered_frames(video_id, directory="./video_samples", max_frames=5):
+class FrameCache:
+    """
+    Persistent, size-bounded LRU cache of selected frames.
+
+    Keys are content addresses: a hash of the video file identity (absolute path, size,
+    mtime) and the sampling/clustering parameters, so editing or replacing a clip
+    invalidates its entries. Values are the selected timestamps and the encoded frames
+    (JPEG, or whatever encoding the key names), pickled one entry per file under
+    `cache_dir`. Reads refresh the entry's mtime, and writes evict least recently used
+    entries until the cache fits in `max_bytes`. The in-memory index is guarded by a lock,
+    so threads of one process can share a cache.
+    """
+    def __init__(self, cache_dir="./frame_cache/selected", max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = None  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # The index and its lock are rebuilt in worker processes
+        return FrameCache, (self.cache_dir, self.max_bytes)
+
+    @staticmethod
+    def key(video_path, params):
+        stat = os.stat(video_path)
+        identity = repr((os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns, sorted(params.items())))
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _load_index(self):
+        with self._lock:
+            if self._entries is None:
+                self._scan_index()
+
+    def _scan_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.pkl') and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.name[:-len('.pkl')], stat.st_size))
+        entries.sort()
+        self._entries = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._entries.values())
+
+    def get(self, key):
+        """Return (timestamps, jpeg_frames) for `key`, or None on a miss."""
+        self._load_index()
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Evicted since it was read
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return value['timestamps'], value['jpeg_frames']
+
+    def put(self, key, timestamps, jpeg_frames):
+        self._load_index()
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'timestamps': [float(t) for t in timestamps], 'jpeg_frames': list(jpeg_frames)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)  # Atomic: concurrent readers see the old entry or the new one
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass  # Already evicted by another process
+
+# %%
+# Encoding of the frames `get_filtered_frames` caches: lossless, so a hit returns exactly the selected frames
+LOSSLESS_CACHE_ENCODING = {"format": "png"}
+
+def selection_cache_key(cache, video_path, max_frames, distinct_fps, interval_fps, decode, cluster_backend, encoding=None):
+    """
+    `FrameCache` key of a frame selection stored with `encoding` (FrameEncoder params). The
+    default full-size JPEG encoding is left out of the key, so entries written before the
+    encoding was configurable are still found.
+    """
+    params = {"max_frames": max_frames, "distinct_fps": distinct_fps, "interval_fps": interval_fps, "decode": decode, "cluster_backend": cluster_backend}
+    if encoding is not None and encoding != DEFAULT_FRAME_ENCODER.params():
+        params["encoding"] = encoding
+    return cache.key(video_path, params)
+
+def get_filtered_frames(video_id, directory="./video_samples", max_frames=5, distinct_fps=10, interval_fps=1, decode="grab", low_memory=False, cache=None, cluster_backend="kmeans"):
+    """
+    Select up to `max_frames` representative frames (KMeans over `distinct_fps` samples) plus
+    10 regular-interval frames (`interval_fps` samples), then drop near-duplicate neighbours.
+
+    By default the clip is decoded once into a FrameBuffer of every sampled frame (15-33x
+    the returned frames, bench_frame_memory.py). With `low_memory=True` `stream_clip` keeps
+    only timestamps and histograms, and a second, grab-only pass retrieves the ~15 candidate
+    frames one at a time for the near-duplicate filter, which holds just the frames it may
+    return: 2.0x the output on the 1280x720 sample clip, 7-18x on the small ones, where the
+    clustering of the ~100 histograms (~14 MB) sets the peak. The second pass decodes the
+    clip again, so it takes ~1.4x as long (seeking to the candidates instead is slower
+    still on these clips, whose keyframes are far apart).
+
+    With a `FrameCache`, a cache hit skips decoding the clip; the frames are kept as PNG,
+    so a hit returns the same pixels as a miss. Callers that send the frames on should use
+    `get_filtered_jpeg_frames`, which caches and returns the encoded bytes themselves.
+    """
+    video_path = find_video_path_by_id(video_id, directory)
+    if not video_path:
+        raise FileNotFoundError(f"Video with ID {video_id} not found.")
+
+    if cache is not None:
+        key = selection_cache_key(cache, video_path, max_frames, distinct_fps, interval_fps, decode, cluster_backend, LOSSLESS_CACHE_ENCODING)
+        cached = cache.get(key)
+        if cached is not None:
+            timestamps, png_frames = cached
+            return [cv2.imdecode(np.frombuffer(png_bytes, dtype=np.uint8), cv2.IMREAD_COLOR) for png_bytes in png_frames], timestamps
+
+    filtered_frames, filtered_timestamps = select_filtered_frames(video_path, max_frames, distinct_fps, interval_fps, decode, low_memory, cluster_backend)
+    if cache is not None:
+        cache.put(key, filtered_timestamps, [cv2.imencode('.png', frame)[1].tobytes() for frame in filtered_frames])
+    return filtered_frames, filtered_timestamps
+
+def get_filtered_jpeg_frames(video_id, directory="./video_samples", max_frames=5, distinct_fps=10, interval_fps=1, decode="grab", low_memory=False, cache=None, cluster_backend="kmeans", encoder=None):
+    """
+    Like `get_filtered_frames`, but return the selected frames encoded by `encoder`
+    (a `FrameEncoder`; full-size JPEG by default), served straight from `cache` on a hit.
+    """
     video_path = find_video_path_by_id(video_id, directory)
     if not video_path:
         raise FileNotFoundError(f"Video with ID {video_id} not found.")
 
-    frames, timestamps = get_distinct_frames(video_path, max_frames=max_frames)
+    encoder = encoder or DEFAULT_FRAME_ENCODER
+    if cache is not None:
+        key = selection_cache_key(cache, video_path, max_frames, distinct_fps, interval_fps, decode, cluster_backend, encoder.params())
+        cached = cache.get(key)
+        if cached is not None:
+            timestamps, jpeg_frames = cached
+            return jpeg_frames, timestamps
+
+    filtered_frames, filtered_timestamps = select_filtered_frames(video_path, max_frames, distinct_fps, interval_fps, decode, low_memory, cluster_backend)
+    jpeg_frames = convert_frames_to_jpeg(filtered_frames, encoder)
+    if cache is not None:
+        cache.put(key, filtered_timestamps, jpeg_frames)
+    return jpeg_frames, filtered_timestamps
+
+def select_filtered_frames(video_path, max_frames=5, distinct_fps=10, interval_fps=1, decode="grab", low_memory=False, cluster_backend="kmeans"):
+    """Uncached selection behind `get_filtered_frames`, for a resolved `video_path`."""
+    clip = stream_clip(video_path, fps=(distinct_fps, interval_fps), histogram_fps=distinct_fps,
+                       decode=decode, keep_frames=not low_memory)
+    distinct_slots = clip.slots[distinct_fps]
+    representative_indices = select_representative_indices(
+        clip.histograms, [clip.timestamps[slot] for slot in distinct_slots], num_clusters=max_frames, cluster_backend=cluster_backend
+    )
 
     # Concatenate frames selected at regular intervals
     interval_count = 10  # Number of frames to be plotted at regular intervals
-    all_frames, all_timestamps = extract_frames(video_path)  # Extract all frames from the video
-    regular_interval_indices = np.linspace(0, len(all_frames) - 1, interval_count, dtype=int)
-    concat_frames = frames + [all_frames[i] for i in regular_interval_indices]
-    concat_timestamps = timestamps + [all_timestamps[i] for i in regular_interval_indices]
+    interval_slots = clip.slots[interval_fps]
+    regular_interval_indices = np.linspace(0, len(interval_slots) - 1, interval_count, dtype=int)
+    concat_slots = [distinct_slots[i] for i in representative_indices] + [interval_slots[i] for i in regular_interval_indices]
+    concat_timestamps = [clip.timestamps[slot] for slot in concat_slots]
 
     # Sort concatenated frames by timestamps
     sorted_indices = np.argsort(concat_timestamps)
-    concat_frames_sorted = [concat_frames[i] for i in sorted_indices]
+    concat_slots_sorted = [concat_slots[i] for i in sorted_indices]
     concat_timestamps_sorted = [concat_timestamps[i] for i in sorted_indices]
 
     # Remove similar consecutive frames
-    filtered_frames, filtered_timestamps = remove_similar_frames(concat_frames_sorted, concat_timestamps_sorted, dynamic=True, min_frames=5, threshold=0.08)
+    if low_memory:
+        # Candidates are in timestamp order, i.e. in decode order: filter them as they are read
+        candidates = iter_frames_at(video_path, [clip.frame_numbers[slot] for slot in concat_slots_sorted])
+        return remove_similar_frames_stream(candidates, concat_timestamps_sorted, dynamic=True, min_frames=5, threshold=0.08)
+
+    filtered_slots, filtered_timestamps = remove_similar_indices(clip.buffer, concat_slots_sorted, concat_timestamps_sorted, dynamic=True, min_frames=5, threshold=0.08)
 
+    # Copy the kept frames out so the clip buffer can be released
+    filtered_frames = [np.array(clip.buffer[slot]) for slot in filtered_slots]
     return filtered_frames, filtered_timestamps
 
 #%%
@@ -0,0 +1,266 @@
+"""
+Sharded GPT-4o generation: a lease-based work queue and the merge of worker shards.
+
+Several copies of `gpt4o-data-generation.py` started with `GEN_WORKER_ID=<name>` claim
+video ids from `WorkQueue` (a SQLite table in `work_queue_{split}.sqlite`) and write their
+results to their own `JsonlResultStore` shard under `shards/`, without oids and with
+provisional question ids. A claim is a lease: if a worker dies, its videos become
+claimable again once the lease expires, or as soon as a worker on the same host notices
+that the process holding the lease is gone.
+
+`merge_shards` then moves the shard results into the main store in queue order (the order
+of the split CSV), allocating oids and renumbering question ids on the way, so the final
+ids do not depend on which worker handled which video. Merging is idempotent: videos that
+are already in the main store are skipped.
+
+Usage (from the `code/` directory, like the generation script):
+    GEN_WORKER_ID=w1 python gpt4o-data-generation.py &
+    GEN_WORKER_ID=w2 python gpt4o-data-generation.py &
+    wait
+    python sharding.py merge --split val
+
+A worker starting while no live worker holds a lease also retries the videos that failed
+in an earlier run; `python sharding.py retry --split val` does so explicitly.
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+
+import oid_allocator
+import result_store
+
+DEFAULT_SHARD_DIR = Path("shards")
+
+
+def queue_path(directory, split: str) -> Path:
+    return Path(directory) / f"work_queue_{split}.sqlite"
+
+
+def shard_name(split: str, worker_id: str) -> str:
+    """The `split` argument of a worker's JsonlResultStore, e.g. results_gpt4o_val.w1.jsonl."""
+    return f"{split}.{worker_id}"
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # it exists, under another user
+    return True
+
+
+class WorkQueue:
+    """
+    Lease-based queue of video ids in a SQLite table.
+
+    Every state change runs in a `BEGIN IMMEDIATE` transaction, so any number of worker
+    processes on the machine (or on machines sharing the file system with working locks)
+    can claim from the same database without two of them holding the same video.
+    """
+
+    def __init__(self, db_path, timeout=60):
+        self.db_path = Path(db_path)
+        self._conn = sqlite3.connect(self.db_path, timeout=timeout, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " video_id TEXT PRIMARY KEY,"
+            " position INTEGER NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"  # pending | leased | done | failed
+            " worker TEXT,"
+            " host TEXT,"  # host and pid of the process holding the lease
+            " pid INTEGER,"
+            " lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_status_position ON tasks (status, position)")
+
+    def _transaction(self, fn):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn()
+            self._conn.execute("COMMIT")
+            return result
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def add(self, video_ids, retry_failed=True):
+        """
+        Enqueue `video_ids` after the ones already known, keeping their order; known ids keep
+        their place. With `retry_failed`, videos that failed in an earlier run become pending
+        again, but only if no lease is active: while other workers are running, their failures
+        belong to the current run and are not retried until it is over (or `retry` is called).
+        Leases held by processes on this host that no longer exist are released first, so a
+        crashed worker does not hold back the retry until its leases expire.
+        """
+        def add():
+            start = self._conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM tasks").fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (video_id, position) VALUES (?, ?)",
+                ((video_id, start + offset) for offset, video_id in enumerate(video_ids)),
+            )
+            self._release_dead_leases()
+            if retry_failed and not self._active_leases():
+                self._retry_failed()
+        self._transaction(add)
+
+    def _release_dead_leases(self):
+        """Make the leased videos of dead processes on this host pending again; returns their number."""
+        pids = [row[0] for row in self._conn.execute(
+            "SELECT DISTINCT pid FROM tasks WHERE status = 'leased' AND host = ?", (socket.gethostname(),)
+        )]
+        dead = [(socket.gethostname(), pid) for pid in pids if pid is not None and not process_alive(pid)]
+        return self._conn.executemany(
+            "UPDATE tasks SET status = 'pending', worker = NULL, host = NULL, pid = NULL, lease_expires = NULL"
+            " WHERE status = 'leased' AND host = ? AND pid = ?",
+            dead,
+        ).rowcount
+
+    def _active_leases(self):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE status = 'leased' AND lease_expires >= ?", (time.time(),)
+        ).fetchone()[0]
+
+    def _retry_failed(self):
+        return self._conn.execute("UPDATE tasks SET status = 'pending', worker = NULL WHERE status = 'failed'").rowcount
+
+    def retry(self):
+        """Make every failed video pending again, even while other workers hold leases; returns their number."""
+        return self._transaction(self._retry_failed)
+
+    def claim(self, worker_id, limit=1, lease_seconds=600):
+        """Lease up to `limit` pending (or expired) videos to `worker_id`, in queue order."""
+        host, pid = socket.gethostname(), os.getpid()
+
+        def claim():
+            now = time.time()
+            rows = self._conn.execute(
+                "SELECT video_id FROM tasks"
+                " WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)"
+                " ORDER BY position LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            video_ids = [row[0] for row in rows]
+            self._conn.executemany(
+                "UPDATE tasks SET status = 'leased', worker = ?, host = ?, pid = ?, lease_expires = ?,"
+                " attempts = attempts + 1 WHERE video_id = ?",
+                ((worker_id, host, pid, now + lease_seconds, video_id) for video_id in video_ids),
+            )
+            return video_ids
+        return self._transaction(claim)
+
+    def _finish(self, video_id, worker_id, status):
+        # Only the current lease holder may finish a video; a worker whose lease expired lost it
+        self._transaction(lambda: self._conn.execute(
+            "UPDATE tasks SET status = ?, lease_expires = NULL WHERE video_id = ? AND worker = ? AND status = 'leased'",
+            (status, video_id, worker_id),
+        ))
+
+    def complete(self, video_id, worker_id):
+        self._finish(video_id, worker_id, "done")
+
+    def fail(self, video_id, worker_id):
+        """Give a video up for this run; `add(..., retry_failed=True)` queues it again."""
+        self._finish(video_id, worker_id, "failed")
+
+    def positions(self):
+        return dict(self._conn.execute("SELECT video_id, position FROM tasks"))
+
+    def counts(self):
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"))
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def shard_stores(shard_dir, split: str):
+    """Paths of every worker shard of `split`, as {kind: [paths]}."""
+    shard_dir = Path(shard_dir)
+    patterns = {kind: path.name for kind, path in result_store.jsonl_paths(".", f"{split}.*").items()}
+    return {kind: sorted(shard_dir.glob(pattern)) for kind, pattern in patterns.items()}
+
+
+def merge_shards(directory=".", split: str = "val", shard_dir=DEFAULT_SHARD_DIR,
+                 oid_db=oid_allocator.DEFAULT_DB_PATH, seed_json=oid_allocator.DEFAULT_JSON_PATH) -> dict:
+    """
+    Append the results and errors of all worker shards to the main store of `split`.
+
+    Results are merged in queue order; each gets its oid from the `OidAllocator` and question
+    ids continuing the main store's counter. Returns counts of merged results and errors.
+    """
+    directory = Path(directory)
+    with WorkQueue(queue_path(directory, split)) as queue:
+        positions = queue.positions()
+
+    def queue_order(record):
+        return positions.get(record["video_id"], float("inf")), record["video_id"]
+
+    paths = shard_stores(directory / shard_dir, split)
+    results = {}
+    for path in paths["results"]:
+        for record in result_store.read_jsonl(path):
+            results.setdefault(record["video_id"], record)
+    errors = [record for path in paths["errors"] for record in result_store.read_jsonl(path)]
+
+    merged = {"results": 0, "errors": 0}
+    with result_store.JsonlResultStore(directory, split) as store, \
+            oid_allocator.OidAllocator(directory / oid_db, seed_json=directory / seed_json) as oids:
+        last_question_id = store.last_question_id
+        for record in sorted(results.values(), key=queue_order):
+            if record["video_id"] in store.processed_videos:
+                continue
+            record["oid"] = oids.get_or_assign(record["video_id"])  # workers leave it None
+            for question in record["questions"]:
+                last_question_id += 1
+                question["id"] = last_question_id
+            store.add_result(record)
+            merged["results"] += 1
+
+        for entry in sorted(errors, key=queue_order):
+            # A video that has a result (from a retry) or already has an error is not recorded again
+            if entry["video_id"] in store.processed_videos or entry["video_id"] in store.error_videos:
+                continue
+            store.add_error(entry)
+            merged["errors"] += 1
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the work queue or merge worker shards.")
+    parser.add_argument("command", choices=["status", "retry", "merge"])
+    parser.add_argument("--split", default="val")
+    parser.add_argument("--dir", type=Path, default=Path("."), help="Directory holding the run files.")
+    parser.add_argument("--shard-dir", type=Path, default=DEFAULT_SHARD_DIR, help="Relative to --dir.")
+    parser.add_argument("--to-json", action="store_true", help="After merging, also write the JSON list layout.")
+    args = parser.parse_args()
+
+    if args.command in ("status", "retry"):
+        with WorkQueue(queue_path(args.dir, args.split)) as queue:
+            if args.command == "retry":
+                print(f"{queue.retry()} failed videos are pending again")
+            print(json.dumps(queue.counts(), indent=2))
+        return
+
+    print(json.dumps(merge_shards(args.dir, args.split, args.shard_dir), indent=2))
+    if args.to_json:
+        result_store.export_json(args.dir, args.split)
+        with oid_allocator.OidAllocator(args.dir / oid_allocator.DEFAULT_DB_PATH,
+                                        seed_json=args.dir / oid_allocator.DEFAULT_JSON_PATH) as oids:
+            oids.export_json(args.dir / oid_allocator.DEFAULT_JSON_PATH)
+
+
+if __name__ == "__main__":
+    main()
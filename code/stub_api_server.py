@@ -0,0 +1,137 @@
+"""
+Local stand-in for the Azure API gateway used by `gpt4o-data-generation.py`.
+
+Serves `POST <endpoint path>` with OpenAI-style chat completion responses containing a
+small, valid `{"questions": [...]}` payload, after a configurable latency. A fraction of
+requests can be answered with 429 to exercise retries and rate limiting, and the server
+counts requests and peak concurrency so throughput can be compared across modes.
+
+Usage (from the `code/` directory):
+    python stub_api_server.py --port 8808 --latency 0.5 --error-rate 0.1
+then point the generation script at it:
+    api_base_url = "http://127.0.0.1:8808"
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ENDPOINT_PATH = "/v1/openai/gpt4o/chat/completions"
+
+
+def stub_questions(seed):
+    return {
+        "questions": [
+            {
+                "question": f"What is shown in the video? ({seed})",
+                "options": ["A dog", "A cat", "A car", "A bird"],
+                "correct_answer_idx": 0,
+                "rephrased_answers": ["A dog", "Dog", "The dog"],
+                "quality_rating": "obvious",
+                "modality": "visual",
+                "category": "description",
+                "source_tags": ["frames"],
+            }
+        ]
+    }
+
+
+class StubState:
+    def __init__(self, latency, error_rate, endpoint_path):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.endpoint_path = endpoint_path
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+def make_handler(state):
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with state.lock:
+                    self._send_json(200, {"requests": state.requests, "max_in_flight": state.max_in_flight})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path != state.endpoint_path:
+                self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                return
+
+            with state.lock:
+                state.requests += 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+                request_number = state.requests
+            try:
+                time.sleep(state.latency * random.uniform(0.5, 1.5))
+                if random.random() < state.error_rate:
+                    self._send_json(429, {"error": {"message": "Rate limit is exceeded. Try again later.", "code": "429"}})
+                    return
+
+                # Echo the last text part so tests can match responses to requests
+                text = ""
+                for message in request.get("messages", []):
+                    content = message.get("content")
+                    parts = content if isinstance(content, list) else [{"type": "text", "text": content}]
+                    text = next((part["text"] for part in parts if part.get("type") == "text"), text)
+                self._send_json(200, {
+                    "id": f"chatcmpl-stub-{request_number}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": "stub",
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": json.dumps(stub_questions(text[-32:]))},
+                    }],
+                    "usage": {"prompt_tokens": len(text) // 4, "completion_tokens": 100, "total_tokens": len(text) // 4 + 100},
+                })
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+    return StubHandler
+
+
+def start_stub_server(port=0, latency=0.5, error_rate=0.0, endpoint_path=DEFAULT_ENDPOINT_PATH):
+    """Start the stub in a background thread; returns (server, state). The bound port is server.server_address[1]."""
+    state = StubState(latency, error_rate, endpoint_path)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub chat-completions gateway for local testing.")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean response latency in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--endpoint-path", default=DEFAULT_ENDPOINT_PATH)
+    args = parser.parse_args()
+
+    state = StubState(args.latency, args.error_rate, args.endpoint_path)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"Stub gateway listening on http://127.0.0.1:{args.port}{args.endpoint_path}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()